@@ -0,0 +1,423 @@
+"""
+Asynchronous database module for the API.
+
+Queries are built with the peewee models from `database.py` and run through an
+aiomysql connection pool, so the async services share the schema definitions
+and the connection settings of the sync ones.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+import aiomysql
+
+from config import MYSQL_POOL_RECYCLE, MYSQL_POOL_SIZE
+from database import (
+    BULK_CHUNK_SIZE,
+    STREAM_CHUNK_SIZE,
+    bulk_outcome,
+    bulk_report,
+    chunk_ids_select,
+    count_key,
+    database,
+    explained_rows,
+    read_replica,
+    replicas,
+    table_version_bump,
+    table_version_select,
+)
+from helpers.cache import MISSING, count_cache
+from helpers.metrics import timed_query
+
+
+def _convert_row(row: dict) -> dict:
+    """
+    Converts DECIMAL values to floats, as the peewee FloatFields do.
+    """
+    return {
+        key: float(value) if isinstance(value, Decimal) else value
+        for key, value in row.items()
+    }
+
+
+class AsyncDatabase:  # pylint: disable=too-many-instance-attributes
+    """
+    Lazily created aiomysql connection pool with helpers to run peewee queries.
+
+    The pool is created on first use inside the running event loop. A
+    connection acquired with `connection()` is shared by every query awaited
+    inside that block. Outside such a block, the reads of a request routed to a
+    replica are sent to the pool of that replica.
+    """
+
+    def __init__(self, maxsize: int, pool_recycle: int, source=database, readers=()):
+        self._maxsize = maxsize
+        self._pool_recycle = pool_recycle
+        self._source = source
+        self._readers = readers
+        self._pool = None
+        self._lock = None
+        self._current = ContextVar("async_connection", default=None)
+        self._depth = ContextVar("async_transaction_depth", default=0)
+
+    def connect_params(self) -> dict:
+        """
+        Builds the aiomysql connection arguments from the sync database settings.
+        """
+        return {
+            "db": self._source.database,
+            "autocommit": True,
+            **self._source.connect_params,
+        }
+
+    def _reader(self):
+        """
+        Returns the database the reads of the current request go to.
+        """
+        index = read_replica.get()
+        if index is None or not self._readers or self._current.get() is not None:
+            return self
+        return self._readers[index]
+
+    async def pool(self):
+        """
+        Returns the connection pool, creating it on first use.
+
+        Returns:
+            aiomysql.Pool: The connection pool.
+        """
+        if self._pool is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        minsize=1,
+                        maxsize=self._maxsize,
+                        pool_recycle=self._pool_recycle,
+                        **self.connect_params(),
+                    )
+        return self._pool
+
+    async def close(self):
+        """
+        Closes every pooled connection.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+            self._lock = None
+
+    def stats(self) -> dict:
+        """
+        Reports the current state of the connection pool.
+
+        Returns:
+            dict: The pool size limit, the connections in use and idle, and the
+            recycle timeout in seconds.
+        """
+        if self._pool is None:
+            return {"max_connections": self._maxsize, "in_use": 0, "idle": 0}
+        return {
+            "max_connections": self._pool.maxsize,
+            "in_use": self._pool.size - self._pool.freesize,
+            "idle": self._pool.freesize,
+            "pool_recycle": self._pool_recycle,
+        }
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Acquires a pooled connection for the current task, reusing the one of an
+        enclosing `connection()` block if there is one.
+
+        Yields:
+            aiomysql.Connection: The connection to run queries on.
+        """
+        conn = self._current.get()
+        if conn is not None:
+            yield conn
+            return
+
+        pool = await self.pool()
+        async with pool.acquire() as conn:
+            token = self._current.set(conn)
+            try:
+                yield conn
+            finally:
+                self._current.reset(token)
+
+    @asynccontextmanager
+    async def atomic(self):
+        """
+        Runs the enclosed queries in a transaction, or in a savepoint when
+        nested inside another `atomic()` block.
+
+        Yields:
+            aiomysql.Connection: The connection the transaction runs on.
+        """
+        async with self.connection() as conn:
+            depth = self._depth.get()
+            token = self._depth.set(depth + 1)
+            savepoint = f"s{depth}"
+            try:
+                if depth:
+                    await self._run(conn, f"SAVEPOINT {savepoint}")
+                else:
+                    await conn.begin()
+                try:
+                    yield conn
+                except BaseException:
+                    if depth:
+                        await self._run(conn, f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    else:
+                        await conn.rollback()
+                    raise
+                if depth:
+                    await self._run(conn, f"RELEASE SAVEPOINT {savepoint}")
+                else:
+                    await conn.commit()
+            finally:
+                self._depth.reset(token)
+
+    async def ping(self):
+        """
+        Checks that a pooled connection can be obtained and the server answers,
+        creating the pool on first use.
+
+        Raises:
+            pymysql.err.MySQLError: If the server cannot be reached.
+        """
+        async with self.connection() as conn:
+            await self._run(conn, "SELECT 1")
+
+    @staticmethod
+    async def _run(conn, sql: str):
+        """
+        Runs a statement without parameters on the given connection.
+        """
+        async with conn.cursor() as cursor:
+            with timed_query(sql):
+                await cursor.execute(sql)
+
+    async def fetch_all(self, query) -> list:
+        """
+        Runs a SELECT query and returns its rows.
+
+        Args:
+            query (Select): The peewee query to run.
+
+        Returns:
+            List[dict]: The rows as dictionaries.
+        """
+        reader = self._reader()
+        if reader is not self:
+            return await reader.fetch_all(query)
+        sql, params = query.sql()
+        async with self.connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                with timed_query(sql, params):
+                    await cursor.execute(sql, params)
+                return [_convert_row(row) for row in await cursor.fetchall()]
+
+    async def fetch_one(self, query):
+        """
+        Runs a SELECT query and returns its first row.
+
+        Args:
+            query (Select): The peewee query to run.
+
+        Returns:
+            Optional[dict]: The first row as a dictionary, or None if there is none.
+        """
+        reader = self._reader()
+        if reader is not self:
+            return await reader.fetch_one(query)
+        sql, params = query.sql()
+        async with self.connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                with timed_query(sql, params):
+                    await cursor.execute(sql, params)
+                row = await cursor.fetchone()
+        return None if row is None else _convert_row(row)
+
+    async def count_rows(self, query, table_version: int) -> int:
+        """
+        Runs a COUNT query, caching its result for the version of the table.
+        See `database.count_rows`.
+
+        Args:
+            query (Select): The query, selecting a single count as `total`.
+            table_version (int): The current version of the counted table.
+
+        Returns:
+            int: The count.
+        """
+        key = count_key(query, table_version)
+        total = count_cache.get(key)
+        if total is MISSING:
+            generation = count_cache.generation()
+            total = (await self.fetch_one(query))["total"] or 0
+            count_cache.put(key, total, generation)
+        return total
+
+    async def estimate_rows(self, query) -> int:
+        """
+        Estimates the rows a query would return from the index statistics,
+        with EXPLAIN, without running it. See `database.estimate_rows`.
+
+        Args:
+            query (Select): The query to estimate.
+
+        Returns:
+            int: The estimated number of rows.
+        """
+        reader = self._reader()
+        if reader is not self:
+            return await reader.estimate_rows(query)
+        sql, params = query.sql()
+        async with self.connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                with timed_query(f"EXPLAIN {sql}", params):
+                    await cursor.execute(f"EXPLAIN {sql}", params)
+                return explained_rows(await cursor.fetchall())
+
+    async def execute(self, query):
+        """
+        Runs an INSERT, UPDATE or DELETE query.
+
+        Args:
+            query (Query): The peewee query to run.
+
+        Returns:
+            aiomysql.Cursor: The closed cursor, for its `rowcount` and `lastrowid`.
+        """
+        sql, params = query.sql()
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                with timed_query(sql, params):
+                    await cursor.execute(sql, params)
+        return cursor
+
+    async def bump_table_version(self, model) -> int:
+        """
+        Bumps the version of the table of a model. See `database.table_version_bump`.
+
+        Args:
+            model (Model): The model whose table was written to.
+
+        Returns:
+            int: The new version of the table.
+        """
+        cursor = await self.execute(table_version_bump(model))
+        return cursor.lastrowid
+
+    async def get_table_version(self, model) -> int:
+        """
+        Reads the version of the table of a model.
+
+        Args:
+            model (Model): The model whose table version to read.
+
+        Returns:
+            int: The version of the table, 0 if it was never written to.
+        """
+        row = await self.fetch_one(table_version_select(model))
+        return 0 if row is None else row["version"]
+
+    async def insert_in_chunks(
+        self, model, rows: list, chunk_size: int = BULK_CHUNK_SIZE
+    ) -> dict:
+        """
+        Inserts rows with one multi-row INSERT per chunk, each in its own
+        transaction, falling back to row-by-row savepoints for a chunk that
+        violates a unique key. The IDs of each chunk are read back by its change
+        version. See `database.insert_in_chunks`.
+
+        Args:
+            model (Model): The model to insert into.
+            rows (list): The column values of every row to insert.
+            chunk_size (int): The maximum number of rows per INSERT.
+
+        Returns:
+            dict: The number of rows created and failed, and the outcome of
+            every row in the order of `rows`, and the table version after the
+            last chunk.
+        """
+        results, version = [], None
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size]
+            try:
+                async with self.atomic():
+                    version = await self.bump_table_version(model)
+                    await self.execute(
+                        model.insert_many(
+                            [{**row, "change_version": version} for row in chunk]
+                        )
+                    )
+                    row_ids = await self.fetch_all(chunk_ids_select(model, version))
+            except aiomysql.IntegrityError:
+                async with self.atomic():
+                    version = await self.bump_table_version(model)
+                    for offset, row in enumerate(chunk):
+                        try:
+                            async with self.atomic():
+                                row_cursor = await self.execute(
+                                    model.insert(**row, change_version=version)
+                                )
+                            results.append(
+                                bulk_outcome(
+                                    start + offset, row_cursor.lastrowid, None, version
+                                )
+                            )
+                        except aiomysql.IntegrityError as exc:
+                            results.append(bulk_outcome(start + offset, error=exc))
+            else:
+                results.extend(
+                    bulk_outcome(start + offset, row["id"], None, version)
+                    for offset, row in enumerate(row_ids)
+                )
+        return bulk_report(results, version)
+
+    async def iterate_unbuffered(self, query, chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        Runs a query through an unbuffered server-side cursor and yields its rows
+        in chunks, on a dedicated connection outside the pool.
+
+        Args:
+            query (Select): The query to run.
+            chunk_size (int): The number of rows fetched per round trip.
+
+        Yields:
+            Tuple[List[str], List[tuple]]: The column names and a chunk of rows.
+            The first chunk is always yielded, even when the result is empty.
+        """
+        sql, params = query.sql()
+        conn = await aiomysql.connect(
+            cursorclass=aiomysql.SSCursor, **self._reader().connect_params()
+        )
+        try:
+            cursor = await conn.cursor()
+            with timed_query(sql, params):
+                await cursor.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows = await cursor.fetchmany(chunk_size)
+            yield columns, rows
+            while len(rows) == chunk_size:
+                rows = await cursor.fetchmany(chunk_size)
+                if rows:
+                    yield columns, rows
+        finally:
+            conn.close()
+
+
+async_replicas = [
+    AsyncDatabase(MYSQL_POOL_SIZE, MYSQL_POOL_RECYCLE, source=replica)
+    for replica in replicas
+]
+async_database = AsyncDatabase(
+    MYSQL_POOL_SIZE, MYSQL_POOL_RECYCLE, readers=async_replicas
+)
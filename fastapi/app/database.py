@@ -2,26 +2,768 @@
 Database module for the API.
 """
 
-import os
+from contextvars import ContextVar
+from functools import wraps
+from typing import List, Optional
+from urllib.parse import unquote, urlsplit
+import pymysql
+from pymysql.constants import CLIENT
+from pymysql.cursors import DictCursor, SSCursor
 from peewee import (
+    IntegrityError,
+    ProgrammingError,
+    fn,
     Model,
-    MySQLDatabase,
     AutoField,
+    BigIntegerField,
     CharField,
+    CompositeKey,
     IntegerField,
     FloatField,
 )
-from dotenv import load_dotenv
+from playhouse.pool import PooledMySQLDatabase
+from playhouse.shortcuts import ReconnectMixin
 
-load_dotenv()
-
-database = MySQLDatabase(
-    os.getenv("MYSQL_DATABASE"),
-    user=os.getenv("MYSQL_USER"),
-    password=os.getenv("MYSQL_PASSWORD"),
-    host=os.getenv("MYSQL_HOST"),
-    port=int(os.getenv("MYSQL_PORT")),
+from config import (
+    MYSQL_CONNECT_TIMEOUT,
+    MYSQL_DATABASE,
+    MYSQL_HOST,
+    MYSQL_PASSWORD,
+    MYSQL_POOL_RECYCLE,
+    MYSQL_POOL_SIZE,
+    MYSQL_POOL_TIMEOUT,
+    MYSQL_PORT,
+    MYSQL_REPLICAS,
+    MYSQL_USER,
 )
+from helpers.cache import MISSING, count_cache
+from helpers.metrics import timed_query
+
+
+class PooledDatabase(
+    ReconnectMixin, PooledMySQLDatabase
+):  # pylint: disable=abstract-method
+    """
+    MySQL database backed by a thread-safe connection pool.
+
+    Connections idle for longer than the stale timeout are recycled on
+    check-out and check-in, dead connections are detected with a ping before
+    being handed out, and queries failing with a lost-connection error outside
+    a transaction are retried once on a fresh connection. Every query is timed
+    for the metrics of the route that runs it.
+    """
+
+    def execute_sql(self, sql, params=None, commit=None):
+        with timed_query(sql, params):
+            return super().execute_sql(sql, params, commit)
+
+    def stats(self) -> dict:
+        """
+        Reports the current state of the connection pool.
+
+        Returns:
+            dict: The pool size limit, the connections in use and idle, and the
+            stale and wait timeouts in seconds.
+        """
+        with self._pool_lock:
+            return {
+                "max_connections": self._max_connections,
+                "in_use": len(self._in_use),
+                "idle": len(self._connections),
+                "stale_timeout": self._stale_timeout,
+                "wait_timeout": self._wait_timeout,
+            }
+
+
+# The index in `replicas` of the replica chosen for the reads of the current
+# request, or None to read from the primary.
+read_replica = ContextVar("read_replica", default=None)
+
+
+class PrimaryDatabase(PooledDatabase):  # pylint: disable=abstract-method
+    """
+    The primary database, sending the SELECT statements of requests routed to
+    a replica there instead, unless they run inside a transaction.
+    """
+
+    def execute_sql(self, sql, params=None, commit=None):
+        index = read_replica.get()
+        if (
+            index is None
+            or self.in_transaction()
+            or sql.lstrip()[:6].upper() != "SELECT"
+        ):
+            return super().execute_sql(sql, params, commit)
+        replica = replicas[index]
+        if not replica.is_closed():
+            return replica.execute_sql(sql, params, commit)
+        # The rows are buffered by the cursor, so the connection can go back
+        # to the pool before they are read.
+        with replica.connection_context():
+            return replica.execute_sql(sql, params, commit)
+
+
+def _settings(dsn: Optional[str] = None) -> dict:
+    """
+    Builds the connection settings of the primary, or of a replica from its
+    host[:port] or mysql:// DSN, defaulting to the settings of the primary.
+    """
+    settings = {
+        "database": MYSQL_DATABASE,
+        "user": MYSQL_USER,
+        "password": MYSQL_PASSWORD,
+        "host": MYSQL_HOST,
+        "port": MYSQL_PORT,
+    }
+    if dsn is not None:
+        url = urlsplit(dsn if "://" in dsn else f"mysql://{dsn}")
+        settings.update(
+            (key, value)
+            for key, value in (
+                ("database", unquote(url.path.lstrip("/"))),
+                ("user", unquote(url.username or "")),
+                ("password", unquote(url.password or "")),
+                ("host", url.hostname),
+                ("port", url.port),
+            )
+            if value
+        )
+    return {
+        **settings,
+        "max_connections": MYSQL_POOL_SIZE,
+        "stale_timeout": MYSQL_POOL_RECYCLE,
+        "timeout": MYSQL_POOL_TIMEOUT,
+        "connect_timeout": MYSQL_CONNECT_TIMEOUT,
+        # Report matched rather than changed rows, so that an UPDATE writing
+        # the values a row already has still counts as having found it.
+        "client_flag": CLIENT.FOUND_ROWS,
+    }
+
+
+# No connection is opened here: the pools connect on the first unit of work.
+database = PrimaryDatabase(**_settings())
+replicas = [PooledDatabase(**_settings(dsn)) for dsn in MYSQL_REPLICAS]
+
+
+def reader():
+    """
+    Returns the database the reads of the current request go to.
+
+    Returns:
+        PooledDatabase: The chosen replica, or the primary.
+    """
+    index = read_replica.get()
+    return database if index is None else replicas[index]
+
+
+def connection_scope(func):
+    """
+    Runs the decorated function as one unit of work on a pooled connection.
+
+    A connection is checked out for the calling thread if it does not hold one
+    already, and returned to the pool when the function exits. Nested calls
+    reuse the connection of the outermost one. In a request whose reads are
+    routed to a replica, the primary is only connected to if a statement needs it.
+
+    Args:
+        func (Callable): The function to wrap.
+
+    Returns:
+        Callable: The wrapped function.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not database.is_closed():
+            return func(*args, **kwargs)
+        if read_replica.get() is None:
+            database.connect()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            database.close()
+
+    return wrapper
+
+
+def ping(timeout: float):
+    """
+    Checks that the primary answers, on a dedicated connection whose connect,
+    read and write timeouts are `timeout`, so an unresponsive server cannot
+    keep the calling thread blocked for longer than that.
+
+    Args:
+        timeout (float): The seconds each step of the check may take.
+
+    Raises:
+        pymysql.err.MySQLError: If the server cannot be reached in time.
+    """
+    conn = pymysql.connect(
+        db=database.database,
+        **{
+            **database.connect_params,
+            "connect_timeout": timeout,
+            "read_timeout": timeout,
+            "write_timeout": timeout,
+        },
+    )
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    finally:
+        conn.close()
+
+
+def explained_rows(plan: list) -> int:
+    """
+    Reads the number of rows the optimizer expects a single-table query to
+    return from its plan.
+
+    Args:
+        plan (List[dict]): The rows of the EXPLAIN of the query.
+
+    Returns:
+        int: The estimated rows examined, scaled by the estimated share of them
+        matching the conditions.
+    """
+    step = plan[0]
+    return round((step["rows"] or 0) * float(step.get("filtered") or 100) / 100)
+
+
+def count_key(query, table_version: int) -> tuple:
+    """
+    Builds the key of a count in the count cache.
+
+    Args:
+        query (Select): The query, selecting a single count.
+        table_version (int): The current version of the counted table.
+
+    Returns:
+        tuple: The table version, the SQL and the parameters of the query.
+    """
+    sql, params = query.sql()
+    return (table_version, sql, tuple(params))
+
+
+def count_rows(query, table_version: int) -> int:
+    """
+    Runs a COUNT query, caching its result for the version of the table, so
+    that the count is run again only after a write.
+
+    Args:
+        query (Select): The query, selecting a single count.
+        table_version (int): The current version of the counted table.
+
+    Returns:
+        int: The count.
+    """
+    key = count_key(query, table_version)
+    total = count_cache.get(key)
+    if total is MISSING:
+        generation = count_cache.generation()
+        total = _count(query)
+        count_cache.put(key, total, generation)
+    return total
+
+
+@connection_scope
+def _count(query) -> int:
+    """
+    Runs a COUNT query.
+    """
+    return query.scalar() or 0
+
+
+@connection_scope
+def estimate_rows(query) -> int:
+    """
+    Estimates the rows a query would return from the index statistics, with
+    EXPLAIN, without running it.
+
+    Args:
+        query (Select): The query to estimate.
+
+    Returns:
+        int: The estimated number of rows.
+    """
+    sql, params = query.sql()
+    cursor = database.execute_sql(f"EXPLAIN {sql}", params)
+    columns = [column[0] for column in cursor.description]
+    return explained_rows([dict(zip(columns, row)) for row in cursor.fetchall()])
+
+
+def replica_lag(index: int) -> Optional[float]:
+    """
+    Measures how far a replica is behind the primary.
+
+    Args:
+        index (int): The index of the replica in `replicas`.
+
+    Returns:
+        Optional[float]: The lag in seconds, 0 for a server that is not
+        replicating, or None if its replication is broken.
+
+    Raises:
+        PeeweeException: If the replica cannot be reached.
+    """
+    replica = replicas[index]
+    with replica.connection_context():
+        try:
+            cursor = replica.execute_sql("SHOW REPLICA STATUS")
+        except ProgrammingError:  # Before MySQL 8.0.22.
+            cursor = replica.execute_sql("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        columns = [column[0] for column in cursor.description or ()]
+    if row is None:
+        return 0.0
+    status = dict(zip(columns, row))
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+STREAM_CHUNK_SIZE = 1000
+
+
+def iterate_unbuffered(query, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Runs a query through an unbuffered server-side cursor and yields its rows
+    in chunks, so the result set is never held in memory as a whole.
+
+    A dedicated connection outside the pool is used because an unbuffered
+    result keeps the connection busy until it is fully read. It is opened to
+    the replica the reads of the request go to, if any.
+
+    Args:
+        query (Select): The query to run.
+        chunk_size (int): The number of rows fetched per round trip.
+
+    Yields:
+        Tuple[List[str], List[tuple]]: The column names and a chunk of rows.
+        The first chunk is always yielded, even when the result is empty.
+    """
+    sql, params = query.sql()
+    source = reader()
+    conn = pymysql.connect(
+        db=source.database,
+        autocommit=True,
+        cursorclass=SSCursor,
+        **source.connect_params,
+    )
+    try:
+        cursor = conn.cursor()
+        with timed_query(sql, params):
+            cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(chunk_size)
+        # The first chunk is yielded even when empty so that encoders always
+        # learn the column names.
+        yield columns, rows
+        while len(rows) == chunk_size:
+            rows = cursor.fetchmany(chunk_size)
+            if rows:
+                yield columns, rows
+    finally:
+        # Closing the cursor first would read the rest of an abandoned result
+        # set; closing the connection drops it on the server instead.
+        conn.close()
+
+
+def explain_statements(statements: list) -> list:
+    """
+    Captures the execution plans of statements without running them.
+
+    A dedicated connection outside the pool is used, so that profiling does
+    not compete with requests for pooled connections, nor show up in the
+    query metrics.
+
+    Args:
+        statements (list): The (sql, params) pair of every statement.
+
+    Returns:
+        List[List[dict]]: The rows of the EXPLAIN output of every statement.
+    """
+    conn = pymysql.connect(
+        db=database.database,
+        autocommit=True,
+        cursorclass=DictCursor,
+        **database.connect_params,
+    )
+    try:
+        plans = []
+        for sql, params in statements:
+            with conn.cursor() as cursor:
+                cursor.execute(f"EXPLAIN {sql}", params)
+                plans.append(cursor.fetchall())
+        return plans
+    finally:
+        conn.close()
+
+
+BULK_CHUNK_SIZE = 500
+BULK_MAX_ITEMS = 10000
+
+
+def bulk_outcome(
+    index: int,
+    row_id: Optional[int] = None,
+    error: Optional[Exception] = None,
+    change_version: Optional[int] = None,
+) -> dict:
+    """
+    Describes the outcome of one item of a bulk insert.
+
+    Args:
+        index (int): The position of the item in the request.
+        row_id (int): The ID generated for the item, if it was created.
+        error (Exception): The integrity error raised for the item, if any.
+        change_version (int): The change version the item was written with,
+            if it was created.
+
+    Returns:
+        dict: The index of the item and either its ID and change version or
+        the error message.
+    """
+    if error is not None:
+        return {"index": index, "status": "error", "detail": str(error.args[-1])}
+    return {
+        "index": index,
+        "status": "created",
+        "id": row_id,
+        "change_version": change_version,
+    }
+
+
+def bulk_report(results: list, table_version: Optional[int] = None) -> dict:
+    """
+    Summarizes the outcomes of a bulk insert.
+
+    Args:
+        results (list): The outcome of every item, as built by `bulk_outcome`.
+        table_version (Optional[int]): The version of the table after the
+            last chunk, None if nothing was inserted.
+
+    Returns:
+        dict: The number of items created and failed, every outcome, and the
+        table version.
+    """
+    created = sum(1 for result in results if result["status"] == "created")
+    return {
+        "created": created,
+        "failed": len(results) - created,
+        "results": results,
+        "table_version": table_version,
+    }
+
+
+def created_ids(report: dict) -> list:
+    """
+    Lists the IDs of the rows a bulk insert created.
+
+    Args:
+        report (dict): The report of the insert, as built by `bulk_report`.
+
+    Returns:
+        List[int]: The generated IDs, in the order of the rows.
+    """
+    return [
+        result["id"] for result in report["results"] if result["status"] == "created"
+    ]
+
+
+def created_records(rows: list, report: dict, error_type=IntegrityError) -> list:
+    """
+    Turns the report of a bulk insert into what inserting each row alone would
+    have given.
+
+    Args:
+        rows (list): The column values of every row inserted.
+        report (dict): The report of their insert, as built by `bulk_report`.
+        error_type (type): The exception to give the rows that failed.
+
+    Returns:
+        list: For every row, in order, either the created record or the
+        integrity error that prevented it.
+    """
+    return [
+        (
+            {
+                "id": result["id"],
+                **row,
+                "version": 1,
+                "change_version": result["change_version"],
+            }
+            if result["status"] == "created"
+            else error_type(result["detail"])
+        )
+        for row, result in zip(rows, report["results"])
+    ]
+
+
+def chunk_ids_select(model, change_version: int):
+    """
+    Builds the SELECT of the IDs of the rows written with a change version, in
+    ID order, read from the change version index.
+
+    A chunk is the only write holding its change version, so this returns the
+    IDs of its rows. They are in the order of the rows, as InnoDB hands out
+    increasing auto-increment values within a statement in every
+    `innodb_autoinc_lock_mode`; unlike deriving them from the first ID, this
+    holds whatever `auto_increment_increment` is and even where the values of
+    concurrent INSERTs interleave.
+
+    Args:
+        model (Model): The model the chunk was inserted into.
+        change_version (int): The table version the chunk was written at.
+
+    Returns:
+        Select: The SELECT query.
+    """
+    return (
+        model.select(model.id)
+        .where(model.change_version == change_version)
+        .order_by(model.id)
+    )
+
+
+def insert_in_chunks(model, rows: list, chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """
+    Inserts rows with one multi-row INSERT per chunk, each in its own transaction.
+
+    The table version is bumped once per chunk, and the rows of the chunk take
+    it as their change version, by which their IDs are read back with
+    `chunk_ids_select`. When a chunk violates a unique key it is rolled back
+    and its rows are inserted one by one under savepoints, so only the
+    offending rows fail.
+
+    Args:
+        model (Model): The model to insert into.
+        rows (list): The column values of every row to insert.
+        chunk_size (int): The maximum number of rows per INSERT.
+
+    Returns:
+        dict: The number of rows created and failed, and the outcome of every
+        row in the order of `rows`, and the table version after the last chunk.
+    """
+    results, version = [], None
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        try:
+            with database.atomic():
+                version = bump_table_version(model)
+                model.insert_many(
+                    [{**row, "change_version": version} for row in chunk]
+                ).execute()
+                row_ids = [row.id for row in chunk_ids_select(model, version)]
+        except IntegrityError:
+            with database.atomic():
+                version = bump_table_version(model)
+                for offset, row in enumerate(chunk):
+                    try:
+                        with database.atomic():
+                            row_id = model.insert(
+                                **row, change_version=version
+                            ).execute()
+                        results.append(
+                            bulk_outcome(start + offset, row_id, None, version)
+                        )
+                    except IntegrityError as exc:
+                        results.append(bulk_outcome(start + offset, error=exc))
+        else:
+            results.extend(
+                bulk_outcome(start + offset, row_id, None, version)
+                for offset, row_id in enumerate(row_ids)
+            )
+    return bulk_report(results, version)
+
+
+def versioned_update(
+    model, row_id: int, data: dict, expected_versions: Optional[List[int]] = None
+):
+    """
+    Builds a single-statement UPDATE of a row that also bumps its version.
+
+    The new version is assigned through LAST_INSERT_ID(expr), so it is returned
+    as the `lastrowid` of the statement without a follow-up SELECT.
+
+    Args:
+        model (Model): The model of the row.
+        row_id (int): The ID of the row to update.
+        data (dict): The new column values.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
+
+    Returns:
+        Update: The UPDATE query.
+    """
+    query = model.update(**data, version=fn.LAST_INSERT_ID(model.version + 1)).where(
+        model.id == row_id
+    )
+    if expected_versions is not None:
+        query = query.where(model.version.in_(expected_versions))
+    return query
+
+
+def versioned_delete(model, row_id: int, expected_versions: Optional[List[int]] = None):
+    """
+    Builds a single-statement DELETE of a row, optionally conditioned on its
+    version.
+
+    Args:
+        model (Model): The model of the row.
+        row_id (int): The ID of the row to delete.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
+
+    Returns:
+        Delete: The DELETE query.
+    """
+    query = model.delete().where(model.id == row_id)
+    if expected_versions is not None:
+        query = query.where(model.version.in_(expected_versions))
+    return query
+
+
+def tombstone_insert(model, row_id: int, change_version: int):
+    """
+    Builds the INSERT of the tombstone recording the deletion of a row, for the
+    clients syncing the changes of its table.
+
+    Args:
+        model (Model): The model of the deleted row.
+        row_id (int): The ID of the deleted row.
+        change_version (int): The table version the deletion was made at.
+
+    Returns:
+        Insert: The INSERT query.
+    """
+    return Tombstone.insert(
+        table_name=_table_name(model), row_id=row_id, change_version=change_version
+    )
+
+
+def _table_name(model) -> str:
+    """
+    Returns the name of the table a model is stored in.
+    """
+    return model._meta.table_name  # pylint: disable=protected-access
+
+
+def table_version_bump(model):
+    """
+    Builds an upsert that bumps the version of the table of a model.
+
+    The new version is assigned through LAST_INSERT_ID(expr), so it is returned
+    as the `lastrowid` of the statement. Run it as the first statement of the
+    transaction of the write, and give the rows written the new version as
+    their change version: the lock it takes on the version row then makes the
+    writes to the table commit in version order, so once a version is read
+    every row changed at or below it is visible to `changes_queries`.
+
+    Args:
+        model (Model): The model whose table was written to.
+
+    Returns:
+        Insert: The INSERT ... ON DUPLICATE KEY UPDATE query.
+    """
+    return TableVersion.insert(
+        table_name=_table_name(model), version=fn.LAST_INSERT_ID(1)
+    ).on_conflict(
+        update={TableVersion.version: fn.LAST_INSERT_ID(TableVersion.version + 1)}
+    )
+
+
+def table_version_select(model):
+    """
+    Builds a primary-key lookup of the version of the table of a model.
+
+    Args:
+        model (Model): The model whose table version to read.
+
+    Returns:
+        Select: The SELECT query.
+    """
+    return TableVersion.select(TableVersion.version).where(
+        TableVersion.table_name == _table_name(model)
+    )
+
+
+def bump_table_version(model) -> int:
+    """
+    Bumps the version of the table of a model.
+
+    Args:
+        model (Model): The model whose table was written to.
+
+    Returns:
+        int: The new version of the table.
+    """
+    return database.execute(table_version_bump(model)).lastrowid
+
+
+def get_table_version(model) -> int:
+    """
+    Reads the version of the table of a model.
+
+    Args:
+        model (Model): The model whose table version to read.
+
+    Returns:
+        int: The version of the table, 0 if it was never written to.
+    """
+    return table_version_select(model).scalar() or 0
+
+
+class TableVersion(Model):
+    """
+    Represents the version of a table, bumped by every write to it.
+
+    Attributes:
+        table_name (CharField): The name of the versioned table.
+        version (BigIntegerField): The number of writes to the table.
+    """
+
+    table_name = CharField(max_length=64, primary_key=True)
+    version = BigIntegerField(default=0)
+
+    class Meta:
+        """
+        Meta class for specifying the database and table name.
+
+        Attributes:
+            database (PooledDatabase): The database connection used by the model.
+            table_name (str): The name of the table in the database.
+        """
+
+        database = database
+        table_name = "table_versions"
+
+
+class Tombstone(Model):
+    """
+    Represents the deletion of a row, kept so that the clients syncing the
+    changes of a table learn about it.
+
+    Attributes:
+        table_name (CharField): The name of the table the row was deleted from.
+        change_version (BigIntegerField): The table version of the deletion.
+        row_id (IntegerField): The ID of the deleted row.
+    """
+
+    table_name = CharField(max_length=64)
+    change_version = BigIntegerField()
+    row_id = IntegerField()
+
+    class Meta:
+        """
+        Meta class for specifying the database, table name and primary key.
+
+        Attributes:
+            database (PooledDatabase): The database connection used by the model.
+            table_name (str): The name of the table in the database.
+            primary_key (CompositeKey): The key the changes are read in order of.
+        """
+
+        database = database
+        table_name = "tombstones"
+        primary_key = CompositeKey("table_name", "change_version", "row_id")
 
 
 class Airplane(Model):
@@ -36,6 +778,9 @@ class Airplane(Model):
         airline (CharField): The name of the airline operating the airplane (max 50 characters).
         max_speed (FloatField): The maximum speed of the airplane.
         weight (FloatField): The weight of the airplane.
+        version (IntegerField): The row version, bumped by every update.
+        change_version (BigIntegerField): The table version of the last write to
+            the row.
     """
 
     id = AutoField()
@@ -45,18 +790,28 @@ class Airplane(Model):
     airline = CharField(max_length=50)
     max_speed = FloatField()
     weight = FloatField()
+    version = IntegerField(default=1)
+    change_version = BigIntegerField(default=0)
 
     class Meta:
         """
-        Meta class for specifying the database and table name.
+        Meta class for specifying the database, table name and indexes.
 
         Attributes:
-            database (MySQLDatabase): The database connection used by the model.
+            database (PooledDatabase): The database connection used by the model.
             table_name (str): The name of the table in the database.
+            indexes (tuple): The secondary indexes, which the list filters and
+                sort orders must be served by.
         """
 
         database = database
         table_name = "airplanes"
+        indexes = (
+            (("airline",), False),
+            (("airline", "manufacture_year"), False),
+            (("manufacture_year",), False),
+            (("change_version",), False),
+        )
 
 
 class Cookbook(Model):
@@ -72,6 +827,9 @@ class Cookbook(Model):
         isbn (CharField): The ISBN of the cookbook (10 characters).
         num_pages (IntegerField): The number of pages in the cookbook.
         genre (CharField): The genre of the cookbook (max 50 characters).
+        version (IntegerField): The row version, bumped by every update.
+        change_version (BigIntegerField): The table version of the last write to
+            the row.
     """
 
     id = AutoField()
@@ -81,15 +839,141 @@ class Cookbook(Model):
     publication_year = IntegerField()
     num_pages = IntegerField()
     price = FloatField()
+    version = IntegerField(default=1)
+    change_version = BigIntegerField(default=0)
 
     class Meta:
         """
-        Meta class for specifying the database and table name.
+        Meta class for specifying the database, table name and indexes.
 
         Attributes:
-            database (MySQLDatabase): The database connection used by the model.
+            database (PooledDatabase): The database connection used by the model.
             table_name (str): The name of the table in the database.
+            indexes (tuple): The secondary indexes, which the list filters and
+                sort orders must be served by.
         """
 
         database = database
         table_name = "cook_books"
+        indexes = (
+            (("author",), False),
+            (("author", "publication_year"), False),
+            (("publication_year",), False),
+            (("price",), False),
+            (("change_version",), False),
+        )
+
+
+class AirplaneAirlineStats(Model):
+    """
+    Represents the running totals of the airplanes of an airline, maintained
+    by the triggers of the airplanes table.
+
+    Attributes:
+        airline (CharField): The name of the airline.
+        airplanes (IntegerField): The number of airplanes of the airline.
+        seats (BigIntegerField): The total number of seats of those airplanes.
+    """
+
+    airline = CharField(max_length=50, primary_key=True)
+    airplanes = IntegerField()
+    seats = BigIntegerField()
+
+    class Meta:
+        """
+        Meta class for specifying the database and table name.
+
+        Attributes:
+            database (PooledDatabase): The database connection used by the model.
+            table_name (str): The name of the table in the database.
+        """
+
+        database = database
+        table_name = "airplane_airline_stats"
+
+
+class AirplaneYearStats(Model):
+    """
+    Represents the running totals of the airplanes of a manufacture year,
+    maintained by the triggers of the airplanes table.
+
+    Attributes:
+        manufacture_year (IntegerField): The manufacture year.
+        airplanes (IntegerField): The number of airplanes of the year.
+        max_speed_sum (FloatField): The sum of their maximum speeds.
+        weight_sum (FloatField): The sum of their weights.
+    """
+
+    manufacture_year = IntegerField(primary_key=True)
+    airplanes = IntegerField()
+    max_speed_sum = FloatField()
+    weight_sum = FloatField()
+
+    class Meta:
+        """
+        Meta class for specifying the database and table name.
+
+        Attributes:
+            database (PooledDatabase): The database connection used by the model.
+            table_name (str): The name of the table in the database.
+        """
+
+        database = database
+        table_name = "airplane_year_stats"
+
+
+class CookbookPriceStats(Model):
+    """
+    Represents the running totals of the cookbooks of a price bucket,
+    maintained by the triggers of the cook_books table.
+
+    Attributes:
+        bucket (IntegerField): The price divided by the bucket width, rounded down.
+        cookbooks (IntegerField): The number of cookbooks in the bucket.
+        price_sum (FloatField): The sum of their prices.
+    """
+
+    bucket = IntegerField(primary_key=True)
+    cookbooks = IntegerField()
+    price_sum = FloatField()
+
+    class Meta:
+        """
+        Meta class for specifying the database and table name.
+
+        Attributes:
+            database (PooledDatabase): The database connection used by the model.
+            table_name (str): The name of the table in the database.
+        """
+
+        database = database
+        table_name = "cookbook_price_stats"
+
+
+class CookbookPageStats(Model):
+    """
+    Represents the running totals of the cookbooks of a page-count bucket,
+    maintained by the triggers of the cook_books table.
+
+    Attributes:
+        bucket (IntegerField): The page count divided by the bucket width,
+            rounded down.
+        cookbooks (IntegerField): The number of cookbooks in the bucket.
+        pages_sum (BigIntegerField): The sum of their page counts.
+    """
+
+    bucket = IntegerField(primary_key=True)
+    cookbooks = IntegerField()
+    pages_sum = BigIntegerField()
+
+    class Meta:
+        """
+        Meta class for specifying the database and table name.
+
+        Attributes:
+            database (PooledDatabase): The database connection used by the model.
+            table_name (str): The name of the table in the database.
+        """
+
+        database = database
+        table_name = "cookbook_page_stats"
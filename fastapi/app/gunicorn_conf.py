@@ -0,0 +1,92 @@
+"""
+Gunicorn settings for running the API in production.
+
+Gunicorn supervises one uvicorn worker process per available CPU, so requests
+are served by every core of the host:
+
+    gunicorn main:app -c gunicorn_conf.py
+
+Every setting can be overridden through the environment variables below.
+"""
+
+# Gunicorn reads its settings from lowercase module-level names.
+# pylint: disable=invalid-name
+
+import os
+from glob import glob
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def available_cpus() -> int:
+    """
+    Counts the CPUs this process may run on, honouring the CPU affinity mask
+    and the CFS quota a container may be limited to.
+
+    Returns:
+        int: The number of usable CPUs, at least 1.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS and Windows.
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="ascii") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, -(-int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(available_cpus())))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# The app is imported by each worker after the fork, so every worker builds its
+# own connection pools instead of sharing sockets inherited from the master.
+preload_app = False
+
+# On SIGTERM, workers stop accepting connections and get this long to finish
+# the requests in flight, and to close their pools in the lifespan shutdown.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Workers are replaced after serving this many requests, to bound the memory
+# they accumulate; the jitter keeps them from restarting all at once.
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("ACCESS_LOG")
+errorlog = "-"
+
+# Each worker writes its metrics to a file of its own in this directory, which
+# /metrics adds up; see helpers/metrics.py.
+metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(_server):
+    """
+    Clears the metrics files left in `PROMETHEUS_MULTIPROC_DIR` by a previous run,
+    so the counters start from zero with the new workers.
+    """
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob(os.path.join(metrics_dir, "*.json*")):
+            os.remove(path)
+
+
+def child_exit(_server, worker):
+    """
+    Marks the metrics file of a worker that exited, so that its counters and
+    histograms are still reported but its gauges are not.
+    """
+    if metrics_dir:
+        for path in glob(os.path.join(metrics_dir, f"live-{worker.pid}-*.json")):
+            name = os.path.basename(path).replace("live-", "dead-", 1)
+            os.replace(path, os.path.join(metrics_dir, name))
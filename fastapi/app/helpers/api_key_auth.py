@@ -2,16 +2,10 @@
 API Key Authentication
 """
 
-import os
-
-from dotenv import load_dotenv
+from config import API_KEY
 from fastapi import HTTPException, Security, status
 from fastapi.security.api_key import APIKeyHeader
 
-
-load_dotenv()
-
-API_KEY = os.getenv("API_KEY")
 API_KEY_NAME = "x-api-key"
 
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
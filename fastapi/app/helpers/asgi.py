@@ -0,0 +1,19 @@
+"""
+Helpers for the ASGI middlewares.
+"""
+
+
+class StatusRecorder:
+    """
+    Wraps the `send` callable of an ASGI request to remember the status code of
+    its response, 500 until a response is started.
+    """
+
+    def __init__(self, send):
+        self._send = send
+        self.status = 500
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        await self._send(message)
@@ -0,0 +1,47 @@
+"""
+Database backend selection.
+
+The `DB_BACKEND` environment variable chooses between the blocking peewee
+services ("sync", the default), which run in the threadpool, and the native
+asyncio services ("async").
+"""
+
+from functools import wraps
+
+from config import DB_BACKEND
+from fastapi.concurrency import run_in_threadpool
+
+
+class ThreadpoolService:
+    """
+    Exposes the functions of a sync service module as coroutines that run the
+    blocking calls in the threadpool.
+    """
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        func = getattr(self._module, name)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_in_threadpool(func, *args, **kwargs)
+
+        return wrapper
+
+
+def select_service(sync_service, async_service):
+    """
+    Picks the service module matching the configured backend.
+
+    Args:
+        sync_service (module): The service built on the blocking peewee calls.
+        async_service (module): The service built on the aiomysql pool.
+
+    Returns:
+        object: An object whose service functions are all coroutines.
+    """
+    if DB_BACKEND == "async":
+        return async_service
+    return ThreadpoolService(sync_service)
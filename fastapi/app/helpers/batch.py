@@ -0,0 +1,135 @@
+"""
+In-process dispatch of the sub-requests of a batch.
+
+Each sub-request is handed to the routes of the app as an ASGI call of its own,
+carrying the headers of the batch request (API key, cookies, ...) with its own
+on top, and its response is collected in memory instead of being sent.
+"""
+
+import asyncio
+import logging
+
+import orjson
+
+# Scope keys describing the connection, shared by the batch and its sub-requests.
+INHERITED_SCOPE = (
+    "asgi",
+    "http_version",
+    "scheme",
+    "server",
+    "client",
+    "root_path",
+    "app",
+    "state",
+)
+
+# Headers describing the body of the batch, which the sub-requests replace.
+BODY_HEADERS = (b"content-length", b"content-type", b"transfer-encoding")
+
+logger = logging.getLogger("batch")
+
+
+def _subrequest_scope(parent: dict, method: str, path: str, headers: dict) -> dict:
+    """
+    Builds the scope of a sub-request from the scope of the batch request.
+    """
+    path, _, query = path.partition("?")
+    own = [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in headers.items()
+    ]
+    replaced = {name for name, _value in own}.union(BODY_HEADERS)
+    scope = {key: parent[key] for key in INHERITED_SCOPE if key in parent}
+    scope.update(
+        type="http",
+        method=method,
+        path=path,
+        raw_path=path.encode(),
+        query_string=query.encode(),
+        headers=[
+            (name, value) for name, value in parent["headers"] if name not in replaced
+        ]
+        + own,
+    )
+    return scope
+
+
+def _decode_body(headers: dict, content: bytes):
+    """
+    Decodes a response body, parsing it when it is JSON.
+    """
+    if not content:
+        return None
+    if headers.get("content-type", "").startswith("application/json"):
+        return orjson.loads(content)
+    return content.decode("utf-8", "replace")
+
+
+async def dispatch(app, parent_scope: dict, sub) -> dict:
+    """
+    Runs one sub-request of a batch and collects its response.
+
+    Args:
+        app (ASGIApp): The app handling the sub-request, usually the router of
+            the API wrapped in its exception handlers.
+        parent_scope (dict): The scope of the batch request.
+        sub (SubRequest): The method, path, headers and JSON body of the
+            sub-request.
+
+    Returns:
+        dict: The status, headers and decoded body of the response. An event
+        stream is cut short and answered with 400, and an error the app does
+        not handle is logged and answered with 500.
+    """
+    method, path = sub.method, sub.path
+    content = b"" if sub.body is None else orjson.dumps(sub.body)
+    headers = dict(sub.headers)
+    if sub.body is not None:
+        headers.setdefault("content-type", "application/json")
+    headers["content-length"] = str(len(content))
+    scope = _subrequest_scope(parent_scope, method, path, headers)
+
+    requests = [{"type": "http.request", "body": content, "more_body": False}]
+
+    # Set when the sub-request is answered with an event stream, which would
+    # never end: the client then disconnects, which ends the stream.
+    refused = asyncio.Event()
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await refused.wait()
+        return {"type": "http.disconnect"}
+
+    response = {"status": 500, "headers": {}, "chunks": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in message.get("headers", [])
+                if name != b"content-length"
+            }
+            content_type = response["headers"].get("content-type", "")
+            if content_type.startswith("text/event-stream"):
+                refused.set()
+        elif message["type"] == "http.response.body" and not refused.is_set():
+            response["chunks"].append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Sub-request %s %s failed", method, path)
+        return {"status": 500, "headers": {}, "body": "Internal Server Error"}
+    if refused.is_set():
+        return {
+            "status": 400,
+            "headers": {},
+            "body": {"detail": "Streaming routes cannot be called in a batch"},
+        }
+    return {
+        "status": response["status"],
+        "headers": response["headers"],
+        "body": _decode_body(response["headers"], b"".join(response["chunks"])),
+    }
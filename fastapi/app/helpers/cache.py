@@ -0,0 +1,135 @@
+"""
+In-process read-through cache helpers.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    AIRPLANE_CACHE_SIZE,
+    CACHE_TTL,
+    COOKBOOK_CACHE_SIZE,
+    COUNT_CACHE_SIZE,
+)
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe LRU cache whose entries expire after a TTL.
+
+    Loads that started before an invalidation are not stored, so a value read
+    from the database concurrently with a write cannot outlive that write in
+    the cache. Entries can also be stored with the table version read before
+    their load, and looked up with the current one when a read must be
+    revalidated: an entry older than it is then a miss, which catches the writes
+    of other workers and the writes whose invalidation has not run yet.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "outdated": 0,
+        }
+
+    def get(self, key, version: int = 0):
+        """
+        Looks up a key, refreshing its position in the LRU order.
+
+        Args:
+            key (Hashable): The key to look up.
+            version (int): The current table version, whose older entries are
+                dropped, or 0 to accept any entry.
+
+        Returns:
+            object: The cached value, or `MISSING` if absent, expired or outdated.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return MISSING
+            expires_at, entry_version, value = entry
+            if expires_at < time.monotonic() or entry_version < version:
+                del self._entries[key]
+                counter = "outdated" if entry_version < version else "expirations"
+                self._counters[counter] += 1
+                self._counters["misses"] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    def generation(self) -> int:
+        """
+        Returns a token to take before loading a value to `put` afterwards.
+
+        Returns:
+            int: The number of invalidations so far.
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, key, value, generation: int, version: int = 0):
+        """
+        Stores a loaded value unless an invalidation happened since its load
+        started, evicting the least recently used entry when full.
+
+        Args:
+            key (Hashable): The key to store.
+            value (object): The value loaded for the key.
+            generation (int): The token taken before the load started.
+            version (int): The table version read before the load started.
+        """
+        if self._maxsize <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self._ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, key):
+        """
+        Drops a key and discards every load in progress.
+
+        Args:
+            key (Hashable): The key to drop.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        Reports the cache size and its hit, miss, eviction and expiration counters.
+
+        Returns:
+            dict: The cache counters.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self._maxsize,
+                "ttl": self._ttl,
+                **self._counters,
+            }
+
+
+airplane_cache = LRUCache(AIRPLANE_CACHE_SIZE, CACHE_TTL)
+cookbook_cache = LRUCache(COOKBOOK_CACHE_SIZE, CACHE_TTL)
+# Exact list counts, keyed by table version, so every write invalidates them.
+count_cache = LRUCache(COUNT_CACHE_SIZE, CACHE_TTL)
@@ -0,0 +1,25 @@
+"""
+Clock helpers.
+"""
+
+import time
+from datetime import datetime
+
+# Re-read at most once an hour, so a long-running process notices a new year.
+YEAR_TTL = 3600
+
+_current = {"year": 0, "expires": 0.0}
+
+
+def current_year() -> int:
+    """
+    Returns the current year without reading the wall clock on every call.
+
+    Returns:
+        int: The current year.
+    """
+    now = time.monotonic()
+    if now >= _current["expires"]:
+        _current["year"] = datetime.now().year
+        _current["expires"] = now + YEAR_TTL
+    return _current["year"]
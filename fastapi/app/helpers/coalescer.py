@@ -0,0 +1,126 @@
+"""
+Group commit of concurrent single-item creations.
+
+Each creation normally commits its own INSERT, so under a burst of concurrent
+POST requests the write rate is bounded by the commits the database can flush.
+When `COALESCE_WRITES` is set, the items submitted within `COALESCE_MAX_WAIT_MS`
+of each other, up to `COALESCE_MAX_BATCH` of them, are written by one multi-row
+INSERT in one transaction instead. Every caller still receives its own record,
+or has its own error raised, exactly as if it had inserted alone.
+"""
+
+import asyncio
+import logging
+
+from config import COALESCE_MAX_BATCH, COALESCE_MAX_WAIT_MS, COALESCE_WRITES
+from helpers.metrics import write_batch_size
+
+from fastapi import HTTPException
+
+logger = logging.getLogger("coalescer")
+
+
+class WriteCoalescer:
+    """
+    Collects the items submitted concurrently on the event loop and writes them
+    in batches.
+
+    `flush` is a coroutine function taking a list of items and returning, in
+    the same order, the outcome of each: the value to return to its caller, or
+    the exception to raise to it. If `flush` itself fails, the error is logged
+    once and every caller of the batch gets a 500 error of its own, chained to
+    it, as an exception instance raised to many tasks would have its traceback
+    and context rewritten by each of them.
+    """
+
+    def __init__(self, table: str, flush, max_batch: int, max_wait: float):
+        self._table = table
+        self._flush = flush
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._pending = []
+        self._timer = None
+        self._writes = set()
+
+    async def submit(self, item):
+        """
+        Queues an item for the next batch and waits for it to be written.
+
+        Args:
+            item (object): The item to write.
+
+        Returns:
+            object: The outcome of the item.
+
+        Raises:
+            Exception: The error raised for the item.
+            HTTPException: If the write of its whole batch failed (500).
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self._max_batch:
+            self._start_write()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._start_write)
+        return await future
+
+    def _start_write(self):
+        """
+        Closes the current batch and writes it in a task of its own, so a
+        caller going away does not cancel the write of the others.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        write = asyncio.ensure_future(self._write(batch))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list):
+        """
+        Writes a batch and resolves the future of each of its items.
+        """
+        write_batch_size.observe((self._table,), len(batch))
+        try:
+            outcomes = await self._flush([item for item, _future in batch])
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.exception("Write of %d %s failed", len(batch), self._table)
+            outcomes = [_batch_failed(exc) for _item in batch]
+        for (_item, future), outcome in zip(batch, outcomes):
+            if future.done():  # The caller was cancelled.
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+
+def _batch_failed(exc: Exception) -> HTTPException:
+    """
+    Builds the error raised to one caller of a batch whose write failed.
+    """
+    error = HTTPException(status_code=500, detail="Internal Server Error")
+    error.__cause__ = exc
+    return error
+
+
+def coalesced(table: str, create_one, create_many):
+    """
+    Picks how single items are created, depending on `COALESCE_WRITES`.
+
+    Args:
+        table (str): The table the items are inserted into, to label metrics.
+        create_one (Callable): The coroutine function creating one item.
+        create_many (Callable): The coroutine function creating a list of items,
+            as the `flush` of a `WriteCoalescer`.
+
+    Returns:
+        Callable: A coroutine function creating one item.
+    """
+    if not COALESCE_WRITES:
+        return create_one
+    return WriteCoalescer(
+        table, create_many, COALESCE_MAX_BATCH, COALESCE_MAX_WAIT_MS / 1000
+    ).submit
@@ -0,0 +1,99 @@
+"""
+Entity tag helpers.
+
+List responses are tagged with the version of their table, `"<table_version>"`,
+which is bumped by every write to the table, so a list tag can be checked
+without reading the rows it describes. Item responses are tagged with the table
+version of the last write to the row and the row version,
+`"<change_version>.<version>"`, both read from the row actually served.
+"""
+
+import re
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+
+_ITEM_TAG = re.compile(r'"\d+\.(\d+)"')
+
+
+def format_etag(table_version: int, version: Optional[int] = None) -> str:
+    """
+    Formats a strong entity tag from a table version and, for items, a row version.
+
+    Args:
+        table_version (int): The version of the table or, for items, the
+            change version of the row.
+        version (Optional[int]): The version of the row, for item responses.
+
+    Returns:
+        str: The quoted entity tag.
+    """
+    if version is None:
+        return f'"{table_version}"'
+    return f'"{table_version}.{version}"'
+
+
+def _entity_tags(header: str) -> List[str]:
+    """
+    Splits a comma-separated `If-Match`/`If-None-Match` header into its tags.
+    """
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def matching_etag(if_none_match: Optional[str], current: str) -> Optional[str]:
+    """
+    Finds the current tag, or `*`, in an `If-None-Match` header, in which case
+    the representation the client holds is still current.
+
+    Args:
+        if_none_match (Optional[str]): The raw header value, if the client sent one.
+        current (str): The tag of the current representation, from `format_etag`.
+
+    Returns:
+        Optional[str]: The current tag, to answer 304 Not Modified with, or None
+        if the representation has to be sent.
+    """
+    if not if_none_match:
+        return None
+    for tag in _entity_tags(if_none_match):
+        # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in ("*", current):
+            return current
+    return None
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[List[int]]:
+    """
+    Extracts the row versions a write is conditioned on from an `If-Match`
+    header of item tags (`"<change_version>.<version>"`).
+
+    Args:
+        if_match (Optional[str]): The raw header value, if the client sent one.
+
+    Returns:
+        Optional[List[int]]: The versions the row may still have, or None when
+        the write is unconditional (no header, or `*`).
+
+    Raises:
+        HTTPException: If the header holds no item tag, as no current
+        representation can match it (412).
+    """
+    if if_match is None:
+        return None
+    tags = _entity_tags(if_match)
+    if "*" in tags:
+        return None
+    versions = []
+    for tag in tags:
+        # If-Match uses the strong comparison, so weak tags never match.
+        match = _ITEM_TAG.fullmatch(tag)
+        if match is not None:
+            versions.append(int(match.group(1)))
+    if not versions:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match does not match the current version",
+        )
+    return versions
@@ -0,0 +1,163 @@
+"""
+In-process change feed.
+
+The write services publish an event once each write is committed, and the
+broadcaster fans it out to every subscriber of the worker. Each subscriber has
+a queue of at most `EVENTS_BUFFER_SIZE` events; a subscriber that falls that
+far behind is evicted, with a final "evicted" event, rather than slowing down
+the others or growing without bound.
+
+A worker only publishes its own writes, so while anyone is subscribed the table
+versions are also polled every `EVENTS_POLL_INTERVAL` seconds, and a version
+moved by another worker is announced as a "changed" event for the table.
+"""
+
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from config import EVENTS_BUFFER_SIZE
+
+# Put in the queue of an evicted subscriber, after its pending events are dropped.
+EVICTED = {"op": "evicted"}
+
+logger = logging.getLogger("events")
+
+
+class ChangeFeed:
+    """
+    Broadcasts the changes committed by the write services to the subscribers
+    of the worker, from any thread.
+    """
+
+    def __init__(self, buffer_size: int):
+        self._buffer_size = buffer_size
+        self._subscribers = {}
+        self._loop = None
+        self._sequence = itertools.count(1)
+        self._versions = {}
+        self._counters = {"published": 0, "evicted": 0}
+
+    def publish(
+        self, table: str, op: str, ids: list, table_version: Optional[int] = None
+    ):
+        """
+        Announces a committed write. Safe to call from the threadpool.
+
+        Args:
+            table (str): The resource written to, "airplanes" or "cookbooks".
+            op (str): "create", "update" or "delete".
+            ids (List[int]): The IDs of the rows written.
+            table_version (Optional[int]): The version of the table after the
+                write, if known.
+        """
+        loop = self._loop
+        if not self._subscribers or loop is None or not ids:
+            return
+        event = {"table": table, "op": op, "ids": ids, "table_version": table_version}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(event)
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: dict):
+        """
+        Numbers an event and queues it for every subscriber to its table,
+        evicting those whose queue is full. Runs on the event loop.
+        """
+        event["seq"] = next(self._sequence)
+        self._counters["published"] += 1
+        if event["table_version"] is not None:
+            self._versions[event["table"]] = max(
+                self._versions.get(event["table"], 0), event["table_version"]
+            )
+        for queue, table in list(self._subscribers.items()):
+            if table is not None and table != event["table"]:
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._evict(queue)
+
+    def _evict(self, queue: asyncio.Queue):
+        """
+        Drops a subscriber that fell behind, leaving it only the eviction notice.
+        """
+        del self._subscribers[queue]
+        self._counters["evicted"] += 1
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(EVICTED)
+
+    @asynccontextmanager
+    async def subscribe(self, table: Optional[str] = None):
+        """
+        Registers a subscriber for the duration of the block.
+
+        Args:
+            table (Optional[str]): The only resource to receive events for.
+
+        Yields:
+            asyncio.Queue: The queue the events of the subscriber are put in.
+        """
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self._buffer_size)
+        self._subscribers[queue] = table
+        try:
+            yield queue
+        finally:
+            self._subscribers.pop(queue, None)
+
+    async def watch(self, interval: float, read_versions):
+        """
+        Announces the writes made by other workers, until cancelled.
+
+        Args:
+            interval (float): The seconds between two polls.
+            read_versions (Callable[[], Awaitable[dict]]): Reads the current
+                version of every table, by resource name.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if not self._subscribers:
+                # Versions seen while nobody listened are not worth announcing.
+                self._versions.clear()
+                continue
+            try:
+                versions = await read_versions()
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                logger.warning("Could not poll the table versions: %r", exc)
+                continue
+            for table, version in versions.items():
+                seen = self._versions.setdefault(table, version)
+                if version > seen:
+                    self._deliver(
+                        {
+                            "table": table,
+                            "op": "changed",
+                            "ids": [],
+                            "table_version": version,
+                        }
+                    )
+
+    def stats(self) -> dict:
+        """
+        Reports the subscribers and the events published and evictions so far.
+
+        Returns:
+            dict: The number of subscribers, the buffer size and the counters.
+        """
+        return {
+            "subscribers": len(self._subscribers),
+            "buffer_size": self._buffer_size,
+            **self._counters,
+        }
+
+
+change_feed = ChangeFeed(EVENTS_BUFFER_SIZE)
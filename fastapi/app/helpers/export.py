@@ -0,0 +1,151 @@
+"""
+Export encoding and streaming helpers.
+
+Every export reads through a dedicated unbuffered connection outside the pool,
+so at most `EXPORT_MAX_CONCURRENT` of them run at once in a worker, and the
+connection of an export is closed as soon as its response ends, including when
+the client disconnects halfway.
+"""
+
+import csv
+import io
+import json
+import threading
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from config import EXPORT_MAX_CONCURRENT
+from fastapi import HTTPException
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _encode_chunk(columns: list, rows: list, export_format: str, first: bool) -> str:
+    """
+    Encodes one chunk of rows, preceded by the CSV header for the first chunk.
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if first:
+            writer.writerow(columns)
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=float) + "\n" for row in rows
+    )
+
+
+def encode_rows(chunks, export_format: str):
+    """
+    Encodes the row chunks produced by `iterate_unbuffered` in the given format.
+
+    Args:
+        chunks (Generator[Tuple[List[str], List[tuple]]]): The column names and
+            row chunks to encode.
+        export_format (str): Either "ndjson" or "csv".
+
+    Yields:
+        str: The encoded output, one piece per chunk.
+    """
+    first = True
+    try:
+        for columns, rows in chunks:
+            yield _encode_chunk(columns, rows, export_format, first)
+            first = False
+    finally:
+        chunks.close()
+
+
+async def encode_rows_async(chunks, export_format: str):
+    """
+    Encodes the row chunks produced by `AsyncDatabase.iterate_unbuffered`.
+
+    Args:
+        chunks (AsyncGenerator[Tuple[List[str], List[tuple]]]): The column names
+            and row chunks to encode.
+        export_format (str): Either "ndjson" or "csv".
+
+    Yields:
+        str: The encoded output, one piece per chunk.
+    """
+    first = True
+    try:
+        async for columns, rows in chunks:
+            yield _encode_chunk(columns, rows, export_format, first)
+            first = False
+    finally:
+        await chunks.aclose()
+
+
+class ExportSlots:
+    """
+    Bounds the number of exports streaming at once, from any thread.
+    """
+
+    def __init__(self, limit: int):
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def claim(self):
+        """
+        Takes a slot for an export, without waiting for one.
+
+        Returns:
+            Callable[[], None]: Gives the slot back; later calls do nothing.
+
+        Raises:
+            HTTPException: If every slot is taken (503).
+        """
+        # pylint: disable-next=consider-using-with
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=503,
+                detail="Too many exports in progress",
+                headers={"Retry-After": "5"},
+            )
+        released = threading.Lock()
+
+        def release():
+            # pylint: disable-next=consider-using-with
+            if released.acquire(blocking=False):
+                self._slots.release()
+
+        return release
+
+
+export_slots = ExportSlots(EXPORT_MAX_CONCURRENT)
+
+
+class ExportResponse(StreamingResponse):
+    """
+    Streams the output of an export encoder, closing the encoder, and with it
+    the connection of the export, and giving back its slot when the response
+    ends for any reason.
+    """
+
+    def __init__(self, content, export_format: str, name: str, release):
+        super().__init__(
+            content,
+            media_type=EXPORT_MEDIA_TYPES[export_format],
+            headers={
+                "Content-Disposition": f"attachment; filename={name}.{export_format}"
+            },
+        )
+        self._content = content
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                if hasattr(self._content, "aclose"):
+                    await self._content.aclose()
+                else:
+                    await run_in_threadpool(self._content.close)
+            finally:
+                self._release()
@@ -0,0 +1,349 @@
+"""
+Filtering and sorting helpers for the list routes.
+
+Filters are described by dataclasses whose fields are query parameters: `sort`
+names the sort column (prefixed with "-" for descending order), fields ending
+in `_min` or `_max` bound a range of the column they are named after, and every
+other field is an equality filter. Only combinations served by an index declared
+on the model are accepted, so a list request never scans the whole table.
+"""
+
+import operator
+from dataclasses import asdict
+from typing import Optional
+
+from peewee import SQL, fn
+
+from database import Tombstone
+from helpers.pagination import MAX_PAGE_SIZE, decode_cursor
+from fastapi import HTTPException
+
+
+def _conditions(filters) -> tuple:
+    """
+    Splits the filters that were given into equality filters and ranges.
+    """
+    equals, ranges = {}, {}
+    for name, value in asdict(filters).items():
+        if name == "sort" or value is None:
+            continue
+        if name.endswith(("_min", "_max")):
+            column = name[:-4]
+            low, high = ranges.get(column, (None, None))
+            ranges[column] = (value, high) if name.endswith("_min") else (low, value)
+        else:
+            equals[name] = value
+    return equals, ranges
+
+
+def _indexes(model) -> list:
+    """
+    Returns the columns of every secondary index declared on a model.
+    """
+    indexes = model._meta.indexes  # pylint: disable=protected-access
+    return [tuple(columns) for columns, _unique in indexes]
+
+
+def check_index_support(model, equals: dict, range_column, sort_column: str):
+    """
+    Rejects filters and sort orders that no index of the model can serve.
+
+    An index serves a request when its leading columns are the equality
+    filters, in any order, and its next column is the range and sort column.
+    Secondary indexes end with the primary key, which breaks ties, so without
+    a range or sort column the index must hold the equality filters only.
+
+    Args:
+        model (Model): The model being listed.
+        equals (dict): The equality filters, by column.
+        range_column (Optional[str]): The column filtered on a range, if any.
+        sort_column (str): The column to sort by, "id" for the primary key.
+
+    Raises:
+        HTTPException: If no index serves the request (400).
+    """
+    if range_column is not None and range_column != sort_column:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sort by {range_column} to filter on a range of it",
+        )
+    if not equals and sort_column == "id":
+        return
+    for columns in _indexes(model):
+        leading, rest = columns[: len(equals)], columns[len(equals) :]
+        if set(leading) != set(equals):
+            continue
+        if (sort_column == "id" and not rest) or rest[:1] == (sort_column,):
+            return
+    raise HTTPException(
+        status_code=400,
+        detail="No index supports this combination of filters and sort order",
+    )
+
+
+def _range_column(ranges: dict):
+    """
+    Returns the column filtered on a range, if any, rejecting several ranges.
+    """
+    if len(ranges) > 1:
+        raise HTTPException(
+            status_code=400, detail="Only one range can be filtered on at a time"
+        )
+    return next(iter(ranges), None)
+
+
+def _filtered(model, equals: dict, ranges: dict, columns: list):
+    """
+    Selects the rows of a model matching the equality filters and ranges.
+    """
+    query = model.select(*columns)
+    for name, value in equals.items():
+        query = query.where(getattr(model, name) == value)
+    for name, (low, high) in ranges.items():
+        if low is not None:
+            query = query.where(getattr(model, name) >= low)
+        if high is not None:
+            query = query.where(getattr(model, name) <= high)
+    return query
+
+
+def _seek(fields: list, values: list, descending: bool):
+    """
+    Builds the condition selecting the rows sorted after a keyset cursor, as
+    `a > x OR (a = x AND id > y)` rather than a row comparison, which not every
+    MySQL version turns into an index range.
+    """
+    after = operator.lt if descending else operator.gt
+    condition = None
+    for field, value in reversed(list(zip(fields, values))):
+        step = after(field, value)
+        condition = step if condition is None else step | ((field == value) & condition)
+    return condition
+
+
+def list_query(model, filters, limit: int, after=None, fields=None) -> tuple:
+    """
+    Builds the query of one page of a filtered and sorted list.
+
+    Args:
+        model (Model): The model being listed.
+        filters (dataclass): The filters and sort order of the list.
+        limit (int): The page size; one more row is selected to detect the next page.
+        after (Optional[str]): The cursor returned with the previous page.
+        fields (Optional[List[str]]): The columns to select, as parsed by
+            `parse_fields`, besides the sort key; all of them if not given.
+
+    Returns:
+        Tuple[Select, Callable[[dict], tuple]]: The query, and the function
+        extracting the sort key of a row for `build_page`.
+
+    Raises:
+        HTTPException: If more than one range is filtered on, no index serves
+        the request, or the cursor is malformed (400).
+    """
+    equals, ranges = _conditions(filters)
+    range_column = _range_column(ranges)
+    descending = filters.sort.startswith("-")
+    sort_column = filters.sort.lstrip("-")
+    check_index_support(model, equals, range_column, sort_column)
+
+    key_fields = [model.id]
+    if sort_column != "id":
+        key_fields.insert(0, getattr(model, sort_column))
+    query = _filtered(
+        model, equals, ranges, selected_columns(model, fields, key_fields)
+    )
+    if after is not None:
+        query = query.where(
+            _seek(key_fields, decode_cursor(after, len(key_fields)), descending)
+        )
+    query = query.order_by(
+        *(field.desc() if descending else field.asc() for field in key_fields)
+    ).limit(limit + 1)
+
+    names = [field.name for field in key_fields]
+    return query, lambda row: tuple(row[name] for name in names)
+
+
+def count_query(model, filters, approximate: bool = False):
+    """
+    Builds the query counting the rows matching the filters of a list, which
+    the database answers from the index serving the filters.
+
+    Args:
+        model (Model): The model being listed.
+        filters (dataclass): The filters of the list; the sort order is ignored.
+        approximate (bool): Whether to build the query to estimate with
+            `estimate_rows` instead, selecting the IDs of the rows, as the
+            optimizer does not estimate a bare COUNT(*).
+
+    Returns:
+        Select: The query, selecting the count as `total`, or the IDs.
+
+    Raises:
+        HTTPException: If more than one range is filtered on, or no index
+        serves the filters (400).
+    """
+    equals, ranges = _conditions(filters)
+    range_column = _range_column(ranges)
+    check_index_support(model, equals, range_column, range_column or "id")
+    column = model.id if approximate else fn.COUNT(SQL("*")).alias("total")
+    return _filtered(model, equals, ranges, [column])
+
+
+def changes_queries(model, since: Optional[int], limit: int, after=None) -> tuple:
+    """
+    Builds the queries of one page of the changes to a table: the rows written
+    and the tombstones of the rows deleted after a change version, both read
+    in (change version, ID) order from their index.
+
+    Args:
+        model (Model): The model whose changes are read.
+        since (Optional[int]): The table version the client last synced at,
+            every row and no tombstone if not given.
+        limit (int): The page size; one more row of each is selected to detect
+            the next page.
+        after (Optional[str]): The cursor returned with the previous page.
+
+    Returns:
+        Tuple[Select, Select]: The query of the rows, and the query of the
+        tombstones selecting the deleted IDs as `id`.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400).
+    """
+    table_name = model._meta.table_name  # pylint: disable=protected-access
+    rows = model.select()
+    deleted = Tombstone.select(
+        Tombstone.change_version, Tombstone.row_id.alias("id")
+    ).where(Tombstone.table_name == table_name)
+    if since is None:
+        # A full sync starts from an empty replica, with nothing to delete.
+        deleted = deleted.where(SQL("FALSE"))
+    else:
+        rows = rows.where(model.change_version > since)
+        deleted = deleted.where(Tombstone.change_version > since)
+    if after is not None:
+        key = decode_cursor(after, 2)
+        rows = rows.where(_seek([model.change_version, model.id], key, False))
+        deleted = deleted.where(
+            _seek([Tombstone.change_version, Tombstone.row_id], key, False)
+        )
+    return (
+        rows.order_by(model.change_version, model.id).limit(limit + 1),
+        deleted.order_by(Tombstone.change_version, Tombstone.row_id).limit(limit + 1),
+    )
+
+
+def parse_ids(raw: str) -> list:
+    """
+    Parses the comma-separated IDs of a lookup by IDs.
+
+    Args:
+        raw (str): The IDs, e.g. "3,1,2".
+
+    Returns:
+        List[int]: The distinct IDs, in the order they were given.
+
+    Raises:
+        HTTPException: If an ID is not a positive integer, or more than
+        `MAX_PAGE_SIZE` IDs are given (400).
+    """
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=400, detail="IDs must be comma-separated integers"
+        ) from exc
+    if not ids or min(ids) < 1:
+        raise HTTPException(status_code=400, detail="IDs must be positive integers")
+    if len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_PAGE_SIZE} IDs can be looked up"
+        )
+    return ids
+
+
+def lookup_result(ids: list, rows: dict, fields: Optional[list] = None) -> dict:
+    """
+    Arranges the rows found by a lookup by IDs in the order they were asked for.
+
+    Args:
+        ids (List[int]): The IDs looked up.
+        rows (dict): The rows found, by ID.
+        fields (Optional[List[str]]): The columns to return, all if not given.
+
+    Returns:
+        dict: The rows found, in the order of `ids`, and the IDs not found.
+    """
+    return {
+        "items": [project(rows[row_id], fields) for row_id in ids if row_id in rows],
+        "missing": [row_id for row_id in ids if row_id not in rows],
+    }
+
+
+def parse_fields(model, raw: Optional[str]) -> Optional[list]:
+    """
+    Parses a sparse fieldset, the comma-separated columns a client wants.
+
+    Args:
+        model (Model): The model whose columns may be requested.
+        raw (Optional[str]): The requested columns, e.g. "id,model,airline".
+
+    Returns:
+        Optional[List[str]]: The distinct columns, in the order given, or None
+        for every column.
+
+    Raises:
+        HTTPException: If no column, or a column the model does not have, is
+        requested (400).
+    """
+    if raw is None:
+        return None
+    fields = list(
+        dict.fromkeys(part.strip() for part in raw.split(",") if part.strip())
+    )
+    known = model._meta.sorted_field_names  # pylint: disable=protected-access
+    unknown = [name for name in fields if name not in known]
+    if unknown or not fields:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fields must be a comma-separated list of: {', '.join(known)}",
+        )
+    return fields
+
+
+def selected_columns(model, fields: Optional[list], required=()) -> list:
+    """
+    Lists the columns to select for a sparse fieldset, so that a narrow view
+    only reads those columns and can be served from a covering index.
+
+    Args:
+        model (Model): The model being selected from.
+        fields (Optional[List[str]]): The requested columns, None for all.
+        required (Sequence[Field]): Columns needed besides the requested ones,
+            such as the sort key of a page.
+
+    Returns:
+        List[Field]: The columns to pass to `select`, empty for all of them.
+    """
+    if fields is None:
+        return []
+    names = dict.fromkeys([*fields, *(field.name for field in required)])
+    return [getattr(model, name) for name in names]
+
+
+def project(row: dict, fields: Optional[list]) -> dict:
+    """
+    Keeps the requested columns of a row.
+
+    Args:
+        row (dict): The row.
+        fields (Optional[List[str]]): The requested columns, None for all.
+
+    Returns:
+        dict: The row restricted to `fields`.
+    """
+    if fields is None:
+        return row
+    return {name: row[name] for name in fields}
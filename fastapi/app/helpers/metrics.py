@@ -0,0 +1,454 @@
+"""
+Request and query metrics in the Prometheus text exposition format.
+
+Every metric is labelled with the route template of the request that produced
+it (e.g. `/api/airplanes/{airplane_id}`) rather than with its path, so the
+number of series stays bounded by the number of routes.
+
+Under gunicorn, each worker process has its own metrics. With
+`PROMETHEUS_MULTIPROC_DIR` set, every worker writes them to a file of its own
+in that directory, and `/metrics` reports the sum of every file, whichever
+worker answers the scrape. The files of workers that exited are kept for their
+counters and histograms, so the totals never go back, but their gauges are
+left out.
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from glob import glob
+from typing import Optional
+
+import anyio
+import orjson
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+from config import METRICS_DIR
+from helpers.asgi import StatusRecorder
+from helpers.profiling import record_statement
+
+# Latency buckets in seconds, from a cached lookup to a slow report.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+UNMATCHED_ROUTE = "unmatched"
+NO_ROUTE = "none"
+
+_route = ContextVar("metrics_route", default=NO_ROUTE)
+
+# Told apart from the file of an earlier worker that had the same process ID.
+_SNAPSHOT_ID = time.time_ns()
+
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+[`\"]?(\w+)", re.IGNORECASE)
+
+
+def _escape(value) -> str:
+    """
+    Escapes a label value as the exposition format requires.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """
+    Renders a label set, with an optional extra pre-rendered label.
+    """
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Gauge:
+    """
+    Thread-safe gauge with one value per label set. The values of several
+    workers are added up, or their maximum is taken if `aggregate` is "max".
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        aggregate: str = "sum",
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.aggregate = aggregate
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values: tuple = (), amount: float = 1):
+        """
+        Adds to the value of a label set.
+
+        Args:
+            values (tuple): The label values, in the order of `labels`.
+            amount (float): The amount to add, negative to subtract.
+        """
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def set(self, values: tuple, value: float):
+        """
+        Replaces the value of a label set.
+
+        Args:
+            values (tuple): The label values, in the order of `labels`.
+            value (float): The new value.
+        """
+        with self._lock:
+            self._values[values] = value
+
+    def snapshot(self) -> list:
+        """
+        Copies the values of every label set, for another worker to merge.
+
+        Returns:
+            list: The label values and the value of every label set.
+        """
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, merged: dict, snapshot: list):
+        """
+        Merges the snapshot of a worker into the values of other workers.
+
+        Args:
+            merged (dict): The values merged so far, by label set.
+            snapshot (list): The output of `snapshot` in the worker.
+        """
+        for labels, value in snapshot:
+            labels = tuple(labels)
+            if labels in merged and self.aggregate == "max":
+                merged[labels] = max(merged[labels], value)
+            else:
+                merged[labels] = merged.get(labels, 0) + value
+
+    def samples(self, values: Optional[dict] = None) -> list:
+        """
+        Lists the samples of every label set.
+
+        Args:
+            values (Optional[dict]): The values to list, by label set; those
+                of this worker if not given.
+
+        Returns:
+            List[str]: The sample lines.
+        """
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labels, labels)} {value}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    """
+    Thread-safe histogram with cumulative buckets, one series per label set.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        buckets: tuple = DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values: tuple, value: float):
+        """
+        Records an observation.
+
+        Args:
+            values (tuple): The label values, in the order of `labels`.
+            value (float): The observed value.
+        """
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum.
+                series = self._series[values] = [0] * (len(self._buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> list:
+        """
+        Copies the series of every label set, for another worker to merge.
+
+        Returns:
+            list: The label values and the bucket counts and sum of every
+            label set.
+        """
+        with self._lock:
+            return [[list(labels), list(data)] for labels, data in self._series.items()]
+
+    @staticmethod
+    def merge(merged: dict, snapshot: list):
+        """
+        Merges the snapshot of a worker into the series of other workers.
+
+        Args:
+            merged (dict): The series merged so far, by label set.
+            snapshot (list): The output of `snapshot` in the worker.
+        """
+        for labels, data in snapshot:
+            series = merged.setdefault(tuple(labels), [0] * len(data))
+            for index, value in enumerate(data):
+                series[index] += value
+
+    def samples(self, series: Optional[dict] = None) -> list:
+        """
+        Lists the bucket, sum and count samples of every label set.
+
+        Args:
+            series (Optional[dict]): The series to list, by label set; those of
+                this worker if not given.
+
+        Returns:
+            List[str]: The sample lines.
+        """
+        if series is None:
+            with self._lock:
+                series = {labels: list(data) for labels, data in self._series.items()}
+        lines = []
+        for labels, data in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self._buckets + ("+Inf",), data):
+                cumulative += count
+                bucket = _format_labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            label_set = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_set} {data[-1]}")
+            lines.append(f"{self.name}_count{label_set} {cumulative}")
+        return lines
+
+
+requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled.",
+    ("method", "route"),
+)
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, until its response is fully sent.",
+    ("method", "route", "status"),
+)
+threadpool_in_use = Gauge(
+    "threadpool_threads_in_use", "Worker threads running blocking calls."
+)
+threadpool_size = Gauge(
+    "threadpool_threads_max", "Worker threads available for blocking calls."
+)
+query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Time to execute a database query, by the route that ran it.",
+    ("route", "operation", "table"),
+)
+startup_duration = Gauge(
+    "app_startup_seconds",
+    "Time from the first import of the app to its startup, the slowest worker's.",
+    aggregate="max",
+)
+write_batch_size = Histogram(
+    "write_batch_size",
+    "Inserts written together by the write coalescer.",
+    ("table",),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+METRICS = (
+    startup_duration,
+    requests_in_progress,
+    request_duration,
+    threadpool_in_use,
+    threadpool_size,
+    query_duration,
+    write_batch_size,
+)
+
+
+def _describe_query(sql: str) -> tuple:
+    """
+    Names the statement type and the first table of a query.
+    """
+    operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    table = _TABLE.search(sql)
+    return operation, table.group(1) if table else ""
+
+
+def record_query(sql: str, seconds: float):
+    """
+    Records the execution time of a query against the current route.
+
+    Args:
+        sql (str): The statement that was executed.
+        seconds (float): How long it took to execute.
+    """
+    query_duration.observe((_route.get(), *_describe_query(sql)), seconds)
+
+
+@contextmanager
+def timed_query(sql: str, params=None):
+    """
+    Records the time spent in the block as the execution time of a query, and
+    adds the query to the profile of the request if it is profiled.
+
+    Args:
+        sql (str): The statement executed in the block.
+        params (Optional[Sequence]): The parameters of the statement.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        record_query(sql, seconds)
+        record_statement(sql, params, seconds)
+
+
+def _sample_threadpool():
+    """
+    Samples the occupancy of the default thread limiter of the event loop,
+    which runs the blocking calls. Must be called from the event loop.
+    """
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    threadpool_in_use.set((), limiter.borrowed_tokens)
+    threadpool_size.set((), limiter.total_tokens)
+
+
+def write_snapshot():
+    """
+    Writes the metrics of this worker to its file in `PROMETHEUS_MULTIPROC_DIR`,
+    replacing it at once so that a concurrent scrape never reads half of it.
+    """
+    path = os.path.join(METRICS_DIR, f"live-{os.getpid()}-{_SNAPSHOT_ID}.json")
+    snapshot = {metric.name: metric.snapshot() for metric in METRICS}
+    with open(f"{path}.tmp", "wb") as output:
+        output.write(orjson.dumps(snapshot))
+    os.replace(f"{path}.tmp", path)
+
+
+def _merge_snapshots() -> dict:
+    """
+    Merges the files of every worker, live or exited, by metric name. The
+    gauges of exited workers are left out.
+    """
+    merged = {metric.name: {} for metric in METRICS}
+    for path in glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path, "rb") as source:
+                snapshot = orjson.loads(source.read())
+        except (OSError, orjson.JSONDecodeError):
+            continue
+        exited = os.path.basename(path).startswith("dead-")
+        for metric in METRICS:
+            if not (exited and metric.kind == "gauge"):
+                metric.merge(merged[metric.name], snapshot.get(metric.name, []))
+    return merged
+
+
+async def flush_metrics(interval: float):
+    """
+    Writes the metrics of this worker to `PROMETHEUS_MULTIPROC_DIR` every
+    `interval` seconds until cancelled, and once more then.
+
+    Args:
+        interval (float): Seconds between two writes.
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    try:
+        while True:
+            _sample_threadpool()
+            await run_in_threadpool(write_snapshot)
+            await asyncio.sleep(interval)
+    finally:
+        write_snapshot()
+
+
+async def render() -> str:
+    """
+    Renders every metric, sampling the threadpool occupancy first. With
+    `PROMETHEUS_MULTIPROC_DIR` set, the metrics of every worker are added up.
+
+    Must be called from the event loop.
+
+    Returns:
+        str: The metrics in the Prometheus text exposition format.
+    """
+    _sample_threadpool()
+    merged = None
+    if METRICS_DIR:
+        await run_in_threadpool(write_snapshot)
+        merged = await run_in_threadpool(_merge_snapshots)
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(None if merged is None else merged[metric.name]))
+    return "\n".join(lines) + "\n"
+
+
+def _route_template(scope) -> str:
+    """
+    Finds the path template of the route a request is for. As in Starlette's
+    router, the first full match wins, and a route matching only the path
+    (another method) is used only when no route matches fully.
+    """
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request and labelling the queries it runs
+    with its route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = _route_template(scope)
+        token = _route.set(route)
+        labels = (scope["method"], route)
+        response = StatusRecorder(send)
+
+        requests_in_progress.inc(labels)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, response)
+        finally:
+            request_duration.observe(
+                (*labels, response.status), time.perf_counter() - started
+            )
+            requests_in_progress.inc(labels, -1)
+            _route.reset(token)
@@ -0,0 +1,108 @@
+"""
+Keyset pagination helpers.
+"""
+
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(key: tuple) -> str:
+    """
+    Encodes the sort key of the last row of a page into an opaque cursor.
+
+    Args:
+        key (tuple): The values of the sort key of the last row returned. The
+            last value is always the row ID, which breaks ties.
+
+    Returns:
+        str: A URL-safe cursor that can be sent back as the `after` parameter.
+    """
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int = 1) -> list:
+    """
+    Decodes a cursor previously produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The opaque cursor received from the client.
+        size (int): The number of values the sort key is expected to have.
+
+    Returns:
+        list: The values of the sort key stored in the cursor.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+    if not isinstance(key, list) or len(key) != size or not isinstance(key[-1], int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def build_page(rows: list, limit: int, key, fields=None) -> dict:
+    """
+    Builds a page from rows fetched with `limit + 1` so that the presence of a
+    next page is known without running a COUNT query.
+
+    Args:
+        rows (list): The rows fetched, at most `limit + 1` of them.
+        limit (int): The requested page size.
+        key (Callable[[dict], tuple]): Extracts the sort key from a row.
+        fields (Optional[List[str]]): The columns to return, when the rows
+            also hold sort key columns the client did not ask for.
+
+    Returns:
+        dict: The page items and the cursor of the next page (or None).
+    """
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(key(items[-1]))
+    if fields is not None:
+        items = [{name: row[name] for name in fields} for row in items]
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def build_changes(rows: list, deleted: list, limit: int, version: int) -> dict:
+    """
+    Builds a page of changes from the rows and tombstones fetched with
+    `limit + 1` each, merged in (change version, ID) order.
+
+    Args:
+        rows (list): The rows written, as fetched by `changes_queries`.
+        deleted (list): The tombstones, as fetched by `changes_queries`.
+        limit (int): The requested page size.
+        version (int): The table version read before the changes.
+
+    Returns:
+        dict: The rows written and the IDs deleted in the page, the cursor of
+        the next page (or None), and the version to sync from next time.
+    """
+    changes = sorted(
+        [(row["change_version"], row["id"], row) for row in rows]
+        + [(row["change_version"], row["id"], None) for row in deleted],
+        key=lambda change: change[:2],
+    )
+    page = changes[:limit]
+    next_cursor = None
+    if len(changes) > limit:
+        next_cursor = encode_cursor(page[-1][:2])
+    return {
+        "items": [row for _, _, row in page if row is not None],
+        "deleted": [row_id for _, row_id, row in page if row is None],
+        "next_cursor": next_cursor,
+        "version": version,
+    }
@@ -0,0 +1,161 @@
+"""
+Opt-in SQL profiling of requests.
+
+When `PROFILE_REQUESTS` is set, every statement run while handling a request is
+recorded with its duration. Requests running more statements than
+`PROFILE_MAX_QUERIES`, or spending more than `PROFILE_MAX_DB_MS` in the
+database, are logged as JSON lines on the "profiler" logger: one line for the
+request, then one per statement, linked by a request ID. Statements slower than
+`PROFILE_SLOW_QUERY_MS` are flagged, and with `PROFILE_EXPLAIN` their plans are
+captured after the response is sent.
+
+When profiling is disabled the middleware is not installed, and the only cost
+left is one context variable lookup per statement.
+"""
+
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    PROFILE_EXPLAIN,
+    PROFILE_MAX_DB_MS,
+    PROFILE_MAX_QUERIES,
+    PROFILE_SLOW_QUERY_MS,
+)
+from helpers.asgi import StatusRecorder
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+logger = logging.getLogger("profiler")
+
+_statements = ContextVar("profiled_statements", default=None)
+
+
+def record_statement(sql: str, params, seconds: float):
+    """
+    Adds a statement to the profile of the current request, if it is profiled.
+
+    Args:
+        sql (str): The statement that was executed.
+        params (Optional[Sequence]): Its parameters.
+        seconds (float): How long it took to execute.
+    """
+    statements = _statements.get()
+    if statements is not None:
+        statements.append((sql, params, seconds))
+
+
+def _log(event: str, **fields):
+    """
+    Writes one structured log line.
+    """
+    logger.warning(json.dumps({"event": event, **fields}, default=str))
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware recording the statements run by each HTTP request and
+    logging the requests that run too many of them or spend too long in the
+    database.
+
+    Plans are captured with `explain`, a blocking function taking a list of
+    (sql, params) pairs and returning their plans, run in the threadpool.
+    """
+
+    def __init__(self, app, explain=None):
+        self.app = app
+        self._explain = explain if PROFILE_EXPLAIN else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        statements = []
+        token = _statements.set(statements)
+        response = StatusRecorder(send)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, response)
+        finally:
+            _statements.reset(token)
+            elapsed = time.perf_counter() - started
+        await self._report(scope, response.status, elapsed, statements)
+
+    async def _report(self, scope, status: int, elapsed: float, statements: list):
+        """
+        Logs a request and its statements if it crossed a threshold.
+        """
+        db_ms = sum(seconds for _sql, _params, seconds in statements) * 1000
+        reasons = []
+        if len(statements) > PROFILE_MAX_QUERIES:
+            reasons.append("query_count")
+        if db_ms > PROFILE_MAX_DB_MS:
+            reasons.append("db_time")
+        slow = {
+            index
+            for index, (_sql, _params, seconds) in enumerate(statements)
+            if seconds * 1000 > PROFILE_SLOW_QUERY_MS
+        }
+        if slow:
+            reasons.append("slow_query")
+        if not reasons:
+            return
+
+        request_id = uuid.uuid4().hex
+        repeated = Counter(sql for sql, _params, _seconds in statements)
+        _log(
+            "slow_request",
+            request_id=request_id,
+            method=scope["method"],
+            path=scope["path"],
+            status=status,
+            reasons=reasons,
+            duration_ms=round(elapsed * 1000, 3),
+            queries=len(statements),
+            db_ms=round(db_ms, 3),
+            repeated_statements=sum(count - 1 for count in repeated.values()),
+        )
+        plans = await self._plans(statements, slow)
+        for index, (sql, _params, seconds) in enumerate(statements):
+            _log(
+                "request_query",
+                request_id=request_id,
+                index=index,
+                sql=sql,
+                duration_ms=round(seconds * 1000, 3),
+                slow=index in slow,
+                repeated=repeated[sql] > 1,
+                plan=plans.get(index),
+            )
+
+    async def _plans(self, statements: list, slow: set) -> dict:
+        """
+        Captures the plans of the slow statements, if enabled.
+
+        Returns:
+            Dict[int, list]: The plan of each explained statement, by index.
+        """
+        if self._explain is None:
+            return {}
+        explainable = [
+            index
+            for index in sorted(slow)
+            if statements[index][0].lstrip().split(None, 1)[0].upper() in EXPLAINABLE
+        ]
+        if not explainable:
+            return {}
+        try:
+            plans = await run_in_threadpool(
+                self._explain, [statements[index][:2] for index in explainable]
+            )
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            _log("explain_failed", error=repr(exc))
+            return {}
+        return dict(zip(explainable, plans))
@@ -0,0 +1,196 @@
+"""
+Read-replica routing helpers.
+
+The GET and HEAD requests of the API read from a replica, chosen round-robin
+among those whose lag behind the primary is within `REPLICA_MAX_LAG`; every
+other request, and every read inside a transaction, goes to the primary. A
+client that wrote is pinned to the primary for `READ_YOUR_WRITES_SECONDS`
+through a cookie, so it reads its own writes even from a lagging replica. When
+no replica is healthy the reads fall back to the primary.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import time
+from collections import Counter
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from config import READ_YOUR_WRITES_SECONDS, REPLICA_MAX_LAG
+from database import read_replica, replica_lag, replicas
+from fastapi.concurrency import run_in_threadpool
+
+# The cookie holding the time until which the reads of a client go to the primary.
+PRIMARY_COOKIE = "read_primary_until"
+
+ROUTED_PREFIX = "/api/"
+
+logger = logging.getLogger("replicas")
+
+
+class ReplicaRouter:
+    """
+    Tracks the lag of every replica and picks the replica of each read request.
+    """
+
+    def __init__(self, count: int, max_lag: float):
+        self._max_lag = max_lag
+        self._lags = [None] * count
+        self._errors = [None] * count
+        self._healthy = [False] * count
+        self._turn = itertools.count()
+        self._reads = Counter()
+
+    def choose(self) -> Optional[int]:
+        """
+        Picks the replica for the reads of a request.
+
+        Returns:
+            Optional[int]: The index of the replica, or None to read from the
+            primary because no replica is healthy.
+        """
+        healthy = [index for index, ok in enumerate(self._healthy) if ok]
+        index = healthy[next(self._turn) % len(healthy)] if healthy else None
+        self._reads[index] += 1
+        return index
+
+    def pin_to_primary(self):
+        """
+        Counts a read request sent to the primary because the client wrote.
+        """
+        self._reads[None] += 1
+
+    def update(self, index: int, lag: Optional[float], error: Optional[str] = None):
+        """
+        Records the outcome of a lag check.
+
+        Args:
+            index (int): The index of the replica.
+            lag (Optional[float]): The measured lag in seconds, None if unknown.
+            error (Optional[str]): Why the lag could not be measured, if it could not.
+        """
+        healthy = error is None and lag is not None and lag <= self._max_lag
+        if healthy != self._healthy[index]:
+            logger.warning(
+                "Replica %s is %s (lag: %s, error: %s)",
+                index,
+                "back in rotation" if healthy else "out of rotation",
+                lag,
+                error,
+            )
+        self._lags[index], self._errors[index] = lag, error
+        self._healthy[index] = healthy
+
+    async def check(self):
+        """
+        Measures the lag of every replica.
+        """
+        for index in range(len(self._lags)):
+            try:
+                lag = await run_in_threadpool(replica_lag, index)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                self.update(index, None, repr(exc))
+            else:
+                error = None if lag is not None else "Replication is stopped"
+                self.update(index, lag, error)
+
+    async def monitor(self, interval: float):
+        """
+        Measures the lag of every replica every `interval` seconds, until cancelled.
+
+        Args:
+            interval (float): The seconds between two checks.
+        """
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        """
+        Reports the state of every replica and where the reads went.
+
+        Returns:
+            dict: The lag limit, the lag, health and last error of every
+            replica, and the number of read requests sent to each.
+        """
+        return {
+            "max_lag": self._max_lag,
+            "replicas": [
+                {
+                    "index": index,
+                    "host": f"{replica.connect_params['host']}:"
+                    f"{replica.connect_params['port']}",
+                    "lag": self._lags[index],
+                    "healthy": self._healthy[index],
+                    "error": self._errors[index],
+                    "reads": self._reads[index],
+                }
+                for index, replica in enumerate(replicas)
+            ],
+            "primary_reads": self._reads[None],
+        }
+
+
+replica_router = ReplicaRouter(len(replicas), REPLICA_MAX_LAG)
+
+
+def _pinned_to_primary(scope) -> bool:
+    """
+    Tells whether the client of a request wrote recently.
+    """
+    until = HTTPConnection(scope).cookies.get(PRIMARY_COOKIE)
+    try:
+        return until is not None and float(until) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRoutingMiddleware:
+    """
+    ASGI middleware routing the reads of the API's GET and HEAD requests to a
+    replica, and pinning clients that wrote to the primary for a while.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(ROUTED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, self._pinning(send))
+            return
+        if _pinned_to_primary(scope):
+            replica_router.pin_to_primary()
+            index = None
+        else:
+            index = replica_router.choose()
+        token = read_replica.set(index)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            read_replica.reset(token)
+
+    @staticmethod
+    def _pinning(send):
+        """
+        Wraps `send` to pin the client to the primary when its write succeeds.
+        """
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_COOKIE}={until:.3f}; "
+                    f"Max-Age={math.ceil(READ_YOUR_WRITES_SECONDS)}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        return send_with_cookie
@@ -0,0 +1,78 @@
+"""
+Full-text search helpers.
+
+Searches run against FULLTEXT indexes built with the ngram parser, so a
+fragment of a word matches as well as the whole word.
+"""
+
+import re
+from typing import Optional
+
+from peewee import SQL
+from playhouse.mysql_ext import Match
+
+from helpers.pagination import decode_cursor
+from fastapi import HTTPException
+
+# Matches the server's ngram_token_size: shorter terms are not indexed.
+MIN_TERM_LENGTH = 2
+
+
+def boolean_query(text: str) -> str:
+    """
+    Turns free text into a boolean-mode query requiring every term as a phrase,
+    which the ngram parser matches anywhere inside the indexed words.
+
+    Args:
+        text (str): The text typed by the client.
+
+    Returns:
+        str: The AGAINST expression.
+
+    Raises:
+        HTTPException: If the text holds no term long enough to be indexed (400).
+    """
+    terms = [term for term in re.findall(r"\w+", text) if len(term) >= MIN_TERM_LENGTH]
+    if not terms:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Search needs a term of at least {MIN_TERM_LENGTH} characters",
+        )
+    return " ".join(f'+"{term}"' for term in terms)
+
+
+def search_query(
+    model, columns: tuple, text: str, limit: int, after: Optional[str] = None
+) -> tuple:
+    """
+    Builds the query of one page of search results, best matches first.
+
+    Every match has to be scored before the best ones are known, so pages are
+    addressed by offset rather than by a seek on the score.
+
+    Args:
+        model (Model): The model to search.
+        columns (tuple): The fields covered by the FULLTEXT index, in its order.
+        text (str): The text typed by the client.
+        limit (int): The page size; one more row is selected to detect the next page.
+        after (Optional[str]): The cursor returned with the previous page.
+
+    Returns:
+        Tuple[Select, int]: The query, and the offset of the page.
+
+    Raises:
+        HTTPException: If the text holds no searchable term, or the cursor is
+        malformed (400).
+    """
+    match = Match(columns, boolean_query(text), "IN BOOLEAN MODE")
+    (offset,) = decode_cursor(after) if after is not None else (0,)
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    query = (
+        model.select(model, match.alias("score"))
+        .where(match)
+        .order_by(SQL("score").desc(), model.id)
+        .limit(limit + 1)
+        .offset(offset)
+    )
+    return query, offset
@@ -0,0 +1,92 @@
+"""
+Statistics helpers.
+
+The stats endpoints read the summary tables kept up to date by the triggers in
+`schema.sql`, which hold one row per group, so their cost does not grow with
+the number of airplanes or cookbooks.
+"""
+
+from typing import Optional
+
+# Must match the bucket widths used by the cook_books triggers.
+PRICE_BUCKET_WIDTH = 10
+PAGE_BUCKET_WIDTH = 100
+
+
+def _average(total: float, count: int) -> Optional[float]:
+    """
+    Divides a sum by a count, or returns None for an empty group.
+    """
+    return total / count if count else None
+
+
+def airplane_report(by_airline: list, by_year: list) -> dict:
+    """
+    Builds the airplane stats from the airline and manufacture year summaries.
+
+    Args:
+        by_airline (list): The non-empty rows of `airplane_airline_stats`.
+        by_year (list): The non-empty rows of `airplane_year_stats`.
+
+    Returns:
+        dict: The airplane and seat totals, the seats per airline, and the
+        average speed and weight per manufacture year.
+    """
+    return {
+        "airplanes": sum(row["airplanes"] for row in by_airline),
+        "seats": sum(row["seats"] for row in by_airline),
+        "by_airline": [
+            {
+                "airline": row["airline"],
+                "airplanes": row["airplanes"],
+                "seats": row["seats"],
+                "average_seats": _average(row["seats"], row["airplanes"]),
+            }
+            for row in by_airline
+        ],
+        "by_manufacture_year": [
+            {
+                "manufacture_year": row["manufacture_year"],
+                "airplanes": row["airplanes"],
+                "average_max_speed": _average(row["max_speed_sum"], row["airplanes"]),
+                "average_weight": _average(row["weight_sum"], row["airplanes"]),
+            }
+            for row in by_year
+        ],
+    }
+
+
+def _distribution(rows: list, width: int) -> list:
+    """
+    Describes the buckets of a summary as ranges of values.
+    """
+    return [
+        {
+            "from": row["bucket"] * width,
+            "to": (row["bucket"] + 1) * width,
+            "cookbooks": row["cookbooks"],
+        }
+        for row in rows
+    ]
+
+
+def cookbook_report(by_price: list, by_pages: list) -> dict:
+    """
+    Builds the cookbook stats from the price and page-count summaries.
+
+    Args:
+        by_price (list): The non-empty rows of `cookbook_price_stats`.
+        by_pages (list): The non-empty rows of `cookbook_page_stats`.
+
+    Returns:
+        dict: The number of cookbooks, their average price and page count, and
+        the distributions of both.
+    """
+    cookbooks = sum(row["cookbooks"] for row in by_price)
+    return {
+        "cookbooks": cookbooks,
+        "average_price": _average(sum(row["price_sum"] for row in by_price), cookbooks),
+        "average_pages": _average(sum(row["pages_sum"] for row in by_pages), cookbooks),
+        "price_distribution": _distribution(by_price, PRICE_BUCKET_WIDTH),
+        "page_distribution": _distribution(by_pages, PAGE_BUCKET_WIDTH),
+    }
@@ -0,0 +1,61 @@
+"""
+Request validation helpers.
+
+Large JSON bodies are parsed and validated by a pydantic `TypeAdapter` in a
+single pydantic-core call, instead of being decoded into Python objects first
+and validated item by item.
+"""
+
+from pydantic import TypeAdapter, ValidationError
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+
+
+async def validate_body(request: Request, adapter: TypeAdapter):
+    """
+    Parses and validates the JSON body of a request with a type adapter.
+
+    Args:
+        request (Request): The request whose body to read.
+        adapter (TypeAdapter): The adapter of the expected body type.
+
+    Returns:
+        object: The validated body.
+
+    Raises:
+        RequestValidationError: If the body is not valid JSON or does not match
+        the expected type (422), reported like FastAPI's own body errors.
+    """
+    body = await request.body()
+    try:
+        return adapter.validate_json(body)
+    except ValidationError as exc:
+        errors = [
+            {**error, "loc": ("body", *error["loc"])}
+            for error in exc.errors(include_url=False)
+        ]
+        raise RequestValidationError(errors, body=body) from exc
+
+
+def body_schema(adapter: TypeAdapter) -> dict:
+    """
+    Documents a request body read with `validate_body`, for `openapi_extra`.
+
+    The models the type refers to must also appear in the OpenAPI components,
+    which holds for the schemas of the single-item routes.
+
+    Args:
+        adapter (TypeAdapter): The adapter of the expected body type.
+
+    Returns:
+        dict: The OpenAPI request body object.
+    """
+    schema = adapter.json_schema(ref_template="#/components/schemas/{model}")
+    schema.pop("$defs", None)
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": schema}},
+        }
+    }
@@ -1,42 +1,104 @@
 """
 This module defines a FastAPI application with multiple routes and an asynchronous context manager 
-to manage the database connection lifespan.
+to manage the database connection pool lifespan.
 """
 
-from contextlib import asynccontextmanager
-from database import database as connection
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, suppress
+
+# Imported first, so that the startup time covers every other import.
+from config import (
+    EVENTS_POLL_INTERVAL,
+    METRICS_DIR,
+    METRICS_FLUSH_INTERVAL,
+    PROFILE_REQUESTS,
+    REPLICA_CHECK_INTERVAL,
+    STARTED_AT,
+    STARTUP_BUDGET,
+)
+from async_database import async_database, async_replicas
+from database import database as connection, explain_statements, replicas
+from helpers.events import change_feed
+from helpers.metrics import (
+    MetricsMiddleware,
+    flush_metrics,
+    render,
+    startup_duration,
+)
+from helpers.profiling import ProfilerMiddleware
+from helpers.replicas import ReplicaRoutingMiddleware, replica_router
 from routes.airplane import airplane_router
+from routes.batch import batch_router
 from routes.cook_book import cookbook_router
+from routes.events import events_router, table_versions
+from routes.health import health_router
+from routes.system import system_router
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, RedirectResponse
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
     """
-    Asynchronous context manager to manage the database connection lifespan for the FastAPI app.
+    Asynchronous context manager to manage the database connection pool lifespan for the
+    FastAPI app.
 
     Args:
         app (FastAPI): The FastAPI application instance.
 
     Yields:
-        None: Pauses execution for the app's lifespan, ensuring the database connection is opened
-        at the start and closed at the end.
+        None: Pauses execution for the app's lifespan, ensuring every pooled connection is
+        closed at the end.
 
     Behavior:
-        - Opens the database connection if it's closed when the app starts.
-        - Ensures the database connection is closed after the app finishes running.
+        - Connections are checked out of the pool per unit of work by the services, so
+          nothing is opened when the app starts; `/readyz` reports when the database
+          can be reached.
+        - Records the time taken to start, and logs it when over `STARTUP_BUDGET`.
+        - Monitors the lag of the read replicas, if any, in the background.
+        - Polls the table versions for the change feed, in the background.
+        - Writes the metrics of the worker to `PROMETHEUS_MULTIPROC_DIR`, if set, in
+          the background.
+        - Closes every pooled connection, sync and async, after the app finishes running.
     """
-    if connection.is_closed():
-        connection.connect()
+    startup_seconds = time.perf_counter() - STARTED_AT
+    startup_duration.set((), startup_seconds)
+    if startup_seconds > STARTUP_BUDGET:
+        logging.getLogger("startup").warning(
+            "Startup took %.2f s, over the budget of %.2f s",
+            startup_seconds,
+            STARTUP_BUDGET,
+        )
+    tasks = [
+        asyncio.create_task(change_feed.watch(EVENTS_POLL_INTERVAL, table_versions))
+    ]
+    if replicas:
+        tasks.append(
+            asyncio.create_task(replica_router.monitor(REPLICA_CHECK_INTERVAL))
+        )
+    if METRICS_DIR:
+        tasks.append(asyncio.create_task(flush_metrics(METRICS_FLUSH_INTERVAL)))
     try:
         yield
     finally:
-        if not connection.is_closed():
-            connection.close()
+        for task in tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        for pool in (connection, *replicas):
+            pool.close_all()
+        for pool in (async_database, *async_replicas):
+            await pool.close()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(MetricsMiddleware)
+if PROFILE_REQUESTS:
+    app.add_middleware(ProfilerMiddleware, explain=explain_statements)
+if replicas:
+    app.add_middleware(ReplicaRoutingMiddleware)
 
 
 @app.get("/", include_in_schema=False)
@@ -50,5 +112,20 @@ def root():
     return RedirectResponse(url="/docs")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Exposes the request, threadpool and query metrics for Prometheus to scrape.
+
+    Returns:
+        PlainTextResponse: The metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(await render(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(airplane_router, prefix="/api/airplanes", tags=["airplanes"])
 app.include_router(cookbook_router, prefix="/api/cookbooks", tags=["cookbooks"])
+app.include_router(batch_router, tags=["batch"])
+app.include_router(events_router, tags=["events"])
+app.include_router(system_router, prefix="/system", tags=["system"])
+app.include_router(health_router, tags=["health"])
@@ -4,94 +4,374 @@ Airplane routes module.
 This module defines the routes for managing airplane data using FastAPI.
 """
 
-from schemas.airplane import AirplaneSchema
-
-from services.airplane import (
-    get_all_airplanes,
-    get_airplane_by_id,
-    create_airplane,
-    update_airplane,
-    delete_airplane,
+from typing import Literal, Optional, Union
+
+from pydantic import TypeAdapter, conlist
+
+from database import BULK_MAX_ITEMS, Airplane
+from helpers.backend import select_service
+from helpers.coalescer import coalesced
+from helpers.etag import format_etag, matching_etag, parse_if_match
+from helpers.export import ExportResponse, export_slots
+from helpers.filtering import parse_fields, parse_ids, project
+from helpers.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from helpers.validation import body_schema, validate_body
+from schemas.airplane import (
+    AirplaneChanges,
+    AirplaneFilters,
+    AirplanePage,
+    AirplaneRecord,
+    AirplaneSchema,
+    AirplaneSelection,
 )
 
-from fastapi import APIRouter
+from services import airplane as sync_service, airplane_async as async_service
+
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 
 
 airplane_router = APIRouter()
 
+service = select_service(sync_service, async_service)
+
+create_airplane = coalesced(
+    "airplanes", service.create_airplane, service.create_airplanes_grouped
+)
+
+airplane_batch = TypeAdapter(conlist(AirplaneSchema, max_length=BULK_MAX_ITEMS))
+
+
+# The routes taking `fields` return only those columns, so their models are
+# documented without being enforced on the response.
+@airplane_router.get(
+    "/",
+    responses={
+        200: {
+            "model": Union[AirplanePage, AirplaneSelection],
+            "description": "The airplanes, with only the columns named in `fields`.",
+        }
+    },
+)
+async def get_airplanes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    filters: AirplaneFilters = Depends(),
+    ids: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    count: Optional[Literal["exact", "approximate"]] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):  # pylint: disable=too-many-arguments
+    """
+    Retrieves a page of airplanes, filtered and sorted as requested.
+
+    Only combinations of filters and sort order served by an index are
+    accepted, so that no request scans the whole table.
+
+    With `ids`, the airplanes with those IDs are returned instead, in the order
+    given and read with a single query, along with the IDs that do not exist;
+    the other parameters are then ignored.
+
+    With `fields`, only those columns are selected and returned, so a narrow
+    view reads less and can be served from a covering index.
+
+    With `count`, the number of airplanes matching the filters is returned in
+    the `X-Total-Count` header, as for a HEAD request.
+
+    The page is tagged with the version of the airplane table, and a request
+    naming that tag in `If-None-Match` is answered with 304 Not Modified without
+    reading the airplanes.
+
+    Args:
+        limit (int): The maximum number of airplanes to return.
+        after (Optional[str]): The `next_cursor` of the previous page.
+        filters (AirplaneFilters): The filters and sort order of the list.
+        ids (Optional[str]): Comma-separated IDs of the airplanes to look up.
+        fields (Optional[str]): Comma-separated columns to return, all if not given.
+        count (Optional[str]): "exact" or "approximate" to return the total.
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
+
+    Returns:
+        ORJSONResponse: The airplanes of the page and the cursor of the next
+        page, or the airplanes looked up and the IDs not found.
+
+    Raises:
+        HTTPException: If the cursor, the IDs or the fields are malformed, or
+        no index serves the filters and sort order (400).
+    """
+    airplane_ids = parse_ids(ids) if ids is not None else None
+    columns = parse_fields(Airplane, fields)
+    table_version = await service.get_airplanes_version()
+    etag = matching_etag(if_none_match, format_etag(table_version))
+    if etag is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": format_etag(table_version)}
+    if airplane_ids is not None:
+        result = await service.get_airplanes_by_ids(
+            airplane_ids, columns, table_version
+        )
+    else:
+        result = await service.get_all_airplanes(limit, after, filters, columns)
+        if count is not None:
+            total = await service.count_airplanes(
+                filters, count == "approximate", table_version
+            )
+            headers["X-Total-Count"] = str(total)
+    return ORJSONResponse(result, headers=headers)
+
+
+@airplane_router.head("/")
+async def head_airplanes(
+    filters: AirplaneFilters = Depends(),
+    count: Literal["exact", "approximate"] = Query("exact"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Reports the number of airplanes matching the filters in the `X-Total-Count`
+    header, without reading them.
+
+    The exact count is run on the index serving the filters and cached until
+    the next write to the table. The approximate count is the estimate of the
+    optimizer, which costs no scan, for tables too large to count.
+
+    Args:
+        filters (AirplaneFilters): The filters of the list; the sort order is ignored.
+        count (str): "exact" or "approximate".
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
+
+    Returns:
+        Response: An empty response with the count and the ETag of the list.
+
+    Raises:
+        HTTPException: If no index serves the filters (400).
+    """
+    table_version = await service.get_airplanes_version()
+    etag = matching_etag(if_none_match, format_etag(table_version))
+    if etag is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    total = await service.count_airplanes(
+        filters, count == "approximate", table_version
+    )
+    return Response(
+        headers={"ETag": format_etag(table_version), "X-Total-Count": str(total)}
+    )
+
+
+@airplane_router.get("/stats")
+async def get_airplane_stats(if_none_match: Optional[str] = Header(None)):
+    """
+    Retrieves airplane statistics aggregated by the database.
+
+    The stats are tagged with the version of the airplane table, like the list.
+
+    Args:
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
+
+    Returns:
+        ORJSONResponse: The airplane and seat totals, the seats per airline,
+        and the average speed and weight per manufacture year.
+    """
+    table_version = await service.get_airplanes_version()
+    etag = matching_etag(if_none_match, format_etag(table_version))
+    if etag is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(
+        await service.get_airplane_stats(), headers={"ETag": format_etag(table_version)}
+    )
+
+
+@airplane_router.get("/export")
+async def export_airplanes_data(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    fields: Optional[str] = Query(None),
+):
+    """
+    Streams a full dump of the airplanes as NDJSON or CSV.
+
+    Args:
+        export_format (str): The output format, "ndjson" or "csv".
+        fields (Optional[str]): Comma-separated columns to export, all if not given.
+
+    At most `EXPORT_MAX_CONCURRENT` exports stream at once, as each holds a
+    dedicated database connection until it is fully sent or the client leaves.
+
+    Returns:
+        ExportResponse: The airplanes, sent chunk by chunk as they are read.
+
+    Raises:
+        HTTPException: If the fields are malformed (400), or too many exports
+        are in progress (503).
+    """
+    columns = parse_fields(Airplane, fields)
+    release = export_slots.claim()
+    try:
+        content = await service.export_airplanes(export_format, columns)
+    except BaseException:
+        release()
+        raise
+    return ExportResponse(content, export_format, "airplanes", release)
+
 
-@airplane_router.get("/")
-def get_airplanes():
+@airplane_router.get("/changes", response_model=AirplaneChanges)
+async def get_airplane_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+):
     """
-    Retrieves a list of all airplanes.
+    Retrieves the airplanes written and deleted since the client last synced, so a
+    reconnecting client reads the changes rather than the whole table.
+
+    Changes are returned in the order they were made, from the change version
+    index and the tombstones of the deleted airplanes. Every page carries the
+    table version the changes were read at; once `next_cursor` is null, the
+    client stores the `version` of the last page and sends it as `since` on
+    its next sync. Without `since`, every airplane is returned, as a full sync.
+
+    Args:
+        since (Optional[int]): The `version` returned by the last sync.
+        limit (int): The maximum number of changes to return.
+        after (Optional[str]): The `next_cursor` of the previous page.
 
     Returns:
-        List[dict]: A list of dictionaries representing all airplanes.
+        ORJSONResponse: The airplanes written, the IDs deleted, the cursor of the
+        next page and the current table version.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400).
     """
-    return get_all_airplanes()
+    return ORJSONResponse(await service.get_airplane_changes(since, limit, after))
 
 
-@airplane_router.get("/{id}")
-def get_airplane(airplane_id: int):
+@airplane_router.get(
+    "/{airplane_id}",
+    responses={
+        200: {
+            "model": AirplaneRecord,
+            "description": "The airplane, with only the columns named in `fields`.",
+        }
+    },
+)
+async def get_airplane(
+    airplane_id: int,
+    fields: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Retrieves a specific airplane by its ID.
 
+    The airplane is tagged with its change version and row version, both read from
+    the row served, and a request naming that tag in `If-None-Match` is
+    answered with 304 Not Modified.
+
+    With `fields`, only those columns are returned. The whole row is still read,
+    as a lookup by primary key reads it anyway, so it can be served from and
+    stored in the cache.
+
+    Unconditional requests are answered from the cache without a database
+    round trip. Conditional ones read the table version first and only trust
+    a cached airplane loaded at that version, so a copy left stale by the write of
+    another worker is not confirmed with 304.
+
     Args:
         airplane_id (int): The ID of the airplane to retrieve.
+        fields (Optional[str]): Comma-separated columns to return, all if not given.
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
 
     Returns:
-        dict: A dictionary representing the airplane if found.
+        ORJSONResponse: The airplane, if found.
 
     Raises:
-        HTTPException: If no airplane with the given ID is found (404).
+        HTTPException: If the fields are malformed (400), or no airplane with the
+        given ID is found (404).
     """
-    return get_airplane_by_id(airplane_id)
+    columns = parse_fields(Airplane, fields)
+    table_version = await service.get_airplanes_version() if if_none_match else 0
+    airplane = await service.get_airplane_by_id(airplane_id, table_version)
+    etag = format_etag(airplane["change_version"], airplane["version"])
+    if matching_etag(if_none_match, etag) is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(project(airplane, columns), headers={"ETag": etag})
 
 
-@airplane_router.post("/")
-def register_airplane(airplane: AirplaneSchema):
+@airplane_router.post("/", response_model=AirplaneRecord)
+async def register_airplane(airplane: AirplaneSchema):
     """
-    Registers a new airplane.
+    Registers a new airplane. With `COALESCE_WRITES`, it is inserted together with
+    the airplanes registered concurrently.
 
     Args:
         airplane (AirplaneSchema): The data of the airplane to register.
 
     Returns:
-        dict: A dictionary with the created airplane data.
+        ORJSONResponse: The created airplane.
+    """
+    return ORJSONResponse(await create_airplane(airplane))
+
+
+@airplane_router.post("/bulk", openapi_extra=body_schema(airplane_batch))
+async def register_airplanes_bulk(request: Request):
+    """
+    Registers many airplanes in one request.
+
+    The body, a list of at most `BULK_MAX_ITEMS` airplanes, is parsed and
+    validated in a single pydantic-core call.
+
+    Args:
+        request (Request): The request, whose body holds the airplanes to register.
+
+    Returns:
+        ORJSONResponse: The number of airplanes created and failed, and the
+        outcome of every item in request order.
     """
-    return create_airplane(airplane)
+    airplanes = await validate_body(request, airplane_batch)
+    return ORJSONResponse(await service.create_airplanes_bulk(airplanes))
 
 
-@airplane_router.put("/{id}")
-def update_airplane_data(airplane_id: int, airplane: AirplaneSchema):
+@airplane_router.put("/{airplane_id}")
+async def update_airplane_data(
+    airplane_id: int,
+    airplane: AirplaneSchema,
+    if_match: Optional[str] = Header(None),
+):
     """
     Updates an existing airplane's data by its ID.
 
     Args:
         airplane_id (int): The ID of the airplane to update.
         airplane (AirplaneSchema): The updated data of the airplane.
+        if_match (Optional[str]): The ETags of the versions the airplane may still have.
 
     Returns:
-        dict: A dictionary with the update confirmation message.
+        ORJSONResponse: The update confirmation message and new version.
 
     Raises:
-        HTTPException: If no airplane with the given ID is found (404).
+        HTTPException: If no airplane with the given ID is found (404), or it was
+        modified since the versions in `If-Match` (412).
     """
-    return update_airplane(airplane_id, airplane)
+    result = await service.update_airplane(
+        airplane_id, airplane, parse_if_match(if_match)
+    )
+    etag = format_etag(result.pop("table_version"), result["version"])
+    return ORJSONResponse(result, headers={"ETag": etag})
 
 
-@airplane_router.delete("/{id}")
-def remove_airplane(airplane_id: int):
+@airplane_router.delete("/{airplane_id}")
+async def remove_airplane(airplane_id: int, if_match: Optional[str] = Header(None)):
     """
     Deletes an airplane by its ID.
 
     Args:
         airplane_id (int): The ID of the airplane to delete.
+        if_match (Optional[str]): The ETags of the versions the airplane may still have.
 
     Returns:
-        dict: A dictionary with the deletion confirmation message.
+        ORJSONResponse: The deletion confirmation message.
 
     Raises:
-        HTTPException: If no airplane with the given ID is found (404).
+        HTTPException: If no airplane with the given ID is found (404), or it was
+        modified since the versions in `If-Match` (412).
     """
-    return delete_airplane(airplane_id)
+    return ORJSONResponse(
+        await service.delete_airplane(airplane_id, parse_if_match(if_match))
+    )
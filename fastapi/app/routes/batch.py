@@ -0,0 +1,73 @@
+"""
+Batch routes module.
+
+This module defines the route running many API requests in one HTTP call.
+"""
+
+from contextlib import asynccontextmanager
+
+from starlette.middleware.exceptions import ExceptionMiddleware
+
+from async_database import async_database
+from helpers.backend import DB_BACKEND
+from helpers.batch import dispatch
+from schemas.batch import BATCH_PATH, BatchRequest, BatchResponse
+
+from fastapi import APIRouter, Request
+from fastapi.responses import ORJSONResponse
+
+batch_router = APIRouter()
+
+
+@asynccontextmanager
+async def _batch_connection():
+    """
+    Holds one pooled connection for a whole batch with the async backend.
+
+    The sync backend keeps connections per thread, and every sub-request runs
+    its service calls in a threadpool thread, so there each sub-request checks
+    a connection out and returns it before the next one starts.
+    """
+    if DB_BACKEND == "async":
+        async with async_database.connection():
+            yield
+    else:
+        yield
+
+
+@batch_router.post(BATCH_PATH, response_model=BatchResponse)
+async def run_batch(batch: BatchRequest, request: Request):
+    """
+    Runs many API requests in one HTTP call.
+
+    The sub-requests are run in order, one at a time, so a sub-request sees
+    the writes of the previous ones. With the async backend they all share one
+    pooled database connection; with the sync backend each checks its own out
+    in turn, so a batch never holds more than one.
+
+    They are dispatched straight to the API routes, with the headers of the
+    batch request, and skip the middleware, which already handles the batch
+    request as a whole:
+
+    - the metrics count and time the batch once, under its own route, rather
+      than counting the same work again per sub-request;
+    - the profiler records the statements of the sub-requests in the profile
+      of the batch, as they run within its request;
+    - the batch is a POST, so its reads are not routed to a replica and every
+      sub-request reads from the primary, and a successful batch pins its
+      client to the primary with the read-your-writes cookie.
+
+    Args:
+        batch (BatchRequest): The sub-requests, at most `BATCH_MAX_REQUESTS`.
+        request (Request): The batch request.
+
+    Returns:
+        ORJSONResponse: The status, headers and body of every sub-request's
+        response, in order. Failed sub-requests do not fail the batch.
+    """
+    app = ExceptionMiddleware(
+        request.app.router, handlers=request.app.exception_handlers
+    )
+    async with _batch_connection():
+        responses = [await dispatch(app, request.scope, sub) for sub in batch.requests]
+    return ORJSONResponse({"responses": responses})
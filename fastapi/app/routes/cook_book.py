@@ -4,93 +4,412 @@ Cookbook routes module.
 This module defines the routes for managing cookbook data using FastAPI.
 """
 
-from schemas.cookbook import CookBookSchema
-
-from services.cookbook import (
-    get_all_cookbooks,
-    get_cookbook_by_id,
-    create_cookbook,
-    update_cookbook,
-    delete_cookbook,
+from typing import Literal, Optional, Union
+
+from pydantic import TypeAdapter, conlist
+
+from database import BULK_MAX_ITEMS, Cookbook
+from helpers.backend import select_service
+from helpers.coalescer import coalesced
+from helpers.etag import format_etag, matching_etag, parse_if_match
+from helpers.export import ExportResponse, export_slots
+from helpers.filtering import parse_fields, parse_ids, project
+from helpers.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from helpers.validation import body_schema, validate_body
+from schemas.cookbook import (
+    CookBookChanges,
+    CookBookFilters,
+    CookBookPage,
+    CookBookRecord,
+    CookBookSearchPage,
+    CookBookSchema,
+    CookBookSelection,
 )
 
-from fastapi import APIRouter
+from services import cookbook as sync_service, cookbook_async as async_service
+
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 
 cookbook_router = APIRouter()
 
+service = select_service(sync_service, async_service)
+
+create_cookbook = coalesced(
+    "cook_books", service.create_cookbook, service.create_cookbooks_grouped
+)
+
+cookbook_batch = TypeAdapter(conlist(CookBookSchema, max_length=BULK_MAX_ITEMS))
+
+
+# The routes taking `fields` return only those columns, so their models are
+# documented without being enforced on the response.
+@cookbook_router.get(
+    "/",
+    responses={
+        200: {
+            "model": Union[CookBookPage, CookBookSelection],
+            "description": "The cookbooks, with only the columns named in `fields`.",
+        }
+    },
+)
+async def get_cookbooks(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    filters: CookBookFilters = Depends(),
+    ids: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    count: Optional[Literal["exact", "approximate"]] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):  # pylint: disable=too-many-arguments
+    """
+    Retrieves a page of cookbooks, filtered and sorted as requested.
+
+    Only combinations of filters and sort order served by an index are
+    accepted, so that no request scans the whole table.
+
+    With `ids`, the cookbooks with those IDs are returned instead, in the order
+    given and read with a single query, along with the IDs that do not exist;
+    the other parameters are then ignored.
+
+    With `fields`, only those columns are selected and returned, so a narrow
+    view reads less and can be served from a covering index.
+
+    With `count`, the number of cookbooks matching the filters is returned in
+    the `X-Total-Count` header, as for a HEAD request.
+
+    The page is tagged with the version of the cookbook table, and a request
+    naming that tag in `If-None-Match` is answered with 304 Not Modified without
+    reading the cookbooks.
+
+    Args:
+        limit (int): The maximum number of cookbooks to return.
+        after (Optional[str]): The `next_cursor` of the previous page.
+        filters (CookBookFilters): The filters and sort order of the list.
+        ids (Optional[str]): Comma-separated IDs of the cookbooks to look up.
+        fields (Optional[str]): Comma-separated columns to return, all if not given.
+        count (Optional[str]): "exact" or "approximate" to return the total.
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
+
+    Returns:
+        ORJSONResponse: The cookbooks of the page and the cursor of the next
+        page, or the cookbooks looked up and the IDs not found.
+
+    Raises:
+        HTTPException: If the cursor, the IDs or the fields are malformed, or
+        no index serves the filters and sort order (400).
+    """
+    cookbook_ids = parse_ids(ids) if ids is not None else None
+    columns = parse_fields(Cookbook, fields)
+    table_version = await service.get_cookbooks_version()
+    etag = matching_etag(if_none_match, format_etag(table_version))
+    if etag is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": format_etag(table_version)}
+    if cookbook_ids is not None:
+        result = await service.get_cookbooks_by_ids(
+            cookbook_ids, columns, table_version
+        )
+    else:
+        result = await service.get_all_cookbooks(limit, after, filters, columns)
+        if count is not None:
+            total = await service.count_cookbooks(
+                filters, count == "approximate", table_version
+            )
+            headers["X-Total-Count"] = str(total)
+    return ORJSONResponse(result, headers=headers)
+
 
-@cookbook_router.get("/")
-def get_cookbooks():
+@cookbook_router.head("/")
+async def head_cookbooks(
+    filters: CookBookFilters = Depends(),
+    count: Literal["exact", "approximate"] = Query("exact"),
+    if_none_match: Optional[str] = Header(None),
+):
     """
-    Retrieves a list of all cookbooks.
+    Reports the number of cookbooks matching the filters in the `X-Total-Count`
+    header, without reading them.
+
+    The exact count is run on the index serving the filters and cached until
+    the next write to the table. The approximate count is the estimate of the
+    optimizer, which costs no scan, for tables too large to count.
+
+    Args:
+        filters (CookBookFilters): The filters of the list; the sort order is ignored.
+        count (str): "exact" or "approximate".
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
 
     Returns:
-        List[dict]: A list of dictionaries representing all cookbooks.
+        Response: An empty response with the count and the ETag of the list.
+
+    Raises:
+        HTTPException: If no index serves the filters (400).
     """
-    return get_all_cookbooks()
+    table_version = await service.get_cookbooks_version()
+    etag = matching_etag(if_none_match, format_etag(table_version))
+    if etag is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    total = await service.count_cookbooks(
+        filters, count == "approximate", table_version
+    )
+    return Response(
+        headers={"ETag": format_etag(table_version), "X-Total-Count": str(total)}
+    )
 
 
-@cookbook_router.get("/{id}")
-def get_cookbook(cookbook_id: int):
+@cookbook_router.get("/search", response_model=CookBookSearchPage)
+async def search_cookbooks(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Searches the cookbooks by fragments of their title or author.
+
+    Every term of `q` must appear in the title or the author, and the results
+    are ranked by relevance. Like the list, they are tagged with the version of
+    the cookbook table.
+
+    Args:
+        q (str): The text to search for.
+        limit (int): The maximum number of cookbooks to return.
+        after (Optional[str]): The `next_cursor` of the previous page.
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
+
+    Returns:
+        ORJSONResponse: The matching cookbooks of the page, best first, and
+        the cursor of the next page.
+
+    Raises:
+        HTTPException: If `q` holds no searchable term, or the cursor is
+        malformed (400).
+    """
+    table_version = await service.get_cookbooks_version()
+    etag = matching_etag(if_none_match, format_etag(table_version))
+    if etag is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(
+        await service.search_cookbooks(q, limit, after),
+        headers={"ETag": format_etag(table_version)},
+    )
+
+
+@cookbook_router.get("/stats")
+async def get_cookbook_stats(if_none_match: Optional[str] = Header(None)):
+    """
+    Retrieves cookbook statistics aggregated by the database.
+
+    The stats are tagged with the version of the cookbook table, like the list.
+
+    Args:
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
+
+    Returns:
+        ORJSONResponse: The number of cookbooks, their average price and page
+        count, and the distributions of both.
+    """
+    table_version = await service.get_cookbooks_version()
+    etag = matching_etag(if_none_match, format_etag(table_version))
+    if etag is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(
+        await service.get_cookbook_stats(), headers={"ETag": format_etag(table_version)}
+    )
+
+
+@cookbook_router.get("/export")
+async def export_cookbooks_data(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    fields: Optional[str] = Query(None),
+):
+    """
+    Streams a full dump of the cookbooks as NDJSON or CSV.
+
+    Args:
+        export_format (str): The output format, "ndjson" or "csv".
+        fields (Optional[str]): Comma-separated columns to export, all if not given.
+
+    At most `EXPORT_MAX_CONCURRENT` exports stream at once, as each holds a
+    dedicated database connection until it is fully sent or the client leaves.
+
+    Returns:
+        ExportResponse: The cookbooks, sent chunk by chunk as they are read.
+
+    Raises:
+        HTTPException: If the fields are malformed (400), or too many exports
+        are in progress (503).
+    """
+    columns = parse_fields(Cookbook, fields)
+    release = export_slots.claim()
+    try:
+        content = await service.export_cookbooks(export_format, columns)
+    except BaseException:
+        release()
+        raise
+    return ExportResponse(content, export_format, "cookbooks", release)
+
+
+@cookbook_router.get("/changes", response_model=CookBookChanges)
+async def get_cookbook_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None),
+):
+    """
+    Retrieves the cookbooks written and deleted since the client last synced, so a
+    reconnecting client reads the changes rather than the whole table.
+
+    Changes are returned in the order they were made, from the change version
+    index and the tombstones of the deleted cookbooks. Every page carries the
+    table version the changes were read at; once `next_cursor` is null, the
+    client stores the `version` of the last page and sends it as `since` on
+    its next sync. Without `since`, every cookbook is returned, as a full sync.
+
+    Args:
+        since (Optional[int]): The `version` returned by the last sync.
+        limit (int): The maximum number of changes to return.
+        after (Optional[str]): The `next_cursor` of the previous page.
+
+    Returns:
+        ORJSONResponse: The cookbooks written, the IDs deleted, the cursor of the
+        next page and the current table version.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400).
+    """
+    return ORJSONResponse(await service.get_cookbook_changes(since, limit, after))
+
+
+@cookbook_router.get(
+    "/{cookbook_id}",
+    responses={
+        200: {
+            "model": CookBookRecord,
+            "description": "The cookbook, with only the columns named in `fields`.",
+        }
+    },
+)
+async def get_cookbook(
+    cookbook_id: int,
+    fields: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Retrieves a specific cookbook by its ID.
 
+    The cookbook is tagged with its change version and row version, both read from
+    the row served, and a request naming that tag in `If-None-Match` is
+    answered with 304 Not Modified.
+
+    With `fields`, only those columns are returned. The whole row is still read,
+    as a lookup by primary key reads it anyway, so it can be served from and
+    stored in the cache.
+
+    Unconditional requests are answered from the cache without a database
+    round trip. Conditional ones read the table version first and only trust
+    a cached cookbook loaded at that version, so a copy left stale by the write of
+    another worker is not confirmed with 304.
+
     Args:
         cookbook_id (int): The ID of the cookbook to retrieve.
+        fields (Optional[str]): Comma-separated columns to return, all if not given.
+        if_none_match (Optional[str]): The ETag of the copy the client holds.
 
     Returns:
-        dict: A dictionary representing the cookbook if found.
+        ORJSONResponse: The cookbook, if found.
 
     Raises:
-        HTTPException: If no cookbook with the given ID is found (404).
+        HTTPException: If the fields are malformed (400), or no cookbook with the
+        given ID is found (404).
     """
-    return get_cookbook_by_id(cookbook_id)
+    columns = parse_fields(Cookbook, fields)
+    table_version = await service.get_cookbooks_version() if if_none_match else 0
+    cookbook = await service.get_cookbook_by_id(cookbook_id, table_version)
+    etag = format_etag(cookbook["change_version"], cookbook["version"])
+    if matching_etag(if_none_match, etag) is not None:
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(project(cookbook, columns), headers={"ETag": etag})
 
 
-@cookbook_router.post("/")
-def register_cookbook(cookbook: CookBookSchema):
+@cookbook_router.post("/", response_model=CookBookRecord)
+async def register_cookbook(cookbook: CookBookSchema):
     """
-    Registers a new cookbook.
+    Registers a new cookbook. With `COALESCE_WRITES`, it is inserted together with
+    the cookbooks registered concurrently.
 
     Args:
         cookbook (CookBookSchema): The data of the cookbook to register.
 
     Returns:
-        dict: A dictionary with the created cookbook data.
+        ORJSONResponse: The created cookbook.
+    """
+    return ORJSONResponse(await create_cookbook(cookbook))
+
+
+@cookbook_router.post("/bulk", openapi_extra=body_schema(cookbook_batch))
+async def register_cookbooks_bulk(request: Request):
+    """
+    Registers many cookbooks in one request.
+
+    The body, a list of at most `BULK_MAX_ITEMS` cookbooks, is parsed and
+    validated in a single pydantic-core call.
+
+    Args:
+        request (Request): The request, whose body holds the cookbooks to register.
+
+    Returns:
+        ORJSONResponse: The number of cookbooks created and failed, and the
+        outcome of every item in request order.
     """
-    return create_cookbook(cookbook)
+    cookbooks = await validate_body(request, cookbook_batch)
+    return ORJSONResponse(await service.create_cookbooks_bulk(cookbooks))
 
 
-@cookbook_router.put("/{id}")
-def update_cookbook_data(cookbook_id: int, cookbook: CookBookSchema):
+@cookbook_router.put("/{cookbook_id}")
+async def update_cookbook_data(
+    cookbook_id: int,
+    cookbook: CookBookSchema,
+    if_match: Optional[str] = Header(None),
+):
     """
     Updates an existing cookbook's data by its ID.
 
     Args:
         cookbook_id (int): The ID of the cookbook to update.
         cookbook (CookBookSchema): The updated data of the cookbook.
+        if_match (Optional[str]): The ETags of the versions the cookbook may still have.
 
     Returns:
-        dict: A dictionary with the update confirmation message.
+        ORJSONResponse: The update confirmation message and new version.
 
     Raises:
-        HTTPException: If no cookbook with the given ID is found (404).
+        HTTPException: If no cookbook with the given ID is found (404), or it was
+        modified since the versions in `If-Match` (412).
     """
-    return update_cookbook(cookbook_id, cookbook)
+    result = await service.update_cookbook(
+        cookbook_id, cookbook, parse_if_match(if_match)
+    )
+    etag = format_etag(result.pop("table_version"), result["version"])
+    return ORJSONResponse(result, headers={"ETag": etag})
 
 
-@cookbook_router.delete("/{id}")
-def remove_cookbook(cookbook_id: int):
+@cookbook_router.delete("/{cookbook_id}")
+async def remove_cookbook(cookbook_id: int, if_match: Optional[str] = Header(None)):
     """
     Deletes a cookbook by its ID.
 
     Args:
         cookbook_id (int): The ID of the cookbook to delete.
+        if_match (Optional[str]): The ETags of the versions the cookbook may still have.
 
     Returns:
-        dict: A dictionary with the deletion confirmation message.
+        ORJSONResponse: The deletion confirmation message.
 
     Raises:
-        HTTPException: If no cookbook with the given ID is found (404).
+        HTTPException: If no cookbook with the given ID is found (404), or it was
+        modified since the versions in `If-Match` (412).
     """
-    return delete_cookbook(cookbook_id)
+    return ORJSONResponse(
+        await service.delete_cookbook(cookbook_id, parse_if_match(if_match))
+    )
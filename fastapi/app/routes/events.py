@@ -0,0 +1,146 @@
+"""
+Change feed routes module.
+
+This module defines the Server-Sent Events stream of the changes committed to
+the airplanes and cookbooks, for clients that would otherwise poll the lists.
+"""
+
+import asyncio
+import json
+from typing import Literal, Optional
+
+from config import EVENTS_PING_INTERVAL
+from database import read_replica
+from helpers.backend import select_service
+from helpers.events import EVICTED, change_feed
+from services import (
+    airplane as airplane_sync,
+    airplane_async,
+    cookbook as cookbook_sync,
+    cookbook_async,
+)
+
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+
+events_router = APIRouter()
+
+airplane_service = select_service(airplane_sync, airplane_async)
+cookbook_service = select_service(cookbook_sync, cookbook_async)
+
+
+async def table_versions() -> dict:
+    """
+    Reads the current version of every table of the change feed.
+
+    Returns:
+        dict: The version of the airplane and cookbook tables, by resource name.
+    """
+    return {
+        "airplanes": await airplane_service.get_airplanes_version(),
+        "cookbooks": await cookbook_service.get_cookbooks_version(),
+    }
+
+
+def _event_id(versions: dict) -> str:
+    """
+    Encodes the table versions a client has been told about as an event ID,
+    such as "airplanes:130,cookbooks:52".
+    """
+    return ",".join(f"{name}:{version}" for name, version in sorted(versions.items()))
+
+
+def _parse_event_id(raw: Optional[str]) -> dict:
+    """
+    Decodes an event ID built by `_event_id`, ignoring a malformed one.
+    """
+    try:
+        return {
+            name: int(version)
+            for name, version in (item.split(":") for item in raw.split(","))
+        }
+    except (AttributeError, ValueError):
+        return {}
+
+
+def _format(event: dict, versions: dict) -> str:
+    """
+    Encodes an event as a Server-Sent Event, identified by the table versions
+    announced so far.
+    """
+    if event["table_version"] is not None:
+        versions[event["table"]] = max(
+            versions.get(event["table"], 0), event["table_version"]
+        )
+    return (
+        f"id: {_event_id(versions)}\nevent: {event['op']}\n"
+        f"data: {json.dumps(event)}\n\n"
+    )
+
+
+async def _event_stream(table: Optional[str], last_event_id: Optional[str]):
+    """
+    Encodes the events of a subscription as Server-Sent Events, with a comment
+    sent on idle connections so proxies keep them open.
+
+    A reconnecting client is first sent a "changed" event for every table whose
+    version moved past the one in its last event ID. The versions are read from
+    the primary, as a lagging replica would hide the writes the client missed.
+    """
+    # The stream runs in a task of its own, so this only affects its reads.
+    read_replica.set(None)
+    async with change_feed.subscribe(table) as queue:
+        versions = await table_versions()
+        if table is not None:
+            versions = {table: versions[table]}
+        yield "retry: 3000\n\n"
+        seen = _parse_event_id(last_event_id)
+        for name, version in list(versions.items()):
+            if name in seen and version > seen[name]:
+                changed = {"table": name, "op": "changed", "ids": []}
+                yield _format({**changed, "table_version": version}, versions)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENTS_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is EVICTED:
+                yield "event: evicted\ndata: {}\n\n"
+                return
+            yield _format(event, versions)
+
+
+@events_router.get("/api/events")
+async def stream_changes(
+    table: Optional[Literal["airplanes", "cookbooks"]] = Query(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Streams the creates, updates and deletes committed to the airplanes and
+    cookbooks as Server-Sent Events.
+
+    Each event names the table, the operation and the IDs written, with the
+    table version after the write when known. Writes handled by another worker
+    are announced as a "changed" event carrying only the new table version. A
+    client that falls `EVENTS_BUFFER_SIZE` events behind receives an "evicted"
+    event and is disconnected, and should reload the list before resubscribing.
+
+    The ID of every event holds the versions of the tables announced so far,
+    which are the same in every worker. A client reconnecting with
+    `Last-Event-ID` is told with a "changed" event about each table written
+    since, and can then fetch the missed changes from its `/changes` route.
+
+    Args:
+        table (Optional[str]): The only resource to receive events for.
+        last_event_id (Optional[str]): The ID of the last event received before
+            reconnecting.
+
+    Returns:
+        StreamingResponse: The event stream, open until the client disconnects.
+    """
+    return StreamingResponse(
+        _event_stream(table, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,70 @@
+"""
+Health routes module.
+
+This module defines the liveness and readiness probes of the API for the
+orchestrator running it.
+"""
+
+import asyncio
+
+from pymysql.err import MySQLError
+
+from async_database import async_database
+from config import READY_TIMEOUT
+from database import ping
+from helpers.backend import DB_BACKEND
+
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+
+health_router = APIRouter()
+
+
+@health_router.get("/healthz")
+async def liveness():
+    """
+    Reports that the worker is alive and serving requests, without touching
+    the database, so a database outage does not get workers restarted.
+
+    Returns:
+        dict: The status of the worker.
+    """
+    return {"status": "ok"}
+
+
+@health_router.get("/readyz")
+async def readiness():
+    """
+    Reports whether the worker can serve requests: the database must answer
+    within `READY_TIMEOUT` seconds.
+
+    With the async backend, a connection of the pool is checked out for the
+    probe, and the first probe opens the pool, so the worker is warm by the
+    time it receives traffic. The check is cancelled when it runs late.
+
+    The blocking check of the sync backend cannot be cancelled, so it runs on
+    a dedicated connection with connect and read timeouts of `READY_TIMEOUT`
+    instead, and never keeps a threadpool thread for long, even when the
+    database hangs.
+
+    Returns:
+        ORJSONResponse: The status of the worker, with 503 Service Unavailable
+        if the database could not be reached in time.
+    """
+    if DB_BACKEND == "async":
+        check = asyncio.wait_for(async_database.ping(), READY_TIMEOUT)
+    else:
+        check = run_in_threadpool(ping, READY_TIMEOUT)
+    try:
+        await check
+    except asyncio.TimeoutError:
+        detail = f"The database did not answer within {READY_TIMEOUT} s"
+    except MySQLError as exc:
+        detail = f"The database is unavailable: {exc}"
+    else:
+        return ORJSONResponse({"status": "ready", "backend": DB_BACKEND})
+    return ORJSONResponse(
+        {"status": "unavailable", "backend": DB_BACKEND, "detail": detail},
+        status_code=503,
+    )
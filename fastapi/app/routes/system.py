@@ -0,0 +1,72 @@
+"""
+System routes module.
+
+This module defines operational routes that report the internal state of the API.
+"""
+
+from async_database import async_database
+from database import database
+from helpers.backend import DB_BACKEND
+from helpers.cache import airplane_cache, cookbook_cache, count_cache
+from helpers.events import change_feed
+from helpers.replicas import replica_router
+
+from fastapi import APIRouter
+
+system_router = APIRouter()
+
+
+@system_router.get("/pool")
+def get_pool_stats():
+    """
+    Retrieves the state of the sync and async database connection pools.
+
+    Returns:
+        dict: The configured backend and, for each pool, the size limit, the
+        connections in use and idle, and the pool timeouts.
+    """
+    return {
+        "backend": DB_BACKEND,
+        "sync": database.stats(),
+        "async": async_database.stats(),
+    }
+
+
+@system_router.get("/cache")
+def get_cache_stats():
+    """
+    Retrieves the counters of the get-by-id caches and of the list count cache.
+
+    Returns:
+        dict: For each cache, its size and its hit, miss, eviction and
+        expiration counters.
+    """
+    return {
+        "airplanes": airplane_cache.stats(),
+        "cookbooks": cookbook_cache.stats(),
+        "counts": count_cache.stats(),
+    }
+
+
+@system_router.get("/replicas")
+def get_replica_stats():
+    """
+    Retrieves the state of the read replicas and where the reads went.
+
+    Returns:
+        dict: The lag limit, the lag, health and last error of every replica,
+        and the number of read requests sent to each and to the primary.
+    """
+    return replica_router.stats()
+
+
+@system_router.get("/events")
+def get_event_stats():
+    """
+    Retrieves the state of the change feed of this worker.
+
+    Returns:
+        dict: The number of subscribers, their buffer size, and the events
+        published and subscribers evicted so far.
+    """
+    return change_feed.stats()
@@ -2,47 +2,35 @@
 Airplane schema module.
 """
 
-from datetime import datetime
-from pydantic import BaseModel, Field, validator
+from dataclasses import dataclass
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from helpers.clock import current_year
 
 
 class AirplaneSchema(BaseModel):
     """
     Represents an airplane with model, year, seats, airline, speed, and weight.
+
+    Length, range and parity rules are declared as field constraints, so they
+    run in pydantic-core without calling back into Python. Only the upper bound
+    of the manufacture year, the current year, is checked by a validator.
     """
 
-    model: str = Field(..., max_length=50)
-    manufacture_year: int = Field(..., gt=1900, lt=2024)
-    seats: int = Field(..., gt=0)
-    airline: str = Field(..., max_length=50)
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    model: str = Field(..., min_length=3, max_length=50)
+    manufacture_year: int = Field(..., gt=1900)
+    seats: int = Field(..., gt=0, multiple_of=2)
+    airline: str = Field(..., min_length=5, max_length=50)
     max_speed: float = Field(..., gt=0)
     weight: float = Field(..., gt=0)
 
-    class Config:
-        """Strips leading/trailing whitespace."""
-
-        anystr_strip_whitespace = True
-
-    @validator("model")
-    def validate_model_length(cls, model):
-        """
-        Validates that the model name has at least 3 characters.
-
-        Args:
-            model (str): The model name of the airplane.
-
-        Returns:
-            str: The validated model name.
-
-        Raises:
-            ValueError: If the model name is less than 3 characters.
-        """
-        if len(model) < 3:
-            raise ValueError("Model name must have at least 3 characters")
-        return model
-
-    @validator("manufacture_year")
-    def validate_manufacture_year(cls, year):
+    @field_validator("manufacture_year")
+    @classmethod
+    def validate_manufacture_year(cls, year: int) -> int:
         """
         Validates that the manufacture year is not in the future.
 
@@ -55,43 +43,63 @@ class AirplaneSchema(BaseModel):
         Raises:
             ValueError: If the manufacture year is in the future.
         """
-        current_year = datetime.now().year
-        if year > current_year:
+        if year > current_year():
             raise ValueError("Manufacture year cannot be in the future")
         return year
 
-    @validator("seats")
-    def validate_seats(cls, seats):
-        """
-        Validates that the number of seats is a positive even number.
 
-        Args:
-            seats (int): The number of seats in the airplane.
+@dataclass
+class AirplaneFilters:
+    """
+    Filters and sort order of the airplane list, taken from the query string.
+    """
 
-        Returns:
-            int: The validated number of seats.
+    sort: Literal["id", "-id", "manufacture_year", "-manufacture_year"] = "id"
+    airline: Optional[str] = None
+    manufacture_year_min: Optional[int] = None
+    manufacture_year_max: Optional[int] = None
 
-        Raises:
-            ValueError: If the number of seats is not an even number.
-        """
-        if seats % 2 != 0:
-            raise ValueError("Number of seats must be an even number")
-        return seats
 
-    @validator("airline")
-    def validate_airline_length(cls, airline):
-        """
-        Validates that the airline name has at least 5 characters.
+class AirplaneRecord(BaseModel):
+    """
+    Represents a stored airplane, as returned by the API.
+    """
 
-        Args:
-            airline (str): The name of the airline.
+    id: int
+    model: str
+    manufacture_year: int
+    seats: int
+    airline: str
+    max_speed: float
+    weight: float
+    version: int
+    change_version: int
 
-        Returns:
-            str: The validated airline name.
 
-        Raises:
-            ValueError: If the airline name is less than 5 characters.
-        """
-        if len(airline) < 5:
-            raise ValueError("Airline name must have at least 5 characters")
-        return airline
+class AirplanePage(BaseModel):
+    """
+    Represents a page of the airplane list.
+    """
+
+    items: List[AirplaneRecord]
+    next_cursor: Optional[str]
+
+
+class AirplaneChanges(BaseModel):
+    """
+    Represents a page of the airplanes written and deleted since a sync.
+    """
+
+    items: List[AirplaneRecord]
+    deleted: List[int]
+    next_cursor: Optional[str]
+    version: int
+
+
+class AirplaneSelection(BaseModel):
+    """
+    Represents the airplanes looked up by their IDs.
+    """
+
+    items: List[AirplaneRecord]
+    missing: List[int]
@@ -0,0 +1,75 @@
+"""
+Batch schema module.
+"""
+
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+from config import BATCH_MAX_REQUESTS
+
+BATCH_PATH = "/api/batch"
+# Routes answering with a stream, which a batch cannot collect in memory.
+EVENTS_PATH = "/api/events"
+EXPORT_SUFFIX = "/export"
+
+
+class SubRequest(BaseModel):
+    """
+    Represents one API request carried by a batch.
+    """
+
+    method: Literal["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"]
+    path: str = Field(..., min_length=5, max_length=2048)
+    headers: Dict[str, str] = Field(default_factory=dict)
+    body: Optional[Any] = None
+
+    @field_validator("path")
+    @classmethod
+    def validate_path(cls, path: str) -> str:
+        """
+        Validates that the path, with its query string, is an API route other
+        than the batch route itself and the streaming routes.
+
+        Args:
+            path (str): The path of the sub-request.
+
+        Returns:
+            str: The validated path.
+
+        Raises:
+            ValueError: If the path is outside the API, is the batch route or
+            is a streaming route.
+        """
+        route = path.split("?", 1)[0].rstrip("/")
+        if not path.startswith("/api/") or route == BATCH_PATH:
+            raise ValueError("Only API routes other than the batch route can be called")
+        if route == EVENTS_PATH or route.endswith(EXPORT_SUFFIX):
+            raise ValueError("Streaming routes cannot be called in a batch")
+        return path
+
+
+class BatchRequest(BaseModel):
+    """
+    Represents the API requests to run in one HTTP call.
+    """
+
+    requests: List[SubRequest] = Field(..., min_length=1, max_length=BATCH_MAX_REQUESTS)
+
+
+class SubResponse(BaseModel):
+    """
+    Represents the response to one request of a batch.
+    """
+
+    status: int
+    headers: Dict[str, str]
+    body: Optional[Any]
+
+
+class BatchResponse(BaseModel):
+    """
+    Represents the responses to a batch, in the order of its requests.
+    """
+
+    responses: List[SubResponse]
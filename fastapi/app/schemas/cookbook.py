@@ -3,16 +3,26 @@ Module: cookbook.py
 This module contains the schema definition for a cookbook.
 Classes:
 - CookBookSchema: A Pydantic BaseModel representing a cookbook.
+- CookBookFilters: The filters and sort order of the cookbook list.
+- CookBookRecord, CookBookPage, CookBookSelection, CookBookSearchResult,
+  CookBookSearchPage: The cookbooks as returned by the API.
 """
 
-from datetime import datetime
-from pydantic import BaseModel, Field, validator
+from dataclasses import dataclass
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+from helpers.clock import current_year
 
 
 class CookBookSchema(BaseModel):
     """
     CookBookSchema
-    This class represents the schema for a cookbook.
+    This class represents the schema for a cookbook. Length and range rules
+    are declared as field constraints, so they run in pydantic-core; only the
+    upper bound of the publication year, the current year, is checked by a
+    validator.
     Attributes:
     - title (str): The title of the cookbook.
     - author (str): The author of the cookbook.
@@ -20,115 +30,123 @@ class CookBookSchema(BaseModel):
     - price (float): The price of the cookbook.
     - isbn (str): The ISBN of the cookbook.
     - num_pages (int): The number of pages in the cookbook.
-    - description (str): The description of the cookbook.
     """
 
     isbn: str = Field(..., min_length=10, max_length=10)
-    title: str = Field(..., min_length=1, max_length=50)
+    title: str = Field(..., min_length=3, max_length=50)
     author: str = Field(..., min_length=1, max_length=50)
-    publication_year: int = Field(..., gt=0, lt=2024)
+    publication_year: int = Field(..., ge=1900)
     price: float = Field(..., gt=0.0)
     num_pages: int = Field(..., gt=0)
 
-    @validator("isbn")
-    def validate_isbn(cls, isbn):
+    @field_validator("publication_year")
+    @classmethod
+    def validate_publication_year(cls, publication_year: int) -> int:
         """
-        Validates the ISBN.
+        Validates that the publication year is not in the future.
         Args:
-            cls: The class object.
-            isbn (str): The ISBN to be validated.
+            cls (type): The class object.
+            publication_year (int): The publication year to be validated.
         Raises:
-            ValueError: If the ISBN is not exactly 10 digits.
+            ValueError: If the publication year is after the current year.
         Returns:
-            str: The validated ISBN.
+            int: The validated publication year.
         """
 
-        if len(isbn) != 10:
-            raise ValueError("ISBN must be exactly 10 digits")
-        return isbn
+        if publication_year > current_year():
+            raise ValueError("Publication year must be between 1900 and current year")
+        return publication_year
 
-    @validator("title")
-    def validate_title(cls, title):
-        """
-        Validates the title of a cookbook.
-        Args:
-            cls: The class object.
-            title (str): The title to be validated.
-        Raises:
-            ValueError: If the title is less than 3 characters long.
-        Returns:
-            str: The validated title.
-        """
 
-        if len(title) < 3:
-            raise ValueError("Title must be at least 3 characters long")
-        return title
+@dataclass
+class CookBookFilters:
+    """
+    CookBookFilters
+    This class represents the filters and sort order of the cookbook list,
+    taken from the query string.
+    Attributes:
+    - sort (str): The column to sort by, prefixed with "-" for descending order.
+    - author (str): The author the cookbooks must have.
+    - publication_year_min (int): The earliest publication year.
+    - publication_year_max (int): The latest publication year.
+    - price_min (float): The lowest price.
+    - price_max (float): The highest price.
+    """
 
-    @validator("author")
-    def validate_author(cls, author):
-        """
-        Validate the author of a cookbook.
-        Args:
-            cls: The class object.
-            author: The author to be validated.
-        Raises:
-            ValueError: If the author is not a string.
-        Returns:
-            The validated author.
-        """
+    sort: Literal[
+        "id", "-id", "publication_year", "-publication_year", "price", "-price"
+    ] = "id"
+    author: Optional[str] = None
+    publication_year_min: Optional[int] = None
+    publication_year_max: Optional[int] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
 
-        if not isinstance(author, str):
-            raise ValueError("Author must be a string")
-        return author
 
-    @validator("publication_year")
-    def validate_publication_year(cls, publication_year):
-        """
-        Validates the publication year of a cookbook.
-        Args:
-            cls (type): The class object.
-            publication_year (int): The publication year to be validated.
-        Raises:
-            ValueError: If the publication year is not between 1900 and the current year.
-        Returns:
-            int: The validated publication year.
-        """
+class CookBookRecord(BaseModel):
+    """
+    CookBookRecord
+    This class represents a stored cookbook, as returned by the API.
+    """
 
-        current_year = datetime.now().year
-        if publication_year < 1900 or publication_year > current_year:
-            raise ValueError("Publication year must be between 1900 and current year")
-        return publication_year
+    id: int
+    isbn: str
+    title: str
+    author: str
+    publication_year: int
+    num_pages: int
+    price: float
+    version: int
+    change_version: int
 
-    @validator("price")
-    def validate_price(cls, price):
-        """
-        Validates the price of a cookbook.
-        Args:
-            cls: The class object.
-            price (float): The price of the cookbook.
-        Raises:
-            ValueError: If the price is less than or equal to 0.
-        Returns:
-            float: The validated price.
-        """
 
-        if price <= 0:
-            raise ValueError("Price must be a positive number")
-        return price
+class CookBookPage(BaseModel):
+    """
+    CookBookPage
+    This class represents a page of the cookbook list.
+    """
 
-    @validator("num_pages")
-    def validate_num_pages(cls, num_pages):
-        """
-        Validates the number of pages for a cookbook.
-        Args:
-            cls (type): The class object.
-            num_pages (int): The number of pages to validate.
-        Raises:
-            ValueError: If the number of pages is not a positive integer.
-        Returns:
-            int: The validated number of pages.
-        """
+    items: List[CookBookRecord]
+    next_cursor: Optional[str]
+
+
+class CookBookChanges(BaseModel):
+    """
+    CookBookChanges
+    This class represents a page of the cookbooks written and deleted since a
+    sync.
+    """
+
+    items: List[CookBookRecord]
+    deleted: List[int]
+    next_cursor: Optional[str]
+    version: int
+
+
+class CookBookSelection(BaseModel):
+    """
+    CookBookSelection
+    This class represents the cookbooks looked up by their IDs.
+    """
+
+    items: List[CookBookRecord]
+    missing: List[int]
+
+
+class CookBookSearchResult(CookBookRecord):
+    """
+    CookBookSearchResult
+    This class represents a cookbook matching a search, with its relevance.
+    """
+
+    score: float
+
+
+class CookBookSearchPage(BaseModel):
+    """
+    CookBookSearchPage
+    This class represents a page of search results, best matches first.
+    """
 
-        if not isinstance(num_pages, int) or num_pages <= 0:
-            raise ValueError("Number of pages must be a positive integer")
-        return num_pages
+    items: List[CookBookSearchResult]
+    next_cursor: Optional[str]
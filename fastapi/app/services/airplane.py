@@ -2,40 +2,278 @@
 Airplane service
 """
 
-from database import Airplane
-from schemas.airplane import AirplaneSchema
+from typing import List, Optional
+
+from playhouse.shortcuts import model_to_dict
+
+from database import (
+    Airplane,
+    AirplaneAirlineStats,
+    AirplaneYearStats,
+    bump_table_version,
+    connection_scope,
+    count_rows,
+    created_ids,
+    created_records,
+    database,
+    estimate_rows,
+    get_table_version,
+    insert_in_chunks,
+    iterate_unbuffered,
+    read_replica,
+    tombstone_insert,
+    versioned_delete,
+    versioned_update,
+)
+from helpers.cache import MISSING, airplane_cache
+from helpers.events import change_feed
+from helpers.export import encode_rows
+from helpers.filtering import (
+    changes_queries,
+    count_query,
+    list_query,
+    lookup_result,
+    selected_columns,
+)
+from helpers.pagination import DEFAULT_PAGE_SIZE, build_changes, build_page
+from helpers.stats import airplane_report
+from schemas.airplane import AirplaneFilters, AirplaneSchema
 from fastapi import Body, HTTPException
 
 
-def get_all_airplanes():
+@connection_scope
+def get_all_airplanes(
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+    filters: Optional[AirplaneFilters] = None,
+    fields: Optional[List[str]] = None,
+):
+    """
+    Fetches one page of airplane records, filtered and sorted as requested.
+
+    The page is located with an index seek on the sort key, so its cost does
+    not depend on how deep the client has paged.
+
+    Args:
+        limit (int): The maximum number of airplanes to return.
+        after (Optional[str]): The cursor returned with the previous page.
+        filters (Optional[AirplaneFilters]): The filters and sort order, by ID
+            and unfiltered if not given.
+        fields (Optional[List[str]]): The columns to select, all if not given.
+
+    Returns:
+        dict: The airplanes of the page and the cursor of the next page.
+
+    Raises:
+        HTTPException: If the cursor is malformed, or no index serves the
+        filters and sort order (400).
+    """
+    query, key = list_query(
+        Airplane, filters or AirplaneFilters(), limit, after, fields
+    )
+    return build_page(list(query.dicts()), limit, key, fields)
+
+
+def count_airplanes(
+    filters: Optional[AirplaneFilters] = None,
+    approximate: bool = False,
+    table_version: int = 0,
+) -> int:
+    """
+    Counts the airplanes matching the filters of the list, without reading them.
+
+    Exact counts run a COUNT(*) on the index serving the filters, and are cached
+    by table version so that any write invalidates them. Approximate counts are
+    the optimizer's estimate, read with EXPLAIN, and scan nothing.
+
+    Args:
+        filters (Optional[AirplaneFilters]): The filters, unfiltered if not given.
+        approximate (bool): Whether to estimate the count instead.
+        table_version (int): The current version of the airplane table.
+
+    Returns:
+        int: The number of airplanes.
+
+    Raises:
+        HTTPException: If no index serves the filters (400).
+    """
+    filters = filters or AirplaneFilters()
+    if approximate:
+        return estimate_rows(count_query(Airplane, filters, approximate=True))
+    return count_rows(count_query(Airplane, filters), table_version)
+
+
+@connection_scope
+def get_airplanes_version() -> int:
+    """
+    Fetches the version of the airplane table, bumped by every write to it.
+
+    Returns:
+        int: The current version of the airplane table.
+    """
+    return get_table_version(Airplane)
+
+
+@connection_scope
+def get_airplane_changes(
+    since: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+):
+    """
+    Fetches one page of the airplanes written and deleted after a table version,
+    read in change order from the change version index and the tombstones.
+
+    The table version is read first, so every change made at or below it is
+    in this page or the following ones.
+
+    Args:
+        since (Optional[int]): The table version the client last synced at,
+            every airplane if not given.
+        limit (int): The maximum number of changes to return.
+        after (Optional[str]): The cursor returned with the previous page.
+
+    Returns:
+        dict: The airplanes written and the IDs deleted, the cursor of the next
+        page, and the table version to sync from once every page is read.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400).
     """
-    Fetches all airplane records from the database.
+    version = get_table_version(Airplane)
+    rows, deleted = changes_queries(Airplane, since, limit, after)
+    return build_changes(list(rows.dicts()), list(deleted.dicts()), limit, version)
+
+
+@connection_scope
+def get_airplane_stats():
+    """
+    Fetches the airplane statistics from the summary tables maintained by the
+    triggers of the airplane table, which hold one row per group.
+
+    Returns:
+        dict: The airplane and seat totals, the seats per airline, and the average
+        speed and weight per manufacture year.
+    """
+    first = (
+        AirplaneAirlineStats.select()
+        .where(AirplaneAirlineStats.airplanes > 0)
+        .order_by(AirplaneAirlineStats.airline)
+    )
+    second = (
+        AirplaneYearStats.select()
+        .where(AirplaneYearStats.airplanes > 0)
+        .order_by(AirplaneYearStats.manufacture_year)
+    )
+    return airplane_report(list(first.dicts()), list(second.dicts()))
+
+
+def export_airplanes(export_format: str, fields: Optional[List[str]] = None):
+    """
+    Streams every airplane record ordered by ID in the given format.
+
+    Rows are read through a server-side cursor and encoded chunk by chunk, so
+    memory use stays flat whatever the size of the table.
+
+    Args:
+        export_format (str): Either "ndjson" or "csv".
+        fields (Optional[List[str]]): The columns to export, all if not given.
 
     Returns:
-        List[dict]: A list of dictionaries representing all airplanes.
+        Iterator[str]: The encoded airplanes, one piece per chunk of rows.
     """
-    return list(Airplane.select().dicts())
+    query = Airplane.select(*selected_columns(Airplane, fields)).order_by(Airplane.id)
+    return encode_rows(iterate_unbuffered(query), export_format)
 
 
-def get_airplane_by_id(airplane_id: int):
+def get_airplane_by_id(airplane_id: int, table_version: int = 0):
     """
-    Fetches a specific airplane by its ID.
+    Fetches a specific airplane by its ID, from the cache when possible.
+
+    Rows read from a replica are not cached, as the replica may still lag
+    behind writes whose invalidation already ran.
+
+    Cache hits without a `table_version` do not touch the database.
 
     Args:
         airplane_id (int): The ID of the airplane to retrieve.
+        table_version (int): The current version of the airplane table, read
+            before this call to revalidate the cache; a cached copy loaded at
+            an older version is not served. The default, 0, serves any copy.
 
     Returns:
-        Airplane: The airplane record if found.
+        dict: The airplane record if found.
 
     Raises:
         HTTPException: If no airplane with the given ID is found (404).
     """
+    row = airplane_cache.get(airplane_id, table_version)
+    if row is MISSING:
+        generation = airplane_cache.generation()
+        row = _load_airplane(airplane_id)
+        if read_replica.get() is None:
+            airplane_cache.put(airplane_id, row, generation, table_version)
+    return row
+
+
+@connection_scope
+def _load_airplane(airplane_id: int) -> dict:
+    """
+    Reads an airplane from the database, raising a 404 if it does not exist.
+    """
     try:
-        return Airplane.get(Airplane.id == airplane_id)
+        return Airplane.select().where(Airplane.id == airplane_id).dicts().get()
     except Airplane.DoesNotExist as exc:
         raise HTTPException(status_code=404, detail="Airplane not found") from exc
 
 
+def get_airplanes_by_ids(
+    airplane_ids: List[int],
+    fields: Optional[List[str]] = None,
+    table_version: int = 0,
+) -> dict:
+    """
+    Fetches the airplanes with the given IDs, from the cache when possible and
+    otherwise with a single `WHERE id IN (...)` query.
+
+    Rows read from a replica are not cached, as the replica may still lag
+    behind writes whose invalidation already ran.
+
+    Args:
+        airplane_ids (List[int]): The distinct IDs of the airplanes to retrieve.
+        fields (Optional[List[str]]): The columns to return, all if not given.
+        table_version (int): The current version of the airplane table, read
+            before this call; cached copies older than it are not served.
+
+    Returns:
+        dict: The airplanes found, in the order of `airplane_ids`, and the IDs
+        that were not found.
+    """
+    rows, uncached = {}, []
+    for airplane_id in airplane_ids:
+        row = airplane_cache.get(airplane_id, table_version)
+        if row is MISSING:
+            uncached.append(airplane_id)
+        else:
+            rows[airplane_id] = row
+    if uncached:
+        generation = airplane_cache.generation()
+        for row in _load_airplanes(uncached):
+            rows[row["id"]] = row
+            if read_replica.get() is None:
+                airplane_cache.put(row["id"], row, generation, table_version)
+    return lookup_result(airplane_ids, rows, fields)
+
+
+@connection_scope
+def _load_airplanes(airplane_ids: List[int]) -> list:
+    """
+    Reads the airplanes with the given IDs from the database.
+    """
+    return list(Airplane.select().where(Airplane.id.in_(airplane_ids)).dicts())
+
+
+@connection_scope
 def create_airplane(airplane: AirplaneSchema = Body(...)):
     """
     Creates a new airplane record in the database.
@@ -44,51 +282,158 @@ def create_airplane(airplane: AirplaneSchema = Body(...)):
         airplane (AirplaneSchema): The schema containing airplane data.
 
     Returns:
-        Airplane: The newly created airplane record.
+        dict: The newly created airplane record.
+    """
+    data = airplane.model_dump()
+    with database.atomic():
+        table_version = bump_table_version(Airplane)
+        record = Airplane.create(**data, change_version=table_version)
+    airplane_cache.invalidate(record.id)
+    change_feed.publish("airplanes", "create", [record.id], table_version)
+    return model_to_dict(record)
+
+
+@connection_scope
+def create_airplanes_bulk(airplanes: List[AirplaneSchema]):
+    """
+    Creates many airplane records with chunked multi-row INSERTs.
+
+    Items violating a unique key are reported as failed without aborting the
+    rest of the batch.
+
+    Args:
+        airplanes (List[AirplaneSchema]): The schemas containing the airplane data.
+
+    Returns:
+        dict: The number of airplanes created and failed, and the outcome of
+        every item in request order.
     """
-    return Airplane.create(**airplane.dict())
+    report = insert_in_chunks(
+        Airplane, [airplane.model_dump() for airplane in airplanes]
+    )
+    change_feed.publish(
+        "airplanes", "create", created_ids(report), report["table_version"]
+    )
+    return report
 
 
-def update_airplane(airplane_id: int, airplane: AirplaneSchema = Body(...)):
+@connection_scope
+def create_airplanes_grouped(airplanes: List[AirplaneSchema]) -> list:
     """
-    Updates an existing airplane record by its ID.
+    Creates the airplane records coalesced from concurrent requests, with one
+    multi-row INSERT in one transaction.
+
+    Args:
+        airplanes (List[AirplaneSchema]): The schemas containing the airplane data.
+
+    Returns:
+        list: For every airplane, in order, the newly created record or the
+        integrity error to raise to its requester.
+    """
+    rows = [airplane.model_dump() for airplane in airplanes]
+    report = insert_in_chunks(Airplane, rows)
+    records = created_records(rows, report)
+    ids = [record["id"] for record in records if isinstance(record, dict)]
+    for airplane_id in ids:
+        airplane_cache.invalidate(airplane_id)
+    change_feed.publish("airplanes", "create", ids, report["table_version"])
+    return records
+
+
+def _write_failed(
+    airplane_id: int, expected_versions: Optional[List[int]]
+) -> HTTPException:
+    """
+    Explains why a conditional write matched no row. Only runs on the failure
+    path, so successful writes stay a single statement.
+    """
+    if expected_versions is not None and (
+        Airplane.select().where(Airplane.id == airplane_id).exists()
+    ):
+        return HTTPException(
+            status_code=412, detail="Airplane was modified by another request"
+        )
+    return HTTPException(status_code=404, detail="Airplane not found")
+
+
+@connection_scope
+def update_airplane(
+    airplane_id: int,
+    airplane: AirplaneSchema = Body(...),
+    expected_versions: Optional[List[int]] = None,
+):
+    """
+    Updates an existing airplane record by its ID with a single UPDATE.
+
+    The row version is bumped in the same statement and read back through
+    LAST_INSERT_ID, and the matched-row count tells whether the row exists.
+    The table version is bumped first in the same transaction and written to
+    the row as its change version; a failed update rolls it back.
 
     Args:
         airplane_id (int): The ID of the airplane to update.
         airplane (AirplaneSchema): The schema with updated airplane data.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
 
     Returns:
-        dict: A success message upon updating the airplane.
+        dict: A success message and the new versions of the airplane and of
+        the airplane table.
 
     Raises:
-        HTTPException: If no airplane with the given ID is found (404).
+        HTTPException: If no airplane with the given ID is found (404), or it no
+        longer has one of the expected versions (412).
     """
+    data = airplane.model_dump()
     try:
-        Airplane.get(Airplane.id == airplane_id)
-    except Airplane.DoesNotExist as exc:
-        raise HTTPException(status_code=404, detail="Airplane not found") from exc
+        with database.atomic():
+            table_version = bump_table_version(Airplane)
+            cursor = database.execute(
+                versioned_update(
+                    Airplane,
+                    airplane_id,
+                    {**data, "change_version": table_version},
+                    expected_versions,
+                )
+            )
+            if cursor.rowcount == 0:
+                raise _write_failed(airplane_id, expected_versions)
+    finally:
+        airplane_cache.invalidate(airplane_id)
+    change_feed.publish("airplanes", "update", [airplane_id], table_version)
+    return {
+        "message": "Airplane updated successfully",
+        "version": cursor.lastrowid,
+        "table_version": table_version,
+    }
 
-    Airplane.update(**airplane.dict()).where(Airplane.id == airplane_id).execute()
-    return {"message": "Airplane updated successfully"}
 
-
-def delete_airplane(airplane_id: int):
+@connection_scope
+def delete_airplane(airplane_id: int, expected_versions: Optional[List[int]] = None):
     """
-    Deletes an airplane record by its ID.
+    Deletes an airplane record by its ID with a single DELETE.
+
+    A tombstone of the row is written in the same transaction, for the clients
+    syncing the changes of the table.
 
     Args:
         airplane_id (int): The ID of the airplane to delete.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
 
     Returns:
         dict: A success message upon deleting the airplane.
 
     Raises:
-        HTTPException: If no airplane with the given ID is found (404).
+        HTTPException: If no airplane with the given ID is found (404), or it no
+        longer has one of the expected versions (412).
     """
+    query = versioned_delete(Airplane, airplane_id, expected_versions)
     try:
-        Airplane.get(Airplane.id == airplane_id)
-    except Airplane.DoesNotExist as exc:
-        raise HTTPException(status_code=404, detail="Airplane not found") from exc
-
-    Airplane.delete().where(Airplane.id == airplane_id).execute()
+        with database.atomic():
+            table_version = bump_table_version(Airplane)
+            if query.execute() == 0:
+                raise _write_failed(airplane_id, expected_versions)
+            database.execute(tombstone_insert(Airplane, airplane_id, table_version))
+    finally:
+        airplane_cache.invalidate(airplane_id)
+    change_feed.publish("airplanes", "delete", [airplane_id], table_version)
     return {"message": "Airplane deleted successfully"}
@@ -0,0 +1,420 @@
+"""
+Airplane async service
+
+Mirrors `services/airplane.py` on top of the aiomysql pool, so the route handlers
+can await the database without holding a threadpool thread.
+"""
+
+# pylint: disable=duplicate-code
+
+from typing import List, Optional
+
+import aiomysql
+
+from async_database import async_database
+from database import (
+    Airplane,
+    AirplaneAirlineStats,
+    AirplaneYearStats,
+    created_ids,
+    created_records,
+    read_replica,
+    tombstone_insert,
+    versioned_delete,
+    versioned_update,
+)
+from helpers.cache import MISSING, airplane_cache
+from helpers.events import change_feed
+from helpers.export import encode_rows_async
+from helpers.filtering import (
+    changes_queries,
+    count_query,
+    list_query,
+    lookup_result,
+    selected_columns,
+)
+from helpers.pagination import DEFAULT_PAGE_SIZE, build_changes, build_page
+from helpers.stats import airplane_report
+from schemas.airplane import AirplaneFilters, AirplaneSchema
+from fastapi import HTTPException
+
+
+async def get_all_airplanes(
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+    filters: Optional[AirplaneFilters] = None,
+    fields: Optional[List[str]] = None,
+):
+    """
+    Fetches one page of airplane records, filtered and sorted as requested.
+
+    Args:
+        limit (int): The maximum number of airplanes to return.
+        after (Optional[str]): The cursor returned with the previous page.
+        filters (Optional[AirplaneFilters]): The filters and sort order, by ID
+            and unfiltered if not given.
+        fields (Optional[List[str]]): The columns to select, all if not given.
+
+    Returns:
+        dict: The airplanes of the page and the cursor of the next page.
+
+    Raises:
+        HTTPException: If the cursor is malformed, or no index serves the
+        filters and sort order (400).
+    """
+    query, key = list_query(
+        Airplane, filters or AirplaneFilters(), limit, after, fields
+    )
+    rows = await async_database.fetch_all(query)
+    return build_page(rows, limit, key, fields)
+
+
+async def count_airplanes(
+    filters: Optional[AirplaneFilters] = None,
+    approximate: bool = False,
+    table_version: int = 0,
+) -> int:
+    """
+    Counts the airplanes matching the filters of the list, without reading them.
+
+    Exact counts run a COUNT(*) on the index serving the filters, and are cached
+    by table version so that any write invalidates them. Approximate counts are
+    the optimizer's estimate, read with EXPLAIN, and scan nothing.
+
+    Args:
+        filters (Optional[AirplaneFilters]): The filters, unfiltered if not given.
+        approximate (bool): Whether to estimate the count instead.
+        table_version (int): The current version of the airplane table.
+
+    Returns:
+        int: The number of airplanes.
+
+    Raises:
+        HTTPException: If no index serves the filters (400).
+    """
+    filters = filters or AirplaneFilters()
+    if approximate:
+        return await async_database.estimate_rows(
+            count_query(Airplane, filters, approximate=True)
+        )
+    return await async_database.count_rows(
+        count_query(Airplane, filters), table_version
+    )
+
+
+async def get_airplanes_version() -> int:
+    """
+    Fetches the version of the airplane table, bumped by every write to it.
+
+    Returns:
+        int: The current version of the airplane table.
+    """
+    return await async_database.get_table_version(Airplane)
+
+
+async def get_airplane_changes(
+    since: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+):
+    """
+    Fetches one page of the airplanes written and deleted after a table version,
+    read in change order from the change version index and the tombstones.
+
+    Args:
+        since (Optional[int]): The table version the client last synced at,
+            every airplane if not given.
+        limit (int): The maximum number of changes to return.
+        after (Optional[str]): The cursor returned with the previous page.
+
+    Returns:
+        dict: The airplanes written and the IDs deleted, the cursor of the next
+        page, and the table version to sync from once every page is read.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400).
+    """
+    version = await async_database.get_table_version(Airplane)
+    rows, deleted = changes_queries(Airplane, since, limit, after)
+    return build_changes(
+        await async_database.fetch_all(rows),
+        await async_database.fetch_all(deleted),
+        limit,
+        version,
+    )
+
+
+async def get_airplane_stats():
+    """
+    Fetches the airplane statistics from the summary tables maintained by the
+    triggers of the airplane table, which hold one row per group.
+
+    Returns:
+        dict: The airplane and seat totals, the seats per airline, and the average
+        speed and weight per manufacture year.
+    """
+    first = (
+        AirplaneAirlineStats.select()
+        .where(AirplaneAirlineStats.airplanes > 0)
+        .order_by(AirplaneAirlineStats.airline)
+    )
+    second = (
+        AirplaneYearStats.select()
+        .where(AirplaneYearStats.airplanes > 0)
+        .order_by(AirplaneYearStats.manufacture_year)
+    )
+    return airplane_report(
+        await async_database.fetch_all(first), await async_database.fetch_all(second)
+    )
+
+
+async def export_airplanes(export_format: str, fields: Optional[List[str]] = None):
+    """
+    Streams every airplane record ordered by ID in the given format.
+
+    Args:
+        export_format (str): Either "ndjson" or "csv".
+        fields (Optional[List[str]]): The columns to export, all if not given.
+
+    Returns:
+        AsyncIterator[str]: The encoded airplanes, one piece per chunk of rows.
+    """
+    query = Airplane.select(*selected_columns(Airplane, fields)).order_by(Airplane.id)
+    return encode_rows_async(async_database.iterate_unbuffered(query), export_format)
+
+
+async def get_airplane_by_id(airplane_id: int, table_version: int = 0):
+    """
+    Fetches a specific airplane by its ID, from the cache when possible.
+
+    Rows read from a replica are not cached, as the replica may still lag
+    behind writes whose invalidation already ran.
+
+    Cache hits without a `table_version` do not touch the database.
+
+    Args:
+        airplane_id (int): The ID of the airplane to retrieve.
+        table_version (int): The current version of the airplane table, read
+            before this call to revalidate the cache; a cached copy loaded at
+            an older version is not served. The default, 0, serves any copy.
+
+    Returns:
+        dict: The airplane record if found.
+
+    Raises:
+        HTTPException: If no airplane with the given ID is found (404).
+    """
+    row = airplane_cache.get(airplane_id, table_version)
+    if row is MISSING:
+        generation = airplane_cache.generation()
+        row = await async_database.fetch_one(
+            Airplane.select().where(Airplane.id == airplane_id)
+        )
+        if row is None:
+            raise HTTPException(status_code=404, detail="Airplane not found")
+        if read_replica.get() is None:
+            airplane_cache.put(airplane_id, row, generation, table_version)
+    return row
+
+
+async def get_airplanes_by_ids(
+    airplane_ids: List[int],
+    fields: Optional[List[str]] = None,
+    table_version: int = 0,
+) -> dict:
+    """
+    Fetches the airplanes with the given IDs, from the cache when possible and
+    otherwise with a single `WHERE id IN (...)` query.
+
+    Rows read from a replica are not cached, as the replica may still lag
+    behind writes whose invalidation already ran.
+
+    Args:
+        airplane_ids (List[int]): The distinct IDs of the airplanes to retrieve.
+        fields (Optional[List[str]]): The columns to return, all if not given.
+        table_version (int): The current version of the airplane table, read
+            before this call; cached copies older than it are not served.
+
+    Returns:
+        dict: The airplanes found, in the order of `airplane_ids`, and the IDs
+        that were not found.
+    """
+    rows, uncached = {}, []
+    for airplane_id in airplane_ids:
+        row = airplane_cache.get(airplane_id, table_version)
+        if row is MISSING:
+            uncached.append(airplane_id)
+        else:
+            rows[airplane_id] = row
+    if uncached:
+        generation = airplane_cache.generation()
+        for row in await async_database.fetch_all(
+            Airplane.select().where(Airplane.id.in_(uncached))
+        ):
+            rows[row["id"]] = row
+            if read_replica.get() is None:
+                airplane_cache.put(row["id"], row, generation, table_version)
+    return lookup_result(airplane_ids, rows, fields)
+
+
+async def create_airplane(airplane: AirplaneSchema):
+    """
+    Creates a new airplane record in the database.
+
+    Args:
+        airplane (AirplaneSchema): The schema containing airplane data.
+
+    Returns:
+        dict: The newly created airplane record.
+    """
+    data = airplane.model_dump()
+    async with async_database.atomic():
+        table_version = await async_database.bump_table_version(Airplane)
+        cursor = await async_database.execute(
+            Airplane.insert(**data, change_version=table_version)
+        )
+    airplane_cache.invalidate(cursor.lastrowid)
+    change_feed.publish("airplanes", "create", [cursor.lastrowid], table_version)
+    return {
+        "id": cursor.lastrowid,
+        **data,
+        "version": 1,
+        "change_version": table_version,
+    }
+
+
+async def create_airplanes_bulk(airplanes: List[AirplaneSchema]):
+    """
+    Creates many airplane records with chunked multi-row INSERTs.
+
+    Args:
+        airplanes (List[AirplaneSchema]): The schemas containing the airplane data.
+
+    Returns:
+        dict: The number of airplanes created and failed, and the outcome of
+        every item in request order.
+    """
+    report = await async_database.insert_in_chunks(
+        Airplane, [airplane.model_dump() for airplane in airplanes]
+    )
+    change_feed.publish(
+        "airplanes", "create", created_ids(report), report["table_version"]
+    )
+    return report
+
+
+async def create_airplanes_grouped(airplanes: List[AirplaneSchema]) -> list:
+    """
+    Creates the airplane records coalesced from concurrent requests, with one
+    multi-row INSERT in one transaction.
+
+    Args:
+        airplanes (List[AirplaneSchema]): The schemas containing the airplane data.
+
+    Returns:
+        list: For every airplane, in order, the newly created record or the
+        integrity error to raise to its requester.
+    """
+    rows = [airplane.model_dump() for airplane in airplanes]
+    report = await async_database.insert_in_chunks(Airplane, rows)
+    records = created_records(rows, report, aiomysql.IntegrityError)
+    ids = [record["id"] for record in records if isinstance(record, dict)]
+    for airplane_id in ids:
+        airplane_cache.invalidate(airplane_id)
+    change_feed.publish("airplanes", "create", ids, report["table_version"])
+    return records
+
+
+async def _write_failed(airplane_id: int, expected_versions: Optional[List[int]]):
+    """
+    Explains why a conditional write matched no row. Only runs on the failure
+    path, so successful writes stay a single statement.
+    """
+    if expected_versions is not None and await async_database.fetch_one(
+        Airplane.select(Airplane.id).where(Airplane.id == airplane_id)
+    ):
+        return HTTPException(
+            status_code=412, detail="Airplane was modified by another request"
+        )
+    return HTTPException(status_code=404, detail="Airplane not found")
+
+
+async def update_airplane(
+    airplane_id: int,
+    airplane: AirplaneSchema,
+    expected_versions: Optional[List[int]] = None,
+):
+    """
+    Updates an existing airplane record by its ID with a single UPDATE.
+
+    Args:
+        airplane_id (int): The ID of the airplane to update.
+        airplane (AirplaneSchema): The schema with updated airplane data.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
+
+    Returns:
+        dict: A success message and the new versions of the airplane and of
+        the airplane table.
+
+    Raises:
+        HTTPException: If no airplane with the given ID is found (404), or it no
+        longer has one of the expected versions (412).
+    """
+    data = airplane.model_dump()
+    try:
+        async with async_database.atomic():
+            table_version = await async_database.bump_table_version(Airplane)
+            cursor = await async_database.execute(
+                versioned_update(
+                    Airplane,
+                    airplane_id,
+                    {**data, "change_version": table_version},
+                    expected_versions,
+                )
+            )
+            if cursor.rowcount == 0:
+                raise await _write_failed(airplane_id, expected_versions)
+    finally:
+        airplane_cache.invalidate(airplane_id)
+    change_feed.publish("airplanes", "update", [airplane_id], table_version)
+    return {
+        "message": "Airplane updated successfully",
+        "version": cursor.lastrowid,
+        "table_version": table_version,
+    }
+
+
+async def delete_airplane(
+    airplane_id: int, expected_versions: Optional[List[int]] = None
+):
+    """
+    Deletes an airplane record by its ID with a single DELETE.
+
+    A tombstone of the row is written in the same transaction, for the clients
+    syncing the changes of the table.
+
+    Args:
+        airplane_id (int): The ID of the airplane to delete.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
+
+    Returns:
+        dict: A success message upon deleting the airplane.
+
+    Raises:
+        HTTPException: If no airplane with the given ID is found (404), or it no
+        longer has one of the expected versions (412).
+    """
+    query = versioned_delete(Airplane, airplane_id, expected_versions)
+    try:
+        async with async_database.atomic():
+            table_version = await async_database.bump_table_version(Airplane)
+            cursor = await async_database.execute(query)
+            if cursor.rowcount == 0:
+                raise await _write_failed(airplane_id, expected_versions)
+            await async_database.execute(
+                tombstone_insert(Airplane, airplane_id, table_version)
+            )
+    finally:
+        airplane_cache.invalidate(airplane_id)
+    change_feed.publish("airplanes", "delete", [airplane_id], table_version)
+    return {"message": "Airplane deleted successfully"}
@@ -2,40 +2,307 @@
 Cookbook service
 """
 
-from database import Cookbook
-from schemas.cookbook import CookBookSchema
+from typing import List, Optional
+
+from playhouse.shortcuts import model_to_dict
+
+from database import (
+    Cookbook,
+    CookbookPriceStats,
+    CookbookPageStats,
+    bump_table_version,
+    connection_scope,
+    count_rows,
+    created_ids,
+    created_records,
+    database,
+    estimate_rows,
+    get_table_version,
+    insert_in_chunks,
+    iterate_unbuffered,
+    read_replica,
+    tombstone_insert,
+    versioned_delete,
+    versioned_update,
+)
+from helpers.cache import MISSING, cookbook_cache
+from helpers.events import change_feed
+from helpers.export import encode_rows
+from helpers.filtering import (
+    changes_queries,
+    count_query,
+    list_query,
+    lookup_result,
+    selected_columns,
+)
+from helpers.pagination import DEFAULT_PAGE_SIZE, build_changes, build_page
+from helpers.search import search_query
+from helpers.stats import cookbook_report
+from schemas.cookbook import CookBookFilters, CookBookSchema
 from fastapi import Body, HTTPException
 
 
-def get_all_cookbooks():
+@connection_scope
+def get_all_cookbooks(
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+    filters: Optional[CookBookFilters] = None,
+    fields: Optional[List[str]] = None,
+):
+    """
+    Fetches one page of cookbook records, filtered and sorted as requested.
+
+    The page is located with an index seek on the sort key, so its cost does
+    not depend on how deep the client has paged.
+
+    Args:
+        limit (int): The maximum number of cookbooks to return.
+        after (Optional[str]): The cursor returned with the previous page.
+        filters (Optional[CookBookFilters]): The filters and sort order, by ID
+            and unfiltered if not given.
+        fields (Optional[List[str]]): The columns to select, all if not given.
+
+    Returns:
+        dict: The cookbooks of the page and the cursor of the next page.
+
+    Raises:
+        HTTPException: If the cursor is malformed, or no index serves the
+        filters and sort order (400).
+    """
+    query, key = list_query(
+        Cookbook, filters or CookBookFilters(), limit, after, fields
+    )
+    return build_page(list(query.dicts()), limit, key, fields)
+
+
+def count_cookbooks(
+    filters: Optional[CookBookFilters] = None,
+    approximate: bool = False,
+    table_version: int = 0,
+) -> int:
+    """
+    Counts the cookbooks matching the filters of the list, without reading them.
+
+    Exact counts run a COUNT(*) on the index serving the filters, and are cached
+    by table version so that any write invalidates them. Approximate counts are
+    the optimizer's estimate, read with EXPLAIN, and scan nothing.
+
+    Args:
+        filters (Optional[CookBookFilters]): The filters, unfiltered if not given.
+        approximate (bool): Whether to estimate the count instead.
+        table_version (int): The current version of the cookbook table.
+
+    Returns:
+        int: The number of cookbooks.
+
+    Raises:
+        HTTPException: If no index serves the filters (400).
+    """
+    filters = filters or CookBookFilters()
+    if approximate:
+        return estimate_rows(count_query(Cookbook, filters, approximate=True))
+    return count_rows(count_query(Cookbook, filters), table_version)
+
+
+@connection_scope
+def get_cookbooks_version() -> int:
+    """
+    Fetches the version of the cookbook table, bumped by every write to it.
+
+    Returns:
+        int: The current version of the cookbook table.
+    """
+    return get_table_version(Cookbook)
+
+
+@connection_scope
+def get_cookbook_changes(
+    since: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: Optional[str] = None,
+):
+    """
+    Fetches one page of the cookbooks written and deleted after a table version,
+    read in change order from the change version index and the tombstones.
+
+    The table version is read first, so every change made at or below it is
+    in this page or the following ones.
+
+    Args:
+        since (Optional[int]): The table version the client last synced at,
+            every cookbook if not given.
+        limit (int): The maximum number of changes to return.
+        after (Optional[str]): The cursor returned with the previous page.
+
+    Returns:
+        dict: The cookbooks written and the IDs deleted, the cursor of the next
+        page, and the table version to sync from once every page is read.
+
+    Raises:
+        HTTPException: If the cursor is malformed (400).
+    """
+    version = get_table_version(Cookbook)
+    rows, deleted = changes_queries(Cookbook, since, limit, after)
+    return build_changes(list(rows.dicts()), list(deleted.dicts()), limit, version)
+
+
+@connection_scope
+def search_cookbooks(
+    text: str, limit: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+):
+    """
+    Fetches one page of the cookbooks whose title or author contains every
+    term of the text, best matches first.
+
+    Args:
+        text (str): The text to search for.
+        limit (int): The maximum number of cookbooks to return.
+        after (Optional[str]): The cursor returned with the previous page.
+
+    Returns:
+        dict: The cookbooks of the page with their relevance `score`, and the
+        cursor of the next page.
+
+    Raises:
+        HTTPException: If the text holds no searchable term, or the cursor is
+        malformed (400).
+    """
+    query, offset = search_query(
+        Cookbook, (Cookbook.title, Cookbook.author), text, limit, after
+    )
+    rows = list(query.dicts())
+    return build_page(rows, limit, lambda row: (offset + limit,))
+
+
+@connection_scope
+def get_cookbook_stats():
+    """
+    Fetches the cookbook statistics from the summary tables maintained by the
+    triggers of the cookbook table, which hold one row per group.
+
+    Returns:
+        dict: The number of cookbooks, their average price and page count, and
+        the distributions of both.
+    """
+    first = (
+        CookbookPriceStats.select()
+        .where(CookbookPriceStats.cookbooks > 0)
+        .order_by(CookbookPriceStats.bucket)
+    )
+    second = (
+        CookbookPageStats.select()
+        .where(CookbookPageStats.cookbooks > 0)
+        .order_by(CookbookPageStats.bucket)
+    )
+    return cookbook_report(list(first.dicts()), list(second.dicts()))
+
+
+def export_cookbooks(export_format: str, fields: Optional[List[str]] = None):
     """
-    Fetches all cookbook records from the database.
+    Streams every cookbook record ordered by ID in the given format.
+
+    Rows are read through a server-side cursor and encoded chunk by chunk, so
+    memory use stays flat whatever the size of the table.
+
+    Args:
+        export_format (str): Either "ndjson" or "csv".
+        fields (Optional[List[str]]): The columns to export, all if not given.
 
     Returns:
-        List[dict]: A list of dictionaries representing all cookbooks.
+        Iterator[str]: The encoded cookbooks, one piece per chunk of rows.
     """
-    return list(Cookbook.select().dicts())
+    query = Cookbook.select(*selected_columns(Cookbook, fields)).order_by(Cookbook.id)
+    return encode_rows(iterate_unbuffered(query), export_format)
 
 
-def get_cookbook_by_id(cookbook_id: int):
+def get_cookbook_by_id(cookbook_id: int, table_version: int = 0):
     """
-    Fetches a specific cookbook by its ID.
+    Fetches a specific cookbook by its ID, from the cache when possible.
+
+    Rows read from a replica are not cached, as the replica may still lag
+    behind writes whose invalidation already ran.
+
+    Cache hits without a `table_version` do not touch the database.
 
     Args:
         cookbook_id (int): The ID of the cookbook to retrieve.
+        table_version (int): The current version of the cookbook table, read
+            before this call to revalidate the cache; a cached copy loaded at
+            an older version is not served. The default, 0, serves any copy.
 
     Returns:
-        Cookbook: The cookbook record if found.
+        dict: The cookbook record if found.
 
     Raises:
         HTTPException: If no cookbook with the given ID is found (404).
     """
+    row = cookbook_cache.get(cookbook_id, table_version)
+    if row is MISSING:
+        generation = cookbook_cache.generation()
+        row = _load_cookbook(cookbook_id)
+        if read_replica.get() is None:
+            cookbook_cache.put(cookbook_id, row, generation, table_version)
+    return row
+
+
+@connection_scope
+def _load_cookbook(cookbook_id: int) -> dict:
+    """
+    Reads a cookbook from the database, raising a 404 if it does not exist.
+    """
     try:
-        return Cookbook.get(Cookbook.id == cookbook_id)
+        return Cookbook.select().where(Cookbook.id == cookbook_id).dicts().get()
     except Cookbook.DoesNotExist as exc:
         raise HTTPException(status_code=404, detail="Cookbook not found") from exc
 
 
+def get_cookbooks_by_ids(
+    cookbook_ids: List[int],
+    fields: Optional[List[str]] = None,
+    table_version: int = 0,
+) -> dict:
+    """
+    Fetches the cookbooks with the given IDs, from the cache when possible and
+    otherwise with a single `WHERE id IN (...)` query.
+
+    Rows read from a replica are not cached, as the replica may still lag
+    behind writes whose invalidation already ran.
+
+    Args:
+        cookbook_ids (List[int]): The distinct IDs of the cookbooks to retrieve.
+        fields (Optional[List[str]]): The columns to return, all if not given.
+        table_version (int): The current version of the cookbook table, read
+            before this call; cached copies older than it are not served.
+
+    Returns:
+        dict: The cookbooks found, in the order of `cookbook_ids`, and the IDs
+        that were not found.
+    """
+    rows, uncached = {}, []
+    for cookbook_id in cookbook_ids:
+        row = cookbook_cache.get(cookbook_id, table_version)
+        if row is MISSING:
+            uncached.append(cookbook_id)
+        else:
+            rows[cookbook_id] = row
+    if uncached:
+        generation = cookbook_cache.generation()
+        for row in _load_cookbooks(uncached):
+            rows[row["id"]] = row
+            if read_replica.get() is None:
+                cookbook_cache.put(row["id"], row, generation, table_version)
+    return lookup_result(cookbook_ids, rows, fields)
+
+
+@connection_scope
+def _load_cookbooks(cookbook_ids: List[int]) -> list:
+    """
+    Reads the cookbooks with the given IDs from the database.
+    """
+    return list(Cookbook.select().where(Cookbook.id.in_(cookbook_ids)).dicts())
+
+
+@connection_scope
 def create_cookbook(cookbook: CookBookSchema = Body(...)):
     """
     Creates a new cookbook record in the database.
@@ -44,51 +311,158 @@ def create_cookbook(cookbook: CookBookSchema = Body(...)):
         cookbook (CookBookSchema): The schema containing cookbook data.
 
     Returns:
-        Cookbook: The newly created cookbook record.
+        dict: The newly created cookbook record.
     """
-    return Cookbook.create(**cookbook.dict())
+    data = cookbook.model_dump()
+    with database.atomic():
+        table_version = bump_table_version(Cookbook)
+        record = Cookbook.create(**data, change_version=table_version)
+    cookbook_cache.invalidate(record.id)
+    change_feed.publish("cookbooks", "create", [record.id], table_version)
+    return model_to_dict(record)
 
 
-def update_cookbook(cookbook_id: int, cookbook: CookBookSchema = Body(...)):
+@connection_scope
+def create_cookbooks_bulk(cookbooks: List[CookBookSchema]):
     """
-    Updates an existing cookbook record by its ID.
+    Creates many cookbook records with chunked multi-row INSERTs.
+
+    Items violating a unique key are reported as failed without aborting the
+    rest of the batch.
+
+    Args:
+        cookbooks (List[CookBookSchema]): The schemas containing the cookbook data.
+
+    Returns:
+        dict: The number of cookbooks created and failed, and the outcome of
+        every item in request order.
+    """
+    report = insert_in_chunks(
+        Cookbook, [cookbook.model_dump() for cookbook in cookbooks]
+    )
+    change_feed.publish(
+        "cookbooks", "create", created_ids(report), report["table_version"]
+    )
+    return report
+
+
+@connection_scope
+def create_cookbooks_grouped(cookbooks: List[CookBookSchema]) -> list:
+    """
+    Creates the cookbook records coalesced from concurrent requests, with one
+    multi-row INSERT in one transaction.
+
+    Args:
+        cookbooks (List[CookBookSchema]): The schemas containing the cookbook data.
+
+    Returns:
+        list: For every cookbook, in order, the newly created record or the
+        integrity error to raise to its requester.
+    """
+    rows = [cookbook.model_dump() for cookbook in cookbooks]
+    report = insert_in_chunks(Cookbook, rows)
+    records = created_records(rows, report)
+    ids = [record["id"] for record in records if isinstance(record, dict)]
+    for cookbook_id in ids:
+        cookbook_cache.invalidate(cookbook_id)
+    change_feed.publish("cookbooks", "create", ids, report["table_version"])
+    return records
+
+
+def _write_failed(
+    cookbook_id: int, expected_versions: Optional[List[int]]
+) -> HTTPException:
+    """
+    Explains why a conditional write matched no row. Only runs on the failure
+    path, so successful writes stay a single statement.
+    """
+    if expected_versions is not None and (
+        Cookbook.select().where(Cookbook.id == cookbook_id).exists()
+    ):
+        return HTTPException(
+            status_code=412, detail="Cookbook was modified by another request"
+        )
+    return HTTPException(status_code=404, detail="Cookbook not found")
+
+
+@connection_scope
+def update_cookbook(
+    cookbook_id: int,
+    cookbook: CookBookSchema = Body(...),
+    expected_versions: Optional[List[int]] = None,
+):
+    """
+    Updates an existing cookbook record by its ID with a single UPDATE.
+
+    The row version is bumped in the same statement and read back through
+    LAST_INSERT_ID, and the matched-row count tells whether the row exists.
+    The table version is bumped first in the same transaction and written to
+    the row as its change version; a failed update rolls it back.
 
     Args:
         cookbook_id (int): The ID of the cookbook to update.
         cookbook (CookBookSchema): The schema with updated cookbook data.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
 
     Returns:
-        dict: A success message upon updating the cookbook.
+        dict: A success message and the new versions of the cookbook and of
+        the cookbook table.
 
     Raises:
-        HTTPException: If no cookbook with the given ID is found (404).
+        HTTPException: If no cookbook with the given ID is found (404), or it no
+        longer has one of the expected versions (412).
     """
+    data = cookbook.model_dump()
     try:
-        Cookbook.get(Cookbook.id == cookbook_id)
-    except Cookbook.DoesNotExist as exc:
-        raise HTTPException(status_code=404, detail="Cookbook not found") from exc
+        with database.atomic():
+            table_version = bump_table_version(Cookbook)
+            cursor = database.execute(
+                versioned_update(
+                    Cookbook,
+                    cookbook_id,
+                    {**data, "change_version": table_version},
+                    expected_versions,
+                )
+            )
+            if cursor.rowcount == 0:
+                raise _write_failed(cookbook_id, expected_versions)
+    finally:
+        cookbook_cache.invalidate(cookbook_id)
+    change_feed.publish("cookbooks", "update", [cookbook_id], table_version)
+    return {
+        "message": "Cookbook updated successfully",
+        "version": cursor.lastrowid,
+        "table_version": table_version,
+    }
 
-    Cookbook.update(**cookbook.dict()).where(Cookbook.id == cookbook_id).execute()
-    return {"message": "Cookbook updated successfully"}
 
-
-def delete_cookbook(cookbook_id: int):
+@connection_scope
+def delete_cookbook(cookbook_id: int, expected_versions: Optional[List[int]] = None):
     """
-    Deletes a cookbook record by its ID.
+    Deletes a cookbook record by its ID with a single DELETE.
+
+    A tombstone of the row is written in the same transaction, for the clients
+    syncing the changes of the table.
 
     Args:
         cookbook_id (int): The ID of the cookbook to delete.
+        expected_versions (Optional[List[int]]): The versions the row may still have.
 
     Returns:
         dict: A success message upon deleting the cookbook.
 
     Raises:
-        HTTPException: If no cookbook with the given ID is found (404).
+        HTTPException: If no cookbook with the given ID is found (404), or it no
+        longer has one of the expected versions (412).
     """
+    query = versioned_delete(Cookbook, cookbook_id, expected_versions)
     try:
-        Cookbook.get(Cookbook.id == cookbook_id)
-    except Cookbook.DoesNotExist as exc:
-        raise HTTPException(status_code=404, detail="Cookbook not found") from exc
-
-    Cookbook.delete().where(Cookbook.id == cookbook_id).execute()
+        with database.atomic():
+            table_version = bump_table_version(Cookbook)
+            if query.execute() == 0:
+                raise _write_failed(cookbook_id, expected_versions)
+            database.execute(tombstone_insert(Cookbook, cookbook_id, table_version))
+    finally:
+        cookbook_cache.invalidate(cookbook_id)
+    change_feed.publish("cookbooks", "delete", [cookbook_id], table_version)
     return {"message": "Cookbook deleted successfully"}
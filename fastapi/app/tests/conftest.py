@@ -0,0 +1,13 @@
+"""
+Shared pytest setup: the app modules import each other by their flat names,
+as they do when the app runs from its own directory, so that directory is put
+on the import path.
+"""
+
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[1]
+
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
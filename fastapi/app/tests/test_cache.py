@@ -0,0 +1,65 @@
+"""
+Tests of the LRU cache and its generation and table version rules.
+"""
+
+from helpers.cache import MISSING, LRUCache
+
+
+def test_get_after_put():
+    """A stored value is served until invalidated."""
+    cache = LRUCache(4, 60)
+    assert cache.get("a") is MISSING
+    cache.put("a", 1, cache.generation())
+    assert cache.get("a") == 1
+    cache.invalidate("a")
+    assert cache.get("a") is MISSING
+
+
+def test_load_overlapping_an_invalidation_is_not_stored():
+    """A value loaded while a write invalidated the cache may be stale."""
+    cache = LRUCache(4, 60)
+    generation = cache.generation()
+    cache.invalidate("other")
+    cache.put("a", 1, generation)
+    assert cache.get("a") is MISSING
+    cache.put("a", 2, cache.generation())
+    assert cache.get("a") == 2
+
+
+def test_table_version_is_only_checked_when_given():
+    """Entries older than the version looked up with are dropped as outdated."""
+    cache = LRUCache(4, 60)
+    cache.put("a", 1, cache.generation(), version=5)
+    assert cache.get("a") == 1
+    assert cache.get("a", 5) == 1
+    assert cache.get("a", 6) is MISSING
+    assert cache.stats()["outdated"] == 1
+    assert cache.get("a") is MISSING
+
+
+def test_expired_entry_is_a_miss():
+    """Entries past their TTL are not served."""
+    cache = LRUCache(4, -1)
+    cache.put("a", 1, cache.generation())
+    assert cache.get("a") is MISSING
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    """A full cache drops the entry used longest ago."""
+    cache = LRUCache(2, 60)
+    for key in ("a", "b"):
+        cache.put(key, key, cache.generation())
+    cache.get("a")
+    cache.put("c", "c", cache.generation())
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == "a" and cache.get("c") == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_size_cache_stores_nothing():
+    """A cache of size 0 disables caching."""
+    cache = LRUCache(0, 60)
+    cache.put("a", 1, cache.generation())
+    assert cache.get("a") is MISSING
+    assert cache.stats()["size"] == 0
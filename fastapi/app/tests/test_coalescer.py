@@ -0,0 +1,105 @@
+"""
+Tests of the write coalescer batching.
+"""
+
+import asyncio
+
+import pytest
+
+from helpers.coalescer import WriteCoalescer
+
+from fastapi import HTTPException
+
+
+class Recorder:
+    """
+    A flush recording the batches it receives, answering each item doubled, or
+    with the exception it is.
+    """
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    async def __call__(self, items):
+        self.batches.append(items)
+        if self.error is not None:
+            raise self.error
+        return [item if isinstance(item, Exception) else item * 2 for item in items]
+
+
+def run(coroutine):
+    """Runs a coroutine on a fresh event loop, bounded in time."""
+    return asyncio.run(asyncio.wait_for(coroutine, 5))
+
+
+def test_concurrent_items_share_a_batch():
+    """Items submitted within the wait are flushed together, in order."""
+    flush = Recorder()
+    coalescer = WriteCoalescer("t", flush, max_batch=10, max_wait=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(*(coalescer.submit(item) for item in range(4)))
+
+    assert run(submit_all()) == [0, 2, 4, 6]
+    assert flush.batches == [[0, 1, 2, 3]]
+
+
+def test_full_batch_is_flushed_without_waiting():
+    """Reaching the batch size writes at once, long before the wait ends."""
+    flush = Recorder()
+    coalescer = WriteCoalescer("t", flush, max_batch=2, max_wait=60)
+
+    async def submit_all():
+        return await asyncio.gather(*(coalescer.submit(item) for item in range(4)))
+
+    assert run(submit_all()) == [0, 2, 4, 6]
+    assert flush.batches == [[0, 1], [2, 3]]
+
+
+def test_item_error_only_reaches_its_caller():
+    """An outcome that is an exception is raised to its own caller only."""
+    error = ValueError("duplicate")
+    coalescer = WriteCoalescer("t", Recorder(), max_batch=10, max_wait=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(
+            coalescer.submit(1), coalescer.submit(error), return_exceptions=True
+        )
+
+    assert run(submit_all()) == [2, error]
+
+
+def test_failed_flush_raises_a_fresh_error_to_each_caller():
+    """Every caller of a failed batch gets an error of its own, chained to it."""
+    cause = RuntimeError("connection lost")
+    coalescer = WriteCoalescer("t", Recorder(cause), max_batch=10, max_wait=0.01)
+
+    async def submit_all():
+        return await asyncio.gather(
+            *(coalescer.submit(item) for item in range(3)), return_exceptions=True
+        )
+
+    errors = run(submit_all())
+    assert all(isinstance(error, HTTPException) for error in errors)
+    assert len({id(error) for error in errors}) == 3
+    assert all(error.status_code == 500 for error in errors)
+    assert all(error.__cause__ is cause for error in errors)
+
+
+def test_cancelled_caller_does_not_cancel_the_batch():
+    """The items of the other callers are still written."""
+    flush = Recorder()
+    coalescer = WriteCoalescer("t", flush, max_batch=10, max_wait=0.01)
+
+    async def submit_all():
+        gone = asyncio.ensure_future(coalescer.submit(1))
+        kept = asyncio.ensure_future(coalescer.submit(2))
+        await asyncio.sleep(0)
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        return await kept
+
+    assert run(submit_all()) == 4
+    assert flush.batches == [[1, 2]]
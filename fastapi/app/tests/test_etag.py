@@ -0,0 +1,64 @@
+"""
+Tests of the entity tag helpers.
+"""
+
+import pytest
+
+from helpers.etag import format_etag, matching_etag, parse_if_match
+
+from fastapi import HTTPException
+
+
+def test_format_etag():
+    """List tags hold the table version, item tags the change and row versions."""
+    assert format_etag(12) == '"12"'
+    assert format_etag(12, 3) == '"12.3"'
+
+
+@pytest.mark.parametrize(
+    "header",
+    ['"12.3"', 'W/"12.3"', '"1.1", "12.3"', '"9.9",W/"12.3"', "*", '"1.1", *'],
+)
+def test_if_none_match_matches(header):
+    """The current tag, weak or among others, or `*` answers 304."""
+    assert matching_etag(header, '"12.3"') == '"12.3"'
+
+
+@pytest.mark.parametrize("header", [None, "", '"12.4"', '"12"', '"2.3"', "garbage"])
+def test_if_none_match_misses(header):
+    """Any other tag, or no header, has the representation sent."""
+    assert matching_etag(header, '"12.3"') is None
+
+
+def test_list_tag_matches_only_its_table_version():
+    """A list tag is compared whole, not by prefix."""
+    assert matching_etag('"12"', '"12"') == '"12"'
+    assert matching_etag('"12.3"', '"12"') is None
+
+
+@pytest.mark.parametrize("header", [None, "*", " * ", '"1.2", *'])
+def test_unconditional_if_match(header):
+    """Without a header, or with `*`, the write is unconditional."""
+    assert parse_if_match(header) is None
+
+
+@pytest.mark.parametrize(
+    "header, versions",
+    [
+        ('"5.3"', [3]),
+        ('"1.2", "1.3"', [2, 3]),
+        ('"1.2",W/"1.3"', [2]),
+        (' "40.7" ', [7]),
+    ],
+)
+def test_if_match_row_versions(header, versions):
+    """The row versions of every strong item tag are accepted."""
+    assert parse_if_match(header) == versions
+
+
+@pytest.mark.parametrize("header", ['W/"5.3"', '"5"', "garbage", '"a.b"', "", '"5.3'])
+def test_if_match_without_item_tag_fails(header):
+    """Weak tags, list tags and malformed tags never match: 412."""
+    with pytest.raises(HTTPException) as error:
+        parse_if_match(header)
+    assert error.value.status_code == 412
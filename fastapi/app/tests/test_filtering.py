@@ -0,0 +1,32 @@
+"""
+Tests of the sparse fieldset parsing.
+"""
+
+import pytest
+
+from database import Airplane
+from helpers.filtering import parse_fields
+
+from fastapi import HTTPException
+
+
+def test_no_fields_selects_every_column():
+    """Without `fields`, the whole row is returned."""
+    assert parse_fields(Airplane, None) is None
+
+
+def test_fields_are_distinct_and_in_order():
+    """Names are trimmed, deduplicated and kept in the order given."""
+    assert parse_fields(Airplane, " model,id,, model ,airline") == [
+        "model",
+        "id",
+        "airline",
+    ]
+
+
+@pytest.mark.parametrize("raw", ["", ",", "id,wings", "ID"])
+def test_unknown_or_empty_fields_are_rejected(raw):
+    """A name that is not a column, or no name at all, is answered with 400."""
+    with pytest.raises(HTTPException) as error:
+        parse_fields(Airplane, raw)
+    assert error.value.status_code == 400
@@ -0,0 +1,40 @@
+"""
+Tests of the keyset pagination cursors.
+"""
+
+import pytest
+
+from helpers.pagination import decode_cursor, encode_cursor
+
+from fastapi import HTTPException
+
+
+@pytest.mark.parametrize("key", [(7,), ("Airline A", 2001, 42), (19.5, None, 3)])
+def test_cursor_round_trip(key):
+    """A cursor decodes back to the sort key it was built from."""
+    cursor = encode_cursor(key)
+    assert decode_cursor(cursor, len(key)) == list(key)
+
+
+def test_cursor_is_url_safe_without_padding():
+    """Cursors can be sent in a query string as they are."""
+    cursor = encode_cursor(("ÿÿÿ", 1))
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize(
+    "cursor, size",
+    [
+        ("not a cursor!", 1),
+        (encode_cursor((1, 2)), 1),
+        (encode_cursor(("a", "b")), 2),
+        ("eyJhIjoxfQ", 1),  # {"a":1}, not a list.
+        ("", 1),
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor, size):
+    """A cursor of another shape, or not a cursor at all, is answered with 400."""
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, size)
+    assert error.value.status_code == 400
@@ -0,0 +1,723 @@
+"""
+Endpoint benchmark suite.
+
+Loads `schema.sql` into a throwaway MySQL database, seeds it with generated
+airplanes and cookbooks through the models of `database.py`, then drives the
+airplane and cookbook routes in-process through an ASGI client at fixed
+concurrency levels. Throughput, p50/p95/p99 latency and the peak RSS of the
+process so far are written to a JSON file, which `compare` checks against a
+baseline. With `--trace-memory`, the peak memory allocated during each scenario
+is traced as well. Single creations
+are also run alone and coalesced (see `helpers/coalescer.py`), whatever
+`COALESCE_WRITES` says, and the throughput of both is reported side by side.
+
+The MySQL server is taken from the same MYSQL_* settings as the app, but the
+database named by `--database` is dropped and recreated on every run, so it
+must not be the database of the app.
+
+Usage:
+    python fastapi/benchmarks/bench.py run --rows 10000 --output baseline.json
+    python fastapi/benchmarks/bench.py run --rows 10000 --output current.json
+    python fastapi/benchmarks/bench.py compare baseline.json current.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import httpx
+import pymysql
+from dotenv import load_dotenv
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+SCHEMA_PATH = Path(__file__).resolve().parents[2] / "schema.sql"
+
+SEED = 20240921
+SEED_CHUNK_SIZE = 5000
+AIRLINES = [f"Airline {letter}" for letter in "ABCDEFGHIJKLMNOPQRST"]
+AUTHORS = [
+    f"{first} {last}"
+    for first in ("Ana", "Luis", "Marta", "Jorge", "Sofia")
+    for last in ("Garcia", "Lopez", "Martinez", "Rodriguez", "Perez")
+]
+DISHES = ["Pasta", "Bread", "Soup", "Dessert", "Grill", "Salad", "Rice", "Curry"]
+
+load_dotenv(APP_DIR / ".env")
+
+
+def load_schema(conn, path: Path = SCHEMA_PATH):
+    """
+    Runs a mysql client script, honouring its DELIMITER directives.
+
+    Args:
+        conn (pymysql.Connection): The connection to run the script on.
+        path (Path): The script to run.
+    """
+    delimiter, statement = ";", []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split()[1]
+            continue
+        if not statement and (not stripped or stripped.startswith("--")):
+            continue
+        statement.append(line)
+        if stripped.endswith(delimiter):
+            sql = "\n".join(statement).rstrip()[: -len(delimiter)]
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+            statement = []
+
+
+def prepare_database(name: str):
+    """
+    Drops and recreates the benchmark database from `schema.sql`, and points
+    the app at it.
+
+    Args:
+        name (str): The name of the benchmark database.
+
+    Raises:
+        SystemExit: If the name is the one of the app database.
+    """
+    if name == os.getenv("MYSQL_DATABASE"):
+        sys.exit(f"Refusing to drop the app database {name!r}")
+    conn = pymysql.connect(
+        host=os.getenv("MYSQL_HOST"),
+        port=int(os.getenv("MYSQL_PORT")),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        autocommit=True,
+    )
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+            cursor.execute(f"CREATE DATABASE `{name}`")
+        conn.select_db(name)
+        load_schema(conn)
+    finally:
+        conn.close()
+    os.environ["MYSQL_DATABASE"] = name
+
+
+def airplane_row(rng: random.Random) -> dict:
+    """
+    Generates the column values of an airplane.
+    """
+    return {
+        "model": f"Model {rng.randint(100, 999)}",
+        "manufacture_year": rng.randint(1950, 2023),
+        "seats": rng.randrange(2, 400, 2),
+        "airline": rng.choice(AIRLINES),
+        "max_speed": round(rng.uniform(300, 1000), 1),
+        "weight": round(rng.uniform(5000, 300000), 1),
+    }
+
+
+def cookbook_row(rng: random.Random, number: int) -> dict:
+    """
+    Generates the column values of a cookbook; `number` keeps the ISBN and
+    the title unique.
+    """
+    return {
+        "isbn": f"{number:010d}",
+        "title": f"{rng.choice(DISHES)} book {number}",
+        "author": rng.choice(AUTHORS),
+        "publication_year": rng.randint(1900, 2023),
+        "num_pages": rng.randint(50, 1200),
+        "price": round(rng.uniform(5, 150), 2),
+    }
+
+
+def seed(rows: int):
+    """
+    Inserts `rows` airplanes and `rows` cookbooks with chunked multi-row INSERTs.
+
+    Args:
+        rows (int): The number of rows to insert into each table.
+    """
+    # pylint: disable=import-outside-toplevel
+    from database import Airplane, Cookbook, connection_scope, insert_in_chunks
+
+    rng = random.Random(SEED)
+
+    @connection_scope
+    def insert(model, make_row):
+        for start in range(0, rows, SEED_CHUNK_SIZE):
+            count = min(SEED_CHUNK_SIZE, rows - start)
+            chunk = [make_row(start + offset) for offset in range(count)]
+            insert_in_chunks(model, chunk, SEED_CHUNK_SIZE)
+
+    insert(Airplane, lambda number: airplane_row(rng))
+    insert(Cookbook, lambda number: cookbook_row(rng, number))
+
+
+@dataclass
+class Scenario:
+    """
+    A route to benchmark.
+
+    Attributes:
+        name (str): The name the results are recorded under.
+        request (Callable): Sends one request, given the client and the context.
+        setup (Optional[Callable]): Prepares the context before the timed run,
+            given the number of requests about to be sent.
+        configure (Optional[Callable]): Returns a context manager the run is
+            wrapped in, to change how the app behaves during it.
+        max_concurrency (Optional[str]): The setting of `config.py` capping the
+            concurrent requests the route serves; higher levels are skipped, as
+            their extra requests would only be refused.
+    """
+
+    name: str
+    request: Callable
+    setup: Optional[Callable] = None
+    configure: Optional[Callable] = None
+    max_concurrency: Optional[str] = None
+
+
+@dataclass
+class Context:
+    """
+    The state shared by the requests of a run.
+
+    Attributes:
+        rows (int): The number of seeded rows per table.
+        rng (random.Random): The random source of the requests.
+        numbers (Iterator[int]): Unique numbers for the ISBNs and titles created.
+        victims (dict): The IDs left to delete, by table.
+        app (ASGIApp): The app, for the requests the client cannot send.
+        trace_memory (bool): Whether to trace the memory allocated by each
+            scenario, which slows every allocation down, and the latencies with it.
+    """
+
+    rows: int
+    app: object = None
+    trace_memory: bool = False
+    rng: random.Random = field(default_factory=lambda: random.Random(SEED))
+    numbers: itertools.count = None
+    victims: dict = field(default_factory=lambda: {"airplanes": [], "cookbooks": []})
+
+    def __post_init__(self):
+        self.numbers = itertools.count(self.rows + 1)
+
+    def some_id(self) -> int:
+        """
+        Picks the ID of a seeded row.
+        """
+        return self.rng.randint(1, self.rows)
+
+
+def _create_victims(table: str, bulk_body: Callable):
+    """
+    Builds a setup that creates the rows a delete scenario will remove.
+    """
+
+    async def setup(client, ctx: Context, count: int):
+        for start in range(0, count, 1000):
+            body = [bulk_body(ctx) for _ in range(min(1000, count - start))]
+            response = await client.post(f"/api/{table}/bulk", json=body)
+            ctx.victims[table].extend(
+                item["id"] for item in response.json()["results"] if "id" in item
+            )
+
+    return setup
+
+
+def _new_cookbook(ctx: Context) -> dict:
+    return cookbook_row(ctx.rng, next(ctx.numbers))
+
+
+@contextmanager
+def coalescing(enabled: bool):
+    """
+    Makes `POST /api/airplanes/` write every airplane alone, or coalesce the
+    concurrent ones, while the block runs, whatever `COALESCE_WRITES` says.
+
+    Args:
+        enabled (bool): Whether the creations are coalesced.
+    """
+    # pylint: disable=import-outside-toplevel
+    from config import COALESCE_MAX_BATCH, COALESCE_MAX_WAIT_MS
+    from helpers.coalescer import WriteCoalescer
+    from routes import airplane as airplane_routes
+
+    original = airplane_routes.create_airplane
+    service = airplane_routes.service
+    if enabled:
+        airplane_routes.create_airplane = WriteCoalescer(
+            "airplanes",
+            service.create_airplanes_grouped,
+            COALESCE_MAX_BATCH,
+            COALESCE_MAX_WAIT_MS / 1000,
+        ).submit
+    else:
+        airplane_routes.create_airplane = service.create_airplane
+    try:
+        yield
+    finally:
+        airplane_routes.create_airplane = original
+
+
+async def _event_catch_up(_client, ctx: Context):
+    """
+    Subscribes to the change feed as a client reconnecting after missing every
+    write, and disconnects once the catch-up "changed" event has arrived.
+
+    The ASGI transport of httpx only returns a response once it has ended, and
+    an event stream never ends, so the app is called directly.
+    """
+    status, caught_up = 500, asyncio.Event()
+
+    async def receive():
+        await caught_up.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif b"event: changed" in message.get("body", b""):
+            caught_up.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/events",
+        "raw_path": b"/api/events",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"last-event-id", b"airplanes:0")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    await ctx.app(scope, receive, send)
+    return httpx.Response(status)
+
+
+SCENARIOS = [
+    Scenario(
+        "airplanes.list",
+        lambda client, ctx: client.get("/api/airplanes/", params={"limit": 50}),
+    ),
+    Scenario(
+        "airplanes.list_filtered",
+        lambda client, ctx: client.get(
+            "/api/airplanes/",
+            params={"airline": ctx.rng.choice(AIRLINES), "sort": "-manufacture_year"},
+        ),
+    ),
+    Scenario(
+        "airplanes.get",
+        lambda client, ctx: client.get(f"/api/airplanes/{ctx.some_id()}"),
+    ),
+    Scenario(
+        "airplanes.create",
+        lambda client, ctx: client.post("/api/airplanes/", json=airplane_row(ctx.rng)),
+    ),
+    Scenario(
+        "airplanes.create_alone",
+        lambda client, ctx: client.post("/api/airplanes/", json=airplane_row(ctx.rng)),
+        configure=lambda: coalescing(False),
+    ),
+    Scenario(
+        "airplanes.create_coalesced",
+        lambda client, ctx: client.post("/api/airplanes/", json=airplane_row(ctx.rng)),
+        configure=lambda: coalescing(True),
+    ),
+    Scenario(
+        "airplanes.bulk",
+        lambda client, ctx: client.post(
+            "/api/airplanes/bulk", json=[airplane_row(ctx.rng) for _ in range(100)]
+        ),
+    ),
+    Scenario(
+        "airplanes.update",
+        lambda client, ctx: client.put(
+            f"/api/airplanes/{ctx.some_id()}", json=airplane_row(ctx.rng)
+        ),
+    ),
+    Scenario(
+        "airplanes.delete",
+        lambda client, ctx: client.delete(
+            f"/api/airplanes/{ctx.victims['airplanes'].pop()}"
+        ),
+        setup=_create_victims("airplanes", lambda ctx: airplane_row(ctx.rng)),
+    ),
+    Scenario("airplanes.stats", lambda client, ctx: client.get("/api/airplanes/stats")),
+    Scenario(
+        "airplanes.export",
+        lambda client, ctx: client.get(
+            "/api/airplanes/export", params={"format": "csv"}
+        ),
+        max_concurrency="EXPORT_MAX_CONCURRENT",
+    ),
+    Scenario(
+        "airplanes.changes",
+        lambda client, ctx: client.get(
+            "/api/airplanes/changes", params={"since": 1, "limit": 100}
+        ),
+    ),
+    Scenario("events.catch_up", _event_catch_up),
+    Scenario(
+        "cookbooks.list",
+        lambda client, ctx: client.get("/api/cookbooks/", params={"limit": 50}),
+    ),
+    Scenario(
+        "cookbooks.list_filtered",
+        lambda client, ctx: client.get(
+            "/api/cookbooks/", params={"sort": "price", "price_max": 20}
+        ),
+    ),
+    Scenario(
+        "cookbooks.search",
+        lambda client, ctx: client.get(
+            "/api/cookbooks/search", params={"q": ctx.rng.choice(DISHES)[:4]}
+        ),
+    ),
+    Scenario(
+        "cookbooks.get",
+        lambda client, ctx: client.get(f"/api/cookbooks/{ctx.some_id()}"),
+    ),
+    Scenario(
+        "cookbooks.create",
+        lambda client, ctx: client.post("/api/cookbooks/", json=_new_cookbook(ctx)),
+    ),
+    Scenario(
+        "cookbooks.bulk",
+        lambda client, ctx: client.post(
+            "/api/cookbooks/bulk", json=[_new_cookbook(ctx) for _ in range(100)]
+        ),
+    ),
+    Scenario(
+        "cookbooks.update",
+        lambda client, ctx: client.put(
+            f"/api/cookbooks/{ctx.some_id()}",
+            json=_new_cookbook(ctx),
+        ),
+    ),
+    Scenario(
+        "cookbooks.delete",
+        lambda client, ctx: client.delete(
+            f"/api/cookbooks/{ctx.victims['cookbooks'].pop()}"
+        ),
+        setup=_create_victims("cookbooks", _new_cookbook),
+    ),
+    Scenario("cookbooks.stats", lambda client, ctx: client.get("/api/cookbooks/stats")),
+    Scenario(
+        "cookbooks.export",
+        lambda client, ctx: client.get(
+            "/api/cookbooks/export", params={"format": "ndjson"}
+        ),
+        max_concurrency="EXPORT_MAX_CONCURRENT",
+    ),
+    Scenario(
+        "cookbooks.changes",
+        lambda client, ctx: client.get(
+            "/api/cookbooks/changes", params={"since": 1, "limit": 100}
+        ),
+    ),
+]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of sorted values.
+    """
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Returns the peak resident set size of the process so far, in MiB. It only
+    ever grows, over the seeding and every scenario run before, so it does not
+    tell the memory of one scenario apart.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_scenario(
+    client,
+    ctx: Context,
+    scenario: Scenario,
+    concurrency: int,
+    requests: int,
+) -> dict:
+    """
+    Sends `requests` requests of a scenario from `concurrency` concurrent workers.
+
+    Args:
+        client (httpx.AsyncClient): The in-process client of the app.
+        ctx (Context): The state shared by the requests.
+        scenario (Scenario): The route to benchmark.
+        concurrency (int): The number of requests in flight at any time.
+        requests (int): The number of requests to send.
+
+    Returns:
+        dict: The throughput, latency percentiles, error count, peak RSS of the
+        process so far and, when traced, peak memory allocated by the scenario.
+    """
+    configure = scenario.configure or nullcontext
+    if ctx.trace_memory:
+        tracemalloc.start()
+    try:
+        with configure():
+            result = await _timed_run(client, ctx, scenario, concurrency, requests)
+        if ctx.trace_memory:
+            _current, peak = tracemalloc.get_traced_memory()
+            result["peak_alloc_mb"] = round(peak / (1024 * 1024), 1)
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+async def _timed_run(
+    client, ctx: Context, scenario: Scenario, concurrency: int, requests: int
+) -> dict:
+    """
+    Sets a scenario up and sends its requests, as described in `run_scenario`.
+    """
+    if scenario.setup is not None:
+        await scenario.setup(client, ctx, requests)
+    latencies, errors, pending = [], 0, iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            started = time.perf_counter()
+            response = await scenario.request(client, ctx)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_all(args) -> dict:
+    """
+    Runs every selected scenario at every concurrency level.
+    """
+    # pylint: disable=import-outside-toplevel
+    import config
+    from async_database import async_database
+    from database import database
+    from main import app
+
+    ctx = Context(rows=args.rows, app=app, trace_memory=args.trace_memory)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for scenario in SCENARIOS:
+                if args.only and not any(
+                    scenario.name.startswith(p) for p in args.only
+                ):
+                    continue
+                for concurrency in args.concurrency:
+                    key = f"{scenario.name}@c{concurrency}"
+                    limit = scenario.max_concurrency
+                    if limit and concurrency > getattr(config, limit):
+                        print(f"{key:36} skipped, over {limit}", flush=True)
+                        continue
+                    results[key] = await run_scenario(
+                        client,
+                        ctx,
+                        scenario,
+                        concurrency,
+                        args.requests,
+                    )
+                    print(f"{key:36} {json.dumps(results[key])}", flush=True)
+    finally:
+        database.close_all()
+        await async_database.close()
+    return results
+
+
+def compare_coalescing(results: dict) -> dict:
+    """
+    Pairs the throughput of the airplane creations written alone and coalesced,
+    at every concurrency level both ran at.
+
+    Args:
+        results (dict): The results of the scenarios, by scenario and level.
+
+    Returns:
+        dict: The throughput of both and the speedup of coalescing, by level.
+    """
+    comparison = {}
+    for key, alone in results.items():
+        name, _, level = key.partition("@")
+        coalesced = results.get(f"airplanes.create_coalesced@{level}")
+        if name != "airplanes.create_alone" or coalesced is None:
+            continue
+        comparison[level] = {
+            "alone": alone["throughput"],
+            "coalesced": coalesced["throughput"],
+            "speedup": round(
+                coalesced["throughput"] / max(alone["throughput"], 1e-9), 2
+            ),
+        }
+        print(f"coalescing@{level:6} {json.dumps(comparison[level])}", flush=True)
+    return comparison
+
+
+def command_run(args) -> int:
+    """
+    Prepares and seeds the benchmark database, runs the scenarios and writes
+    the results.
+    """
+    prepare_database(args.database)
+    sys.path.insert(0, str(APP_DIR))
+    started = time.perf_counter()
+    seed(args.rows)
+    seed_seconds = round(time.perf_counter() - started, 1)
+    print(f"Seeded {args.rows} rows per table in {seed_seconds} s", flush=True)
+
+    results = asyncio.run(run_all(args))
+    report = {
+        "meta": {
+            "rows": args.rows,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "trace_memory": args.trace_memory,
+            "backend": os.getenv("DB_BACKEND", "sync"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed_seconds": seed_seconds,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+        "coalescing": compare_coalescing(results),
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    return 0
+
+
+def command_compare(args) -> int:
+    """
+    Compares results against a baseline, failing on any scenario whose
+    throughput dropped or whose p95/p99 latency grew by more than the tolerance.
+    """
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))["results"]
+    regressions = []
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key], current[key]
+        checks = [
+            ("throughput", before["throughput"] / max(after["throughput"], 1e-9)),
+            ("p95_ms", after["p95_ms"] / max(before["p95_ms"], 1e-9)),
+            ("p99_ms", after["p99_ms"] / max(before["p99_ms"], 1e-9)),
+        ]
+        for metric, ratio in checks:
+            status = "REGRESSION" if ratio > 1 + args.tolerance else "ok"
+            if status != "ok":
+                regressions.append(key)
+            print(
+                f"{key:36} {metric:10} {before[metric]:>12} -> {after[metric]:>12}  {status}"
+            )
+    for key in sorted(baseline.keys() - current.keys()):
+        print(f"{key:36} missing from the current results")
+    if regressions:
+        print(
+            f"{len(set(regressions))} scenario(s) regressed by more than "
+            f"{args.tolerance:.0%}"
+        )
+        return 1
+    return 0
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="seed the database and run the scenarios")
+    run.add_argument(
+        "--rows", type=int, default=10000, help="rows seeded per table (10k to 1M)"
+    )
+    run.add_argument(
+        "--requests",
+        type=int,
+        default=500,
+        help="requests per scenario and concurrency level",
+    )
+    run.add_argument(
+        "--concurrency",
+        type=lambda value: [int(level) for level in value.split(",")],
+        default=[1, 8, 32],
+        help="comma-separated concurrency levels",
+    )
+    run.add_argument(
+        "--only",
+        nargs="*",
+        help="only run the scenarios whose name starts with these prefixes",
+    )
+    run.add_argument(
+        "--database",
+        default="benchmarks",
+        help="the throwaway database to drop and recreate",
+    )
+    run.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="trace the peak memory allocated by each scenario, slowing it down",
+    )
+    run.add_argument("--output", default="benchmark.json", help="the results file")
+    run.set_defaults(handler=command_run)
+
+    compare = commands.add_parser("compare", help="fail on regressions from a baseline")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="allowed relative slowdown, 0.10 for 10%%",
+    )
+    compare.set_defaults(handler=command_compare)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    sys.exit(arguments.handler(arguments))
@@ -4,7 +4,9 @@
 --
 -- Host: 127.0.0.1
 -- Generation Time: Sep 21, 2024 at 12:30 AM
--- Server version: 10.4.32-MariaDB
+-- Server version: MySQL 8.0 (the mysql:8.0 image of mysql/Dockerfile). The FULLTEXT
+-- ngram parser and SHOW REPLICA STATUS used below and by the app need MySQL
+-- 8.0.22 or later; MariaDB is not supported.
 -- PHP Version: 8.0.30
 
 SET SQL_MODE = "NO_AUTO_VALUE_ON_ZERO";
@@ -23,6 +25,24 @@ SET time_zone = "+00:00";
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `airplanes`
+--
+
+CREATE TABLE `airplanes` (
+  `id` int(11) NOT NULL,
+  `model` varchar(50) NOT NULL,
+  `manufacture_year` int(11) NOT NULL,
+  `seats` int(11) NOT NULL,
+  `airline` varchar(50) NOT NULL,
+  `max_speed` double NOT NULL,
+  `weight` double NOT NULL,
+  `version` int(11) NOT NULL DEFAULT 1,
+  `change_version` bigint(20) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `cook_books`
 --
@@ -34,30 +54,326 @@ CREATE TABLE `cook_books` (
   `author` varchar(50) NOT NULL,
   `publication_year` int(11) NOT NULL,
   `price` decimal(10,2) NOT NULL,
-  `num_pages` int(11) NOT NULL
+  `num_pages` int(11) NOT NULL,
+  `version` int(11) NOT NULL DEFAULT 1,
+  `change_version` bigint(20) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `table_versions`
+--
+
+CREATE TABLE `table_versions` (
+  `table_name` varchar(64) NOT NULL,
+  `version` bigint(20) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+--
+-- Dumping data for table `table_versions`
+--
+
+INSERT INTO `table_versions` (`table_name`, `version`) VALUES
+('airplanes', 0),
+('cook_books', 0);
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `tombstones`
+--
+
+CREATE TABLE `tombstones` (
+  `table_name` varchar(64) NOT NULL,
+  `change_version` bigint(20) NOT NULL,
+  `row_id` int(11) NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `airplane_airline_stats`
+--
+
+CREATE TABLE `airplane_airline_stats` (
+  `airline` varchar(50) NOT NULL,
+  `airplanes` int(11) NOT NULL DEFAULT 0,
+  `seats` bigint(20) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `airplane_year_stats`
+--
+
+CREATE TABLE `airplane_year_stats` (
+  `manufacture_year` int(11) NOT NULL,
+  `airplanes` int(11) NOT NULL DEFAULT 0,
+  `max_speed_sum` double NOT NULL DEFAULT 0,
+  `weight_sum` double NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `cookbook_price_stats`
+--
+
+CREATE TABLE `cookbook_price_stats` (
+  `bucket` int(11) NOT NULL,
+  `cookbooks` int(11) NOT NULL DEFAULT 0,
+  `price_sum` decimal(14,2) NOT NULL DEFAULT 0.00
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `cookbook_page_stats`
+--
+
+CREATE TABLE `cookbook_page_stats` (
+  `bucket` int(11) NOT NULL,
+  `cookbooks` int(11) NOT NULL DEFAULT 0,
+  `pages_sum` bigint(20) NOT NULL DEFAULT 0
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
+--
+-- Triggers `airplanes`
+--
+-- Keep the airplane summary tables up to date in the transaction of every
+-- write, so the stats endpoints read a few summary rows instead of the table.
+--
+DELIMITER $$
+CREATE TRIGGER `airplanes_stats_insert` AFTER INSERT ON `airplanes` FOR EACH ROW BEGIN
+  INSERT INTO `airplane_airline_stats` (`airline`, `airplanes`, `seats`)
+    VALUES (NEW.`airline`, 1, NEW.`seats`)
+    ON DUPLICATE KEY UPDATE `airplanes` = `airplanes` + 1, `seats` = `seats` + NEW.`seats`;
+  INSERT INTO `airplane_year_stats` (`manufacture_year`, `airplanes`, `max_speed_sum`, `weight_sum`)
+    VALUES (NEW.`manufacture_year`, 1, NEW.`max_speed`, NEW.`weight`)
+    ON DUPLICATE KEY UPDATE `airplanes` = `airplanes` + 1,
+      `max_speed_sum` = `max_speed_sum` + NEW.`max_speed`, `weight_sum` = `weight_sum` + NEW.`weight`;
+END
+$$
+-- The old and new group rows of each summary table are locked in key order,
+-- so two updates moving airplanes between the same groups in opposite
+-- directions cannot deadlock.
+CREATE TRIGGER `airplanes_stats_update` AFTER UPDATE ON `airplanes` FOR EACH ROW BEGIN
+  IF NEW.`airline` < OLD.`airline` THEN
+    INSERT INTO `airplane_airline_stats` (`airline`, `airplanes`, `seats`)
+      VALUES (NEW.`airline`, 1, NEW.`seats`)
+      ON DUPLICATE KEY UPDATE `airplanes` = `airplanes` + 1, `seats` = `seats` + NEW.`seats`;
+    UPDATE `airplane_airline_stats`
+      SET `airplanes` = `airplanes` - 1, `seats` = `seats` - OLD.`seats`
+      WHERE `airline` = OLD.`airline`;
+  ELSE
+    UPDATE `airplane_airline_stats`
+      SET `airplanes` = `airplanes` - 1, `seats` = `seats` - OLD.`seats`
+      WHERE `airline` = OLD.`airline`;
+    INSERT INTO `airplane_airline_stats` (`airline`, `airplanes`, `seats`)
+      VALUES (NEW.`airline`, 1, NEW.`seats`)
+      ON DUPLICATE KEY UPDATE `airplanes` = `airplanes` + 1, `seats` = `seats` + NEW.`seats`;
+  END IF;
+  IF NEW.`manufacture_year` < OLD.`manufacture_year` THEN
+    INSERT INTO `airplane_year_stats` (`manufacture_year`, `airplanes`, `max_speed_sum`, `weight_sum`)
+      VALUES (NEW.`manufacture_year`, 1, NEW.`max_speed`, NEW.`weight`)
+      ON DUPLICATE KEY UPDATE `airplanes` = `airplanes` + 1,
+        `max_speed_sum` = `max_speed_sum` + NEW.`max_speed`, `weight_sum` = `weight_sum` + NEW.`weight`;
+    UPDATE `airplane_year_stats`
+      SET `airplanes` = `airplanes` - 1, `max_speed_sum` = `max_speed_sum` - OLD.`max_speed`,
+        `weight_sum` = `weight_sum` - OLD.`weight`
+      WHERE `manufacture_year` = OLD.`manufacture_year`;
+  ELSE
+    UPDATE `airplane_year_stats`
+      SET `airplanes` = `airplanes` - 1, `max_speed_sum` = `max_speed_sum` - OLD.`max_speed`,
+        `weight_sum` = `weight_sum` - OLD.`weight`
+      WHERE `manufacture_year` = OLD.`manufacture_year`;
+    INSERT INTO `airplane_year_stats` (`manufacture_year`, `airplanes`, `max_speed_sum`, `weight_sum`)
+      VALUES (NEW.`manufacture_year`, 1, NEW.`max_speed`, NEW.`weight`)
+      ON DUPLICATE KEY UPDATE `airplanes` = `airplanes` + 1,
+        `max_speed_sum` = `max_speed_sum` + NEW.`max_speed`, `weight_sum` = `weight_sum` + NEW.`weight`;
+  END IF;
+END
+$$
+CREATE TRIGGER `airplanes_stats_delete` AFTER DELETE ON `airplanes` FOR EACH ROW BEGIN
+  UPDATE `airplane_airline_stats`
+    SET `airplanes` = `airplanes` - 1, `seats` = `seats` - OLD.`seats`
+    WHERE `airline` = OLD.`airline`;
+  UPDATE `airplane_year_stats`
+    SET `airplanes` = `airplanes` - 1, `max_speed_sum` = `max_speed_sum` - OLD.`max_speed`,
+      `weight_sum` = `weight_sum` - OLD.`weight`
+    WHERE `manufacture_year` = OLD.`manufacture_year`;
+END
+$$
+DELIMITER ;
+
+--
+-- Triggers `cook_books`
+--
+-- Prices are bucketed by 10 and page counts by 100, as `helpers/stats.py`
+-- expects.
+--
+DELIMITER $$
+CREATE TRIGGER `cook_books_stats_insert` AFTER INSERT ON `cook_books` FOR EACH ROW BEGIN
+  INSERT INTO `cookbook_price_stats` (`bucket`, `cookbooks`, `price_sum`)
+    VALUES (FLOOR(NEW.`price` / 10), 1, NEW.`price`)
+    ON DUPLICATE KEY UPDATE `cookbooks` = `cookbooks` + 1, `price_sum` = `price_sum` + NEW.`price`;
+  INSERT INTO `cookbook_page_stats` (`bucket`, `cookbooks`, `pages_sum`)
+    VALUES (FLOOR(NEW.`num_pages` / 100), 1, NEW.`num_pages`)
+    ON DUPLICATE KEY UPDATE `cookbooks` = `cookbooks` + 1, `pages_sum` = `pages_sum` + NEW.`num_pages`;
+END
+$$
+-- As for the airplanes, the old and new buckets are locked in key order.
+CREATE TRIGGER `cook_books_stats_update` AFTER UPDATE ON `cook_books` FOR EACH ROW BEGIN
+  IF FLOOR(NEW.`price` / 10) < FLOOR(OLD.`price` / 10) THEN
+    INSERT INTO `cookbook_price_stats` (`bucket`, `cookbooks`, `price_sum`)
+      VALUES (FLOOR(NEW.`price` / 10), 1, NEW.`price`)
+      ON DUPLICATE KEY UPDATE `cookbooks` = `cookbooks` + 1, `price_sum` = `price_sum` + NEW.`price`;
+    UPDATE `cookbook_price_stats`
+      SET `cookbooks` = `cookbooks` - 1, `price_sum` = `price_sum` - OLD.`price`
+      WHERE `bucket` = FLOOR(OLD.`price` / 10);
+  ELSE
+    UPDATE `cookbook_price_stats`
+      SET `cookbooks` = `cookbooks` - 1, `price_sum` = `price_sum` - OLD.`price`
+      WHERE `bucket` = FLOOR(OLD.`price` / 10);
+    INSERT INTO `cookbook_price_stats` (`bucket`, `cookbooks`, `price_sum`)
+      VALUES (FLOOR(NEW.`price` / 10), 1, NEW.`price`)
+      ON DUPLICATE KEY UPDATE `cookbooks` = `cookbooks` + 1, `price_sum` = `price_sum` + NEW.`price`;
+  END IF;
+  IF FLOOR(NEW.`num_pages` / 100) < FLOOR(OLD.`num_pages` / 100) THEN
+    INSERT INTO `cookbook_page_stats` (`bucket`, `cookbooks`, `pages_sum`)
+      VALUES (FLOOR(NEW.`num_pages` / 100), 1, NEW.`num_pages`)
+      ON DUPLICATE KEY UPDATE `cookbooks` = `cookbooks` + 1, `pages_sum` = `pages_sum` + NEW.`num_pages`;
+    UPDATE `cookbook_page_stats`
+      SET `cookbooks` = `cookbooks` - 1, `pages_sum` = `pages_sum` - OLD.`num_pages`
+      WHERE `bucket` = FLOOR(OLD.`num_pages` / 100);
+  ELSE
+    UPDATE `cookbook_page_stats`
+      SET `cookbooks` = `cookbooks` - 1, `pages_sum` = `pages_sum` - OLD.`num_pages`
+      WHERE `bucket` = FLOOR(OLD.`num_pages` / 100);
+    INSERT INTO `cookbook_page_stats` (`bucket`, `cookbooks`, `pages_sum`)
+      VALUES (FLOOR(NEW.`num_pages` / 100), 1, NEW.`num_pages`)
+      ON DUPLICATE KEY UPDATE `cookbooks` = `cookbooks` + 1, `pages_sum` = `pages_sum` + NEW.`num_pages`;
+  END IF;
+END
+$$
+CREATE TRIGGER `cook_books_stats_delete` AFTER DELETE ON `cook_books` FOR EACH ROW BEGIN
+  UPDATE `cookbook_price_stats`
+    SET `cookbooks` = `cookbooks` - 1, `price_sum` = `price_sum` - OLD.`price`
+    WHERE `bucket` = FLOOR(OLD.`price` / 10);
+  UPDATE `cookbook_page_stats`
+    SET `cookbooks` = `cookbooks` - 1, `pages_sum` = `pages_sum` - OLD.`num_pages`
+    WHERE `bucket` = FLOOR(OLD.`num_pages` / 100);
+END
+$$
+DELIMITER ;
+
 --
 -- Indexes for dumped tables
 --
 
+--
+-- Indexes for table `airplanes`
+--
+ALTER TABLE `airplanes`
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `airline` (`airline`),
+  ADD KEY `airline_manufacture_year` (`airline`,`manufacture_year`),
+  ADD KEY `manufacture_year` (`manufacture_year`),
+  ADD KEY `change_version` (`change_version`);
+
+--
+-- Indexes for table `airplane_airline_stats`
+--
+ALTER TABLE `airplane_airline_stats`
+  ADD PRIMARY KEY (`airline`);
+
+--
+-- Indexes for table `airplane_year_stats`
+--
+ALTER TABLE `airplane_year_stats`
+  ADD PRIMARY KEY (`manufacture_year`);
+
+--
+-- Indexes for table `cookbook_page_stats`
+--
+ALTER TABLE `cookbook_page_stats`
+  ADD PRIMARY KEY (`bucket`);
+
+--
+-- Indexes for table `cookbook_price_stats`
+--
+ALTER TABLE `cookbook_price_stats`
+  ADD PRIMARY KEY (`bucket`);
+
 --
 -- Indexes for table `cook_books`
 --
 ALTER TABLE `cook_books`
   ADD PRIMARY KEY (`id`),
   ADD UNIQUE KEY `isbn` (`isbn`),
-  ADD UNIQUE KEY `title` (`title`);
+  ADD UNIQUE KEY `title` (`title`),
+  ADD KEY `author` (`author`),
+  ADD KEY `author_publication_year` (`author`,`publication_year`),
+  ADD KEY `publication_year` (`publication_year`),
+  ADD KEY `price` (`price`),
+  ADD KEY `change_version` (`change_version`),
+  ADD FULLTEXT KEY `title_author` (`title`,`author`) WITH PARSER ngram;
+
+--
+-- Indexes for table `table_versions`
+--
+ALTER TABLE `table_versions`
+  ADD PRIMARY KEY (`table_name`);
+
+--
+-- Indexes for table `tombstones`
+--
+ALTER TABLE `tombstones`
+  ADD PRIMARY KEY (`table_name`,`change_version`,`row_id`);
 
 --
 -- AUTO_INCREMENT for dumped tables
 --
 
+--
+-- AUTO_INCREMENT for table `airplanes`
+--
+ALTER TABLE `airplanes`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT for table `cook_books`
 --
 ALTER TABLE `cook_books`
   MODIFY `id` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=2;
+
+--
+-- Rebuild of the summary tables
+--
+-- The triggers only count the writes made after they exist. On a database that
+-- already held airplanes or cook books when they were created, run this section
+-- once to count the existing rows; it can be rerun at any time to repair the
+-- summaries. The INSERT ... SELECT statements lock the rows they read, so
+-- writes made meanwhile wait for the commit and are then counted by the
+-- triggers.
+--
+START TRANSACTION;
+DELETE FROM `airplane_airline_stats`;
+INSERT INTO `airplane_airline_stats` (`airline`, `airplanes`, `seats`)
+  SELECT `airline`, COUNT(*), SUM(`seats`) FROM `airplanes` GROUP BY `airline`;
+DELETE FROM `airplane_year_stats`;
+INSERT INTO `airplane_year_stats` (`manufacture_year`, `airplanes`, `max_speed_sum`, `weight_sum`)
+  SELECT `manufacture_year`, COUNT(*), SUM(`max_speed`), SUM(`weight`)
+  FROM `airplanes` GROUP BY `manufacture_year`;
+DELETE FROM `cookbook_price_stats`;
+INSERT INTO `cookbook_price_stats` (`bucket`, `cookbooks`, `price_sum`)
+  SELECT FLOOR(`price` / 10), COUNT(*), SUM(`price`) FROM `cook_books` GROUP BY FLOOR(`price` / 10);
+DELETE FROM `cookbook_page_stats`;
+INSERT INTO `cookbook_page_stats` (`bucket`, `cookbooks`, `pages_sum`)
+  SELECT FLOOR(`num_pages` / 100), COUNT(*), SUM(`num_pages`)
+  FROM `cook_books` GROUP BY FLOOR(`num_pages` / 100);
 COMMIT;
 
 /*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;